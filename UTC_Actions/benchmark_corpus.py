@@ -0,0 +1,255 @@
+# benchmark_corpus.py
+#
+# A generated, offline corpus of doc registry and minutes pages for
+# benchmarks.py, and a local HTTP server to serve it, so that the whole
+# fetch, parse, extract and search pipeline can be measured without going
+# to the Unicode site.
+#
+# The corpus is generated from a seed, so the same parameters always give
+# the same pages. The pages mimic the structure of the real ones as far as
+# utc_actions is concerned: a registry page per year in utcDocRegistry_urls
+# (with a table of documents, including minutes rows for a few meetings),
+# and a minutes page per meeting with tagged actions ("[180-C3] ...") among
+# ordinary paragraphs. Files are laid out with the same paths as on the
+# Unicode site.
+#
+# The server can also stand in for the Unicode site in other offline runs,
+# e.g. to load-test the fetcher's concurrency limits, retries and
+# revalidation: it supports conditional requests (ETag and Last-Modified),
+# and can add latency to each response and answer a fraction of requests
+# with an error. To generate a corpus and serve it until interrupted:
+#
+#   python benchmark_corpus.py [folder] [--port N] [--latency S] [--error-rate F]
+
+import argparse
+import functools
+import os
+import random
+import threading
+import time
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import urlsplit
+
+import utc_actions
+
+
+# Default corpus parameters; see generateCorpus().
+defaultCorpusParameters = {
+    "seed": 1,
+    "docsPerYear": 300,
+    "meetingsPerYear": 4,
+    "paragraphsPerMeeting": 150
+    }
+
+_words = (
+    "unicode script character proposal emoji encoding property normalization "
+    "collation block variation sequence glyph font bidi segmentation"
+    ).split()
+
+_actionLabels = {
+    "A": "Action Item",
+    "C": "Consensus",
+    "L": "Letter ballot",
+    "M": "Motion",
+    "N": "Note:"
+    }
+
+
+
+def _subject(rand: random.Random):
+    words = [rand.choice(_words) for _ in range(rand.randint(3, 9))]
+    return " ".join([words[0].capitalize()] + words[1:])
+
+
+def _docRegRow(docNum, url, subject, source, date):
+    return (
+        f'<tr>\n<td><a href="{url}">{docNum}</a></td>\n'
+        f'<td>{subject}</td>\n<td>{source}</td>\n<td>{date}</td>\n</tr>\n'
+        )
+
+
+def generateDocRegPage(rand: random.Random, year, minutesRows, docsPerYear):
+    '''Returns a doc registry page for year. minutesRows is a list of
+    (doc #, url, subject, source, date) for the minutes documents, which are
+    spread through the table.
+    '''
+    yy = str(year)[2:]
+    rows = []
+    for i in range(1, docsPerYear + 1):
+        subject = _subject(rand)
+        if i % 7 == 0:
+            subject += "\n  (revised)"
+        rows.append(_docRegRow(f"L2/{yy}-{i:03d}", f"{yy}{i:03d}-doc.pdf", subject, f"Author {i % 17}", f"{year}-{i % 12 + 1:02d}-{i % 28 + 1:02d}"))
+        if i % 10 == 0:
+            rows.append("<!-- registry comment -->\n")
+    spacing = docsPerYear // (len(minutesRows) + 1)
+    for k, minutesRow in enumerate(minutesRows):
+        rows.insert((k + 1) * spacing, _docRegRow(*minutesRow))
+    return (
+        f'<html><head><title>UTC Document Register {year}</title></head><body>\n'
+        '<table class="navigation"><tr><td>Document Register</td></tr></table>\n'
+        '<div class="contents">\n<table class="subtle">\n'
+        '<tr><th>Doc Number</th><th>Subject</th><th>Source</th><th>Date</th></tr>\n'
+        + "".join(rows) +
+        '</table>\n</div>\n</body></html>\n'
+        )
+
+
+def generateMinutesPage(rand: random.Random, meetingNumber, paragraphs):
+    '''Returns a minutes page for a meeting, with about half of the
+    paragraphs being tagged actions.
+    '''
+    parts = [f'<html><head><title>UTC #{meetingNumber} Minutes</title></head><body>\n<h1>Minutes of UTC #{meetingNumber}</h1>\n']
+    for i in range(1, paragraphs + 1):
+        if rand.random() < 0.5:
+            code = rand.choice("ACLMN")
+            actionId = f"{meetingNumber}-{code}{i}"
+            parts.append(f'<p>[<a name="{actionId}">{actionId}</a>] {_actionLabels[code]} for {_subject(rand)}, see\n  <a href="L2/{meetingNumber}-{i}.pdf">L2/{meetingNumber}-{i}</a>.</p>\n')
+        else:
+            parts.append(f'<p>Discussion of {_subject(rand)} with the {rand.choice(_words)} team. <b>{_subject(rand)}</b></p>\n<!-- note {i} -->\n')
+    parts.append('</body></html>\n')
+    return "".join(parts)
+
+
+def generateCorpus(folder, seed = 1, docsPerYear = 300, meetingsPerYear = 4, paragraphsPerMeeting = 150):
+    '''Writes a corpus of pages for the years in utcDocRegistry_urls to
+    folder, laid out with the URL paths of the Unicode site. Early meetings
+    (see earlyUtcMinutesRows) get minutes pages at their hard-coded rows;
+    from 2002, each year has meetingsPerYear meetings, numbered from 90.
+
+    Returns (number of registry pages, number of minutes pages).
+    '''
+    rand = random.Random(seed)
+    folder = Path(folder)
+
+    def write(url, page):
+        path = folder / urlsplit(url).path.lstrip("/")
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(page, encoding="utf-8")
+
+    nextMeeting = 90
+    minutesPages = 0
+    for year, url in utc_actions.utcDocRegistry_urls.items():
+        baseUrl = utc_actions.getDocRegistryBaseUrl(year)
+        if year in utc_actions.earlyMinutes:
+            minutesRows = []
+            meetings = [(m, utc_actions.earlyUtcMinutesRows[m][2][1]) for m in utc_actions.earlyMinutes[year]]
+        else:
+            yy = str(year)[2:]
+            meetings = [(nextMeeting + k, f"{yy}{900 + k}.htm") for k in range(meetingsPerYear)]
+            minutesRows = [
+                (f"L2/{yy}-{900 + k}", minutesUrl, f"Approved Minutes of UTC #{m} meeting", "Secretary", f"{year}-{3 * k + 1:02d}-10")
+                for k, (m, minutesUrl) in enumerate(meetings)
+                ]
+            nextMeeting += meetingsPerYear
+        write(url, generateDocRegPage(rand, year, minutesRows, docsPerYear))
+        for m, minutesUrl in meetings:
+            write(baseUrl + minutesUrl, generateMinutesPage(rand, m, paragraphsPerMeeting))
+            minutesPages += 1
+    return (len(utc_actions.utcDocRegistry_urls), minutesPages)
+
+
+
+class _CorpusRequestHandler(SimpleHTTPRequestHandler):
+    # Serves files with ETags, after a delay, and fails some requests; see
+    # CorpusServer.
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        settings = self.server.corpusServer
+        if settings.latency > 0:
+            time.sleep(settings.latency)
+        if settings.shouldFail():
+            self.send_error(settings.errorStatus)
+            return
+
+        self.etag = None
+        path = self.translate_path(self.path)
+        if os.path.isfile(path):
+            stat = os.stat(path)
+            self.etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+            if self.headers.get("If-None-Match") == self.etag:
+                self.send_response(304)
+                self.end_headers()
+                return
+        super().do_GET()
+
+    def end_headers(self):
+        if getattr(self, "etag", None) is not None:
+            self.send_header("ETag", self.etag)
+        super().end_headers()
+
+
+class CorpusServer:
+    '''Serves a corpus folder over HTTP on the loopback interface, on a
+    background thread. Use as a context manager:
+
+        with CorpusServer(folder) as server:
+            useCorpusServer(server.baseUrl)
+
+    latency is a delay (in seconds) before each response. errorRate is the
+    fraction of requests, chosen at random (from seed), that get an
+    errorStatus response instead of the page.
+    '''
+
+    def __init__(self, folder, port = 0, latency = 0.0, errorRate = 0.0, errorStatus = 503, seed = 1):
+        self.latency = latency
+        self.errorRate = errorRate
+        self.errorStatus = errorStatus
+        self.requests = 0
+        self.errors = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        handler = functools.partial(_CorpusRequestHandler, directory=str(folder))
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+        self.server.corpusServer = self
+        self.baseUrl = f"http://127.0.0.1:{self.server.server_address[1]}/"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def shouldFail(self):
+        # Counts a request, and decides whether it gets an error.
+        with self._lock:
+            self.requests += 1
+            fail = self.errorRate > 0 and self._random.random() < self.errorRate
+            if fail:
+                self.errors += 1
+            return fail
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *excInfo):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+
+def useCorpusServer(baseUrl):
+    '''Points utcDocRegistry_urls (and so the minutes URLs derived from
+    them) at a corpus server with the given base URL.
+    '''
+    for year, url in utc_actions.utcDocRegistry_urls.items():
+        utc_actions.utcDocRegistry_urls[year] = baseUrl + urlsplit(url).path.lstrip("/")
+
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generates the benchmark corpus and serves it until interrupted.")
+    parser.add_argument("folder", nargs="?", default="benchmark_corpus")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--latency", type=float, default=0.0, help="delay before each response, in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests that get a 503 response")
+    args = parser.parse_args()
+
+    if not Path(args.folder).is_dir():
+        generateCorpus(args.folder, **defaultCorpusParameters)
+    with CorpusServer(args.folder, args.port, args.latency, args.error_rate) as server:
+        print(f"serving {args.folder} at {server.baseUrl}; use useCorpusServer({server.baseUrl!r})")
+        try:
+            server.thread.join()
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,498 @@
+# benchmarks.py
+#
+# Measurements for the utc_actions module. Run from this folder:
+#
+#   python benchmarks.py            (all benchmarks)
+#   python benchmarks.py pipeline   (only the offline pipeline suite)
+#
+# with --results FILE to save the pipeline results to FILE.
+#
+# Exits with a non-zero status if a measurement is over its budget, a
+# pipeline stage has regressed since the previous run, or the lxml or
+# parallel results differ from the reference ones.
+#
+# The pipeline suite runs the fetch, extract, parse, action and search
+# stages against a generated corpus (see benchmark_corpus.py) served from a
+# local HTTP server, with a fresh local cache, so results don't depend on
+# the network or on what's in pickle_jar. For each stage it reports wall
+# time, peak memory and throughput; the results are appended to
+# benchmarkResults_file in the cache folder (or another file given with
+# --results) and compared with the previous run for the same corpus, so
+# regressions show up between versions.
+#
+# The other benchmarks measure what's in the local cache. They only read
+# it: nothing is retrieved, and nothing in the cache is changed.
+
+import argparse
+import json
+import os
+import platform
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from contextlib import redirect_stdout
+from datetime import datetime, timezone
+from pathlib import Path
+
+import utc_actions
+from utc_store import StoredMinutes, UtcStore
+
+
+moduleFolder = Path(__file__).resolve().parent
+
+# file name in the cache folder (see utc_actions.cacheRoot) for the results
+# of the pipeline suite, one JSON object per run
+benchmarkResults_file = "benchmark_results.jsonl"
+
+# A stage whose wall time has grown by more than this fraction since the
+# previous run is reported as a regression.
+regressionThreshold = 0.25
+
+# Searches run by the "search minutes" stage.
+pipelineSearches = ["proposal", "emoji encoding", "glyph|font"]
+
+
+def measureImportTime(runs = 5):
+    '''Returns the best wall time (in seconds) over several runs of a cold
+    "import utc_actions", each in a fresh interpreter.
+    '''
+    code = (
+        "import time; t = time.perf_counter(); import utc_actions; "
+        "print(time.perf_counter() - t)"
+    )
+    times = []
+    for i in range(runs):
+        result = subprocess.run(
+            [sys.executable, "-c", code],
+            cwd=moduleFolder, capture_output=True, text=True, check=True
+            )
+        times.append(float(result.stdout.strip().splitlines()[-1]))
+    return min(times)
+
+
+def benchmarkImport():
+    importTime = measureImportTime()
+    budget = utc_actions.importTimeBudget
+    print(f"import utc_actions: {importTime:.3f}s (budget {budget:.3f}s)")
+    return importTime <= budget
+
+
+def getCachedStore():
+    # The store for the local cache, or None if there's no cache yet (so
+    # that one isn't created).
+    if not utc_actions.getCachePath(utc_actions.utcStore_file).is_file():
+        return None
+    return utc_actions.getStore()
+
+
+def benchmarkMinutesStorage():
+    # Reports the size of the stored minutes pages, compressed and not.
+    # Pages stored uncompressed (before there was a compression dictionary)
+    # are compressed in a scratch copy of the store, which is what's
+    # measured.
+    storePath = utc_actions.getCachePath(utc_actions.utcStore_file)
+    if not storePath.is_file():
+        print("minutes storage: no minutes in the local cache")
+        return
+    with tempfile.TemporaryDirectory() as folder:
+        copyPath = Path(folder) / storePath.name
+        source = sqlite3.connect(f"{storePath.resolve().as_uri()}?mode=ro", uri=True)
+        copy = sqlite3.connect(copyPath)
+        try:
+            source.backup(copy)
+        finally:
+            copy.close()
+            source.close()
+        store = UtcStore(copyPath)
+        try:
+            store.compressStoredMinutes()
+            stats = store.getMinutesStorageStats()
+        finally:
+            store.close()
+    if stats["pages"] == 0:
+        print("minutes storage: no minutes in the local cache")
+        return
+    mb = 1024 * 1024
+    print(f"minutes storage: {stats['pages']} pages")
+    print(f"    uncompressed: {stats['pageBytes'] / mb:.1f} MB on disk, {stats['strMemoryBytes'] / mb:.1f} MB in memory as str")
+    print(f"    compressed:   {stats['storedBytes'] / mb:.1f} MB ({stats['storedBytes'] / stats['pageBytes']:.1%})")
+    print(f"    store file:   {stats['fileBytes'] / mb:.1f} MB")
+
+
+def benchmarkDocRegTableExtraction():
+    # Derives the doc registry tables from the stored pages with lxml and
+    # with Beautiful Soup, and checks that the results are identical.
+    store = getCachedStore()
+    pages = {} if store is None else {year: store.getDocRegPage(year) for year in store.getDocRegPageYears()}
+    if len(pages) == 0:
+        print("doc registry tables: no registry pages in the local cache")
+        return
+
+    t = time.perf_counter()
+    for page in pages.values():
+        utc_actions.getDocRegTableFromPageUsingSoup(page)
+    soupTime = time.perf_counter() - t
+    t = time.perf_counter()
+    for page in pages.values():
+        utc_actions.getDocRegTableFromPage(page)
+    lxmlTime = time.perf_counter() - t
+
+    print(f"doc registry tables for {len(pages)} years: soup {soupTime:.2f}s, lxml {lxmlTime:.2f}s ({soupTime / lxmlTime:.1f}x)")
+    differentYears = utc_actions.verifyDocRegTableExtraction(pages)
+    if len(differentYears) > 0:
+        print(f"    lxml results differ for {differentYears}")
+        return False
+    return True
+
+
+def benchmarkParallelParsing(workers = None):
+    # Parses the stored minutes pages (meetings 90 and later) serially and
+    # with a process pool, and checks that the results are identical. Only
+    # minutes already in the local cache are used; none are retrieved.
+    store = getCachedStore()
+    minutes = {} if store is None else StoredMinutes(store)
+    pages = [minutes[m][-1] for m in minutes if m >= 90]
+    if len(pages) == 0:
+        print("parallel parsing: no minutes in the local cache")
+        return
+    if workers is None:
+        workers = os.cpu_count()
+
+    t = time.perf_counter()
+    serialDocs = utc_actions.parseMinutesPages(pages, workers=1)
+    serialTime = time.perf_counter() - t
+    t = time.perf_counter()
+    parallelDocs = utc_actions.parseMinutesPages(pages, workers=workers)
+    parallelTime = time.perf_counter() - t
+
+    print(f"parsing {len(pages)} minutes pages: serial {serialTime:.2f}s, {workers} workers {parallelTime:.2f}s ({serialTime / parallelTime:.1f}x)")
+    if parallelDocs != serialDocs:
+        print("    parallel results differ from serial results")
+        return False
+    return True
+
+
+#--------------------------------------------------------
+#  Offline pipeline suite
+
+def measureStage(stage, repeat = 3):
+    '''Runs stage (a function returning a dict of item counts, e.g.
+    {"pages": 26}) repeat times, then once more with tracemalloc on.
+
+    Returns a dict with the best wall time in seconds, the peak memory
+    allocated during the traced run, the counts, and the throughput for each
+    count (per second, based on the best time).
+    '''
+    times = []
+    for i in range(repeat):
+        t = time.perf_counter()
+        counts = stage()
+        times.append(time.perf_counter() - t)
+    tracemalloc.start()
+    try:
+        stage()
+        peakMemory = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return getStageResult(min(times), peakMemory, counts)
+
+
+def getStageResult(seconds, peakMemory, counts):
+    return {
+        "seconds": seconds,
+        "peakMemoryBytes": peakMemory,
+        "counts": counts,
+        "throughput": {f"{name}/s": count / seconds for name, count in counts.items()}
+        }
+
+
+def _runInChild(folder, call):
+    # Runs "benchmarks.<call>" in a fresh interpreter with folder as the
+    # working folder, so that it has its own local cache (even if
+    # UTC_ACTIONS_CACHE is set); returns the JSON value it prints last.
+    result = subprocess.run(
+        [sys.executable, "-c", f"import benchmarks; benchmarks.{call}"],
+        cwd=folder, capture_output=True, text=True, check=True,
+        env=dict(os.environ, PYTHONPATH=str(moduleFolder), UTC_ACTIONS_CACHE=str(Path(folder) / "pickle_jar"))
+        )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def _printJson(value):
+    sys.__stdout__.write(json.dumps(value) + "\n")
+
+
+def _buildCacheStage(baseUrl, traced):
+    # Child process: fills the (empty) local cache from the corpus server,
+    # as happens on first use: fetching the registry pages and the minutes
+    # pages, extracting the registry tables, parsing and indexing the
+    # minutes. Prints (seconds, peak memory or None, counts).
+    #
+    # Minutes URLs are relative to the registry page URLs, so every page
+    # comes from the corpus server; that's checked before the minutes are
+    # crawled, so nothing is ever retrieved from the Unicode site.
+    from benchmark_corpus import useCorpusServer
+    useCorpusServer(baseUrl)
+    with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+        if traced:
+            tracemalloc.start()
+        t = time.perf_counter()
+        tables = utc_actions.getUtcDocRegTables()
+        offSiteUrls = [url for (_, _, _, url) in utc_actions.getMeetingCatalog().meetings.values() if not url.startswith(baseUrl)]
+        if len(offSiteUrls) > 0:
+            raise RuntimeError(f"minutes URLs not on the corpus server, e.g. {offSiteUrls[0]}")
+        utc_actions.crawlAllMeetingMinutes()
+        seconds = time.perf_counter() - t
+        peakMemory = tracemalloc.get_traced_memory()[1] if traced else None
+    _printJson([seconds, peakMemory, {"pages": len(tables) + utc_actions.getStore().getMinutesCount()}])
+
+
+def _pipelineStages(baseUrl, repeat):
+    # Child process, run in a folder whose cache has been filled by
+    # _buildCacheStage(). Measures each stage and prints the results. Only
+    # the stored minutes are used; if there are none, the cache wasn't
+    # built, and nothing is measured (rather than crawling for them).
+    from benchmark_corpus import useCorpusServer
+    from requests.compat import chardet
+    from utc_fetch import detectEncoding, getDeclaredEncoding
+    useCorpusServer(baseUrl)
+
+    store = utc_actions.getStore()
+    if store.getMinutesCount() == 0:
+        raise RuntimeError("no minutes in the benchmark cache")
+    results = {}
+    with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+        minutes = StoredMinutes(store)
+        registryPages = utc_actions.getStore().getAllDocRegPages()
+        minutesPages = [minutes[m][-1] for m in minutes]
+        urls = list(utc_actions.utcDocRegistry_urls.values()) + [url for (_, _, _, url) in utc_actions.getMeetingCatalog().meetings.values()]
+
+        def fetchPages():
+            pages = utc_actions.getFetcher().fetchAll(urls)
+            return {"pages": len(pages), "MB": sum(len(page) for page in pages) / 1e6}
+        results["fetch pages"] = measureStage(fetchPages, repeat)
+
+        # Finding the encoding of the fetched pages: what's done on each
+        # retrieval (look for a declared encoding), what's done the first
+        # time a page without one is retrieved (detectEncoding()), and the
+        # statistical detection that requests' response.text does for a
+        # page without a declared charset.
+        contents = [page.content for page in utc_actions.getFetcher().fetchAll(urls)]
+        contentMB = sum(len(content) for content in contents) / 1e6
+
+        def findDeclaredEncodings():
+            for content in contents:
+                getDeclaredEncoding({}, content)
+            return {"pages": len(contents), "MB": contentMB}
+        results["find declared encoding"] = measureStage(findDeclaredEncodings, repeat)
+
+        def detectEncodings():
+            for content in contents:
+                detectEncoding(content)
+            return {"pages": len(contents), "MB": contentMB}
+        results["detect encoding"] = measureStage(detectEncodings, repeat)
+
+        def detectEncodingsStatistically():
+            for content in contents:
+                chardet.detect(content)
+            return {"pages": len(contents), "MB": contentMB}
+        results["detect encoding (statistical)"] = measureStage(detectEncodingsStatistically, repeat)
+
+        def extractDocRegTables():
+            tables = [utc_actions.getDocRegTableFromPage(page) for page in registryPages.values()]
+            return {"pages": len(tables), "rows": sum(len(table) for table in tables)}
+        results["extract registry tables"] = measureStage(extractDocRegTables, repeat)
+
+        # Loading the registry tables: reading every row from the store, and
+        # mapping the snapshot (written when the cache was built), whose
+        # rows are only read as they're used.
+        def loadDocRegTablesFromStore():
+            tables = utc_actions.getStore().getAllDocRegTables()
+            return {"rows": sum(len(table) for table in tables.values())}
+        results["load registry tables (store)"] = measureStage(loadDocRegTablesFromStore, repeat)
+
+        def loadDocRegTables():
+            utc_actions._dropLoadedData()
+            tables = utc_actions.getUtcDocRegTables()
+            return {"rows": sum(len(table) for table in tables.values())}
+        results["load registry tables (snapshot)"] = measureStage(loadDocRegTables, repeat)
+
+        def parseMinutes():
+            docs = [utc_actions.parseMinutesDoc(page) for page in minutesPages]
+            return {"pages": len(docs)}
+        results["parse minutes"] = measureStage(parseMinutes, repeat)
+
+        def findTaggedActions():
+            actions = sum(len(utc_actions.findTaggedActionsInMinutes(minutes[m])) for m in minutes if m >= 90)
+            return {"actions": actions}
+        results["find tagged actions"] = measureStage(findTaggedActions, repeat)
+
+        def compileTaggedActions():
+            allActions = utc_actions.compileTaggedActionsFromAllMinutes(minutesData=minutes)
+            return {"meetings": len(allActions), "actions": sum(len(actions) for actions in allActions.values())}
+        results["compile tagged actions"] = measureStage(compileTaggedActions, repeat)
+
+        def searchMinutes():
+            matches = 0
+            for text in pipelineSearches:
+                matches += sum(len(r) for r in utc_actions.searchForTextInAllMinutes(text).values())
+            return {"searches": len(pipelineSearches), "matches": matches}
+        results["search minutes"] = measureStage(searchMinutes, repeat)
+    _printJson(results)
+
+
+def measureImportMemory():
+    '''Returns the peak memory allocated by a cold "import utc_actions" in a
+    fresh interpreter.
+    '''
+    code = (
+        "import tracemalloc; tracemalloc.start(); import utc_actions; "
+        "print(tracemalloc.get_traced_memory()[1])"
+        )
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=moduleFolder, capture_output=True, text=True, check=True
+        )
+    return int(result.stdout.strip().splitlines()[-1])
+
+
+def runPipelineBenchmark(repeat = 3, corpusParameters = None):
+    '''Generates the benchmark corpus, serves it locally and measures each
+    stage of the pipeline against it. Returns a dict {stage: result} (see
+    measureStage()).
+
+    The "build cache" stage runs in a fresh interpreter with an empty cache
+    for each measurement; the other stages run in one more interpreter,
+    against the cache that was built.
+    '''
+    from benchmark_corpus import CorpusServer, defaultCorpusParameters, generateCorpus
+    if corpusParameters is None:
+        corpusParameters = defaultCorpusParameters
+
+    results = {}
+    results["import"] = getStageResult(measureImportTime(), measureImportMemory(), {})
+    with tempfile.TemporaryDirectory() as folder:
+        corpusFolder = Path(folder) / "corpus"
+        generateCorpus(corpusFolder, **corpusParameters)
+        with CorpusServer(corpusFolder) as server:
+            times = []
+            for i in range(repeat + 1):
+                cacheFolder = Path(folder) / f"cache{i}"
+                cacheFolder.mkdir()
+                traced = i == repeat
+                seconds, peakMemory, counts = _runInChild(cacheFolder, f"_buildCacheStage({server.baseUrl!r}, {traced})")
+                if not traced:
+                    times.append(seconds)
+            results["build cache"] = getStageResult(min(times), peakMemory, counts)
+            results.update(_runInChild(cacheFolder, f"_pipelineStages({server.baseUrl!r}, {repeat})"))
+    return results
+
+
+def getVersion():
+    # The git commit of this folder, if it's available.
+    try:
+        result = subprocess.run(
+            ["git", "describe", "--always", "--dirty"],
+            cwd=moduleFolder, capture_output=True, text=True, check=True
+            )
+        return result.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def loadBenchmarkResults(path = None):
+    '''Returns the runs of the pipeline suite saved in path (by default,
+    benchmarkResults_file in the cache folder), oldest first.
+    '''
+    path = Path(path) if path is not None else utc_actions.getCachePath(benchmarkResults_file)
+    if not path.is_file():
+        return []
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip() != ""]
+
+
+def saveBenchmarkResults(run, path = None):
+    path = Path(path) if path is not None else utc_actions.getCachePath(benchmarkResults_file)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(run) + "\n")
+
+
+def findRegressions(run, previousRun):
+    '''Returns a list of (stage, previous seconds, seconds) for stages that
+    are slower than in previousRun by more than regressionThreshold.
+    '''
+    regressions = []
+    for stage, result in run["stages"].items():
+        previous = previousRun["stages"].get(stage)
+        if previous is not None and result["seconds"] > previous["seconds"] * (1 + regressionThreshold):
+            regressions.append((stage, previous["seconds"], result["seconds"]))
+    return regressions
+
+
+def printStageResults(stages):
+    mb = 1024 * 1024
+    for stage, result in stages.items():
+        throughput = ", ".join(f"{value:,.1f} {unit}" for unit, value in result["throughput"].items())
+        print(f"    {stage:<24} {result['seconds']:8.3f}s  peak {result['peakMemoryBytes'] / mb:7.1f} MB  {throughput}")
+
+
+def benchmarkPipeline(repeat = 3, resultsPath = None):
+    # Runs the offline pipeline suite, prints and saves the results (to
+    # resultsPath, or benchmarkResults_file in the cache folder), and
+    # compares them with the previous run for the same corpus. Returns the
+    # regressions (see findRegressions()).
+    if resultsPath is None:
+        resultsPath = utc_actions.getCachePath(benchmarkResults_file)
+    from benchmark_corpus import defaultCorpusParameters
+    run = {
+        "time": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "version": getVersion(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "corpus": defaultCorpusParameters,
+        "stages": runPipelineBenchmark(repeat)
+        }
+    print(f"pipeline (generated corpus, version {run['version']}):")
+    printStageResults(run["stages"])
+
+    previousRuns = [r for r in loadBenchmarkResults(resultsPath) if r["corpus"] == run["corpus"]]
+    regressions = []
+    if len(previousRuns) > 0:
+        previousRun = previousRuns[-1]
+        regressions = findRegressions(run, previousRun)
+        for stage, previousSeconds, seconds in regressions:
+            print(f"    regression: {stage} took {seconds:.3f}s, was {previousSeconds:.3f}s at version {previousRun['version']} ({previousRun['time']})")
+        if len(regressions) == 0:
+            print(f"    no regressions since version {previousRun['version']} ({previousRun['time']})")
+    saveBenchmarkResults(run, resultsPath)
+    print(f"    results saved to {resultsPath}")
+    return regressions
+
+
+def runBenchmarks(suite = None, resultsPath = None):
+    '''Runs all benchmarks, or only the pipeline suite if suite is
+    "pipeline". Returns False if a measurement is over its budget, a
+    pipeline stage has regressed, or results differ from the reference
+    ones; benchmarks with nothing to measure in the local cache don't
+    count.
+    '''
+    if suite == "pipeline":
+        return len(benchmarkPipeline(resultsPath=resultsPath)) == 0
+    passed = [benchmarkImport()]
+    benchmarkMinutesStorage()
+    passed.append(benchmarkDocRegTableExtraction() is not False)
+    passed.append(benchmarkParallelParsing() is not False)
+    passed.append(len(benchmarkPipeline(resultsPath=resultsPath)) == 0)
+    return all(passed)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Runs the benchmarks for the utc_actions module.")
+    parser.add_argument("suite", nargs="?", choices=["pipeline"], help="run only the offline pipeline suite")
+    parser.add_argument("--results", help="file to save the pipeline results to (default: benchmark_results.jsonl in the cache folder)")
+    args = parser.parse_args()
+    sys.exit(0 if runBenchmarks(args.suite, args.results) else 1)
@@ -0,0 +1,104 @@
+import pickle
+import re
+import shutil
+import sys
+from pathlib import Path
+
+import pytest
+
+# The modules are imported from the UTC_Actions folder, as when it's the
+# working folder.
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import utc_actions
+import utc_fetch
+from benchmark_corpus import CorpusServer, generateCorpus, useCorpusServer
+
+
+# Tests that retrieve pages use a small generated corpus (see
+# benchmark_corpus.py), served on the loopback interface in place of the
+# Unicode site, and a cache folder of their own.
+testCorpusParameters = {
+    "seed": 1,
+    "docsPerYear": 20,
+    "meetingsPerYear": 2,
+    "paragraphsPerMeeting": 10
+    }
+
+
+@pytest.fixture(scope="session")
+def corpusFolder(tmp_path_factory):
+    folder = tmp_path_factory.mktemp("corpus")
+    generateCorpus(folder, **testCorpusParameters)
+    return folder
+
+
+@pytest.fixture(scope="session")
+def corpusServer(corpusFolder):
+    with CorpusServer(corpusFolder) as server:
+        yield server
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    '''An empty cache folder for utc_actions, and a new fetcher; the
+    registry URLs, the cache folder and the fetcher are restored after the
+    test.
+    '''
+    monkeypatch.setattr(utc_actions, "utcDocRegistry_urls", dict(utc_actions.utcDocRegistry_urls))
+    previousRoot = utc_actions.cacheRoot
+    folder = tmp_path / "cache"
+    utc_actions.setCacheRoot(folder)
+    utc_fetch.setFetcher(utc_fetch.Fetcher())
+    yield folder
+    utc_actions.setCacheRoot(previousRoot)
+    utc_fetch.setFetcher(None)
+
+
+@pytest.fixture
+def servedCache(cache, corpusServer):
+    '''An empty cache folder, with the registry URLs pointed at the corpus
+    server.
+    '''
+    useCorpusServer(corpusServer.baseUrl)
+    return cache
+
+
+@pytest.fixture
+def corpusCopy(cache, corpusFolder, tmp_path):
+    '''(folder, server) for a copy of the corpus that a test can change,
+    served by a corpus server of its own; the registry URLs are pointed at
+    it.
+    '''
+    folder = tmp_path / "corpus"
+    shutil.copytree(corpusFolder, folder)
+    with CorpusServer(folder) as server:
+        useCorpusServer(server.baseUrl)
+        yield folder, server
+
+
+@pytest.fixture
+def pickleJar(servedCache, corpusFolder, corpusServer):
+    '''The cache folder, with the .pickle files that earlier versions of
+    utc_actions kept for the corpus: registry pages, registry tables, and
+    minutes entries with the page as str.
+    '''
+    def read(url):
+        return (corpusFolder / url[len(corpusServer.baseUrl):]).read_text(encoding="utf-8")
+
+    pages = {year: read(url) for year, url in utc_actions.utcDocRegistry_urls.items()}
+    tables = {year: utc_actions.getDocRegTableFromPage(page) for year, page in pages.items()}
+    minutes = {}
+    for mtg, (year, sequenceInYear, row, url) in utc_actions.MeetingCatalog.fromTables(tables).meetings.items():
+        page = read(url)
+        title = re.search("<title>(.*)</title>", page).group(1)
+        minutes[mtg] = [year, sequenceInYear, str(row[0]), title, page]
+
+    servedCache.mkdir(parents=True)
+    for fileName, data in [
+            (utc_actions.utcDocRegPages_pickleFile, pages),
+            (utc_actions.utcDocRegTables_pickleFile, tables),
+            (utc_actions.utcMinutesPages_pickleFile, minutes)]:
+        with open(servedCache / fileName, "wb") as file:
+            pickle.dump(data, file, protocol=pickle.HIGHEST_PROTOCOL)
+    return servedCache
@@ -0,0 +1,244 @@
+# Tests for tagged actions (utc_actions.py): action records and the
+# columnar action table, the index of actions by action ID, and extraction
+# with a pool of worker processes; and untagged actions, classified by type
+# in one pass over each minutes doc.
+
+from array import array
+import re
+
+import pytest
+
+import utc_actions
+from utc_actions import UtcAction
+from utc_store import UtcStore, getPageHash
+
+
+@pytest.fixture
+def refreshed(servedCache):
+    # the corpus, retrieved and indexed
+    utc_actions.refreshUtcData()
+    return servedCache
+
+
+minutesPage = (
+    '<html><head><title>UTC #150 Minutes</title></head><body>\n'
+    '<p>[<a name="150-C1">150-C1</a>] Consensus: accept  the\n proposal.</p>\n'
+    '<p>Discussion of fonts</p>\n'
+    '<p>[<a name="150-A2">150-A2</a>] Action Item for Rick: update the FAQ.</p>\n'
+    '<p>[<a name="150-M3">150-M3</a>a] Motion: approve the agenda.</p>\n'
+    '<p>[<a name="N4">-N4</a>] Note: the emoji proposal.</p>\n'
+    '</body></html>'
+    )
+minutesEntry = [2017, 1, "L2/17-001", "UTC #150 Minutes", minutesPage]
+
+
+def getMeetingActions(meetingNumber):
+    return utc_actions.findTaggedActionRecordsInMinutes(utc_actions.getUtcMinutes()[meetingNumber], meetingNumber)
+
+
+def testFindUtcActionUsesTheIndex(refreshed, monkeypatch):
+    actions = getMeetingActions(100)
+    def parse(page):
+        raise AssertionError("minutes parsed for a lookup")
+    monkeypatch.setattr(utc_actions, "_minutesDocCache", {})
+    monkeypatch.setattr(utc_actions, "parseMinutesDoc", parse)
+    monkeypatch.setattr(utc_actions, "getMinutesDoc", parse)
+    for action in actions:
+        assert utc_actions.findUtcAction(action.actionId) == action.text
+    assert utc_actions.findUtcAction("100-C999") is None
+    assert utc_actions.findUtcAction("not an ID") is None
+
+
+def testBatchLookup(refreshed):
+    actions = getMeetingActions(100) + getMeetingActions(105)
+    found = utc_actions.findUtcActions([a.actionId for a in actions] + ["105-A999"])
+    assert found == dict({a.actionId: a.text for a in actions}, **{"105-A999": None})
+    entries = utc_actions.getUtcActionIndexEntries(a.actionId for a in actions)
+    assert list(entries.values()) == actions
+
+
+def testIndexCoversStoredMinutes(refreshed):
+    store = utc_actions.getStore()
+    assert set(store.getActionIndexMeetings()) == set(store.getMinutesMeetings())
+    assert store.getActionIndexStaleMeetings() == []
+
+
+def testEveryActionOccurrenceIsKept(tmp_path):
+    store = UtcStore(tmp_path / "utcCache.sqlite3")
+    # an action ID repeated in one meeting, and in a later meeting
+    store.putMeetingActions(150, "h150", [UtcAction(150, "150-A1", "A", "first", 0), UtcAction(150, "150-A1", "A", "again", 1), UtcAction(150, "150-C2", "C", "text", 2)])
+    store.putMeetingActions(151, "h151", [UtcAction(151, "150-A1", "A", "carried over", 0)])
+    found = store.getActions(["150-A1", "150-C2", "999-A1"])
+    assert [(mtg, text, position) for (mtg, actionType, text, position, start, end) in found["150-A1"]] == [
+        (150, "first", 0), (150, "again", 1), (151, "carried over", 0)
+        ]
+    assert len(found["150-C2"]) == 1
+    assert "999-A1" not in found
+    assert store.getActionIndexMeetings() == {150: "h150", 151: "h151"}
+
+    # a meeting's actions are replaced as a whole
+    store.putMeetingActions(150, "h150b", [UtcAction(150, "150-M1", "M", "text", 0)])
+    assert [(actionId, mtg) for (actionId, mtg, *rest) in store.getAllActions()] == [("150-M1", 150), ("150-A1", 151)]
+    store.close()
+
+
+def testRepeatedActionId():
+    # the first occurrence in the meeting the ID names, else the first in
+    # the latest meeting
+    occurrences = [(100, "A", "named", 3, 0, 0), (100, "A", "again", 4, 0, 0), (101, "A", "later", 0, 0, 0), (101, "A", "again", 1, 0, 0)]
+    assert utc_actions._chooseActionOccurrence("100-A1", occurrences)[2] == "named"
+    assert utc_actions._chooseActionOccurrence("99-A1", occurrences)[2] == "later"
+
+
+#--------------------------------------------------------
+#  Action records and the action table
+
+def testActionRecords(cache):
+    records = utc_actions.findTaggedActionRecordsInMinutes(minutesEntry, 150)
+    assert [(r.actionId, r.actionType, r.position) for r in records] == [
+        ("150-C1", "C", 0), ("150-A2", "A", 1), ("150-M3a", "M", 2), ("150-N4", "N", 3)
+        ]
+    assert records[0] == UtcAction(150, "150-C1", "C", "[150-C1] Consensus: accept the proposal.", 0, records[0].start, records[0].end)
+    assert minutesPage[records[0].start:records[0].end] == "150-C1"
+    assert all(r.meetingNumber == 150 for r in records)
+    with pytest.raises(AttributeError):
+        records[0].extra = 1
+
+    # records for one type keep their position among all actions
+    assert [(r.actionId, r.position) for r in utc_actions.findTaggedActionRecordsInMinutes(minutesEntry, 150, "decision")] == [
+        ("150-C1", 0), ("150-M3a", 2)
+        ]
+    assert utc_actions.findTaggedActionRecordsInMinutes(minutesEntry, 150, "unknown") is None
+
+
+def testActionTable(cache):
+    records = utc_actions.findTaggedActionRecordsInMinutes(minutesEntry, 150)
+    records.append(UtcAction(151, "151-C1", "C", "Consensus: the FAQ", 0))
+    table = utc_actions.UtcActionTable.fromRecords(records)
+    assert len(table) == 5
+    assert list(table.getRecords()) == records
+    assert table.getText(4) == "Consensus: the FAQ"
+    assert list(table.filterTypes("consensus")) == [0, 4]
+    assert list(table.filterTypes("decision")) == [0, 2, 4]
+    assert list(table.filterMeetings(151)) == [4]
+    assert list(table.filterText("faq")) == [1, 4]
+    assert list(table.filterText("faq", ignoreCase=False)) == []
+    rows = utc_actions.intersectRows(table.filterTypes("consensus"), table.filterText("FAQ"))
+    assert rows == array("L", [4])
+    assert [r.actionId for r in table.getRecords(rows)] == ["151-C1"]
+
+
+def testActionTableFromIndex(refreshed):
+    table = utc_actions.getUtcActionTable()
+    records = list(utc_actions.iterTaggedActionRecords())
+    assert sorted((r.meetingNumber, r.position) for r in table.getRecords()) == [(r.meetingNumber, r.position) for r in records]
+    assert len(utc_actions.getUtcActionTable("motion")) == sum(r.actionType == "M" for r in records)
+
+
+#--------------------------------------------------------
+#  Extraction on a pool of worker processes
+
+@pytest.fixture
+def corpusMinutes(corpusFolder):
+    # {mtg#: minutes entry} for the minutes pages of the corpus, not stored
+    minutes = {}
+    for path in sorted(corpusFolder.glob("L2/*/*.htm")):
+        page = path.read_text(encoding="utf-8")
+        mtg = int(re.search("UTC #([0-9]+)", page).group(1))
+        minutes[mtg] = [2020, 1, f"L2/20-{mtg}", f"UTC #{mtg} Minutes", page]
+    return dict(sorted(minutes.items()))
+
+
+def testParallelParsing(cache, corpusMinutes):
+    pages = [entry[-1] for entry in corpusMinutes.values()]
+    assert utc_actions.parseMinutesPages(pages, workers=2, chunksize=3) == [utc_actions.parseMinutesDoc(page) for page in pages]
+
+
+def testParallelExtractionGivesTheSameResults(cache, corpusMinutes, tmp_path, monkeypatch):
+    def extract(folder, workers):
+        utc_actions.setCacheRoot(folder)
+        monkeypatch.setattr(utc_actions, "_minutesDocCache", {})
+        actions = utc_actions.compileTaggedActionsFromAllMinutes(minutesData=corpusMinutes, workers=workers, chunksize=2)
+        path = folder / "actions.txt"
+        utc_actions.writeToFileTaggedActionsFromAllMinutes(str(path), "decision", corpusMinutes, workers=workers)
+        return actions, path.read_bytes()
+
+    serialActions, serialFile = extract(tmp_path / "serial", 1)
+    parallelActions, parallelFile = extract(tmp_path / "parallel", 2)
+    assert len(serialActions) > 0
+    assert parallelActions == serialActions
+    assert parallelFile == serialFile
+    # the pages of tagged minutes were parsed by the pool, and the docs
+    # stored
+    store = utc_actions.getStore()
+    for entry in (entry for mtg, entry in corpusMinutes.items() if mtg >= 90):
+        assert store.getMinutesDoc(f"{utc_actions.minutesDocVersion}:{getPageHash(entry[-1])}") is not None
+
+
+#--------------------------------------------------------
+#  Untagged actions, all types in one pass
+
+untaggedPage = (
+    '<html><head><title>UTC #80 Minutes</title></head><body>\n'
+    '<p>ACTION ITEM for Rick: update the FAQ.</p>\n'
+    '<p>Consensus: accept the proposal.</p>\n'
+    '<p>The consensus was not recorded.</p>\n'
+    '<p>Motion to approve; see the Action item below.</p>\n'
+    '<blockquote>Note: <b>the emoji</b> proposal</blockquote>\n'
+    '<p>Notes on fonts</p>\n'
+    '</body></html>'
+    )
+untaggedEntry = [2000, 1, "L2/00-001", "UTC #80 Minutes", untaggedPage]
+
+# a pattern for each type, as searched for one type at a time
+typePatterns = {
+    "AI": "A(C|c)(T|t)(I|i)(O|o)(N|n) (I|i)(T|t)(E|e)(M|m)",
+    "consensus": "C(O|o)(N|n)(S|s)(E|e)(N|n)(S|s)(U|u)(S|s)",
+    "motion": "M(O|o)(T|t)(I|i)(O|o)(N|n)",
+    "note": "N(O|o)(T|t)(E|e):"
+    }
+
+
+def scanActionType(entry, actionType):
+    minutesDoc = utc_actions.getMinutesDoc(entry)
+    pattern = re.compile(typePatterns[actionType])
+    return [
+        minutesDoc["paragraphs"][block]
+        for text, block in zip(minutesDoc["nodeTexts"], minutesDoc["nodeBlocks"])
+        if block is not None and pattern.search(text) is not None
+        ]
+
+
+def testAllTypesInOnePass(cache):
+    actions = utc_actions.findAllActionsInMinutes(untaggedEntry)
+    assert actions == {
+        "AI": ["ACTION ITEM for Rick: update the FAQ.", "Motion to approve; see the Action item below."],
+        "consensus": ["Consensus: accept the proposal."],
+        "motion": ["Motion to approve; see the Action item below."],
+        "note": ["Note: the emoji proposal"]
+        }
+    for actionType in utc_actions.untaggedActionTypes:
+        assert utc_actions.findActionsInMinutes(untaggedEntry, actionType) == actions[actionType]
+        assert scanActionType(untaggedEntry, actionType) == actions[actionType]
+
+
+def testAllTypesMatchSeparateScans(refreshed):
+    minutes = utc_actions.getUtcMinutes()
+    for mtg in minutes:
+        actions = utc_actions.findAllActionsInMinutes(minutes[mtg])
+        assert actions == {actionType: scanActionType(minutes[mtg], actionType) for actionType in utc_actions.untaggedActionTypes}
+
+
+def testMinutesAreReadOncePerMeeting(refreshed, monkeypatch):
+    minutes = utc_actions.getUtcMinutes()
+    reads = []
+    getMinutesDoc = utc_actions.getMinutesDoc
+    def countReads(doc):
+        reads.append(doc[2])
+        return getMinutesDoc(doc)
+    monkeypatch.setattr(utc_actions, "getMinutesDoc", countReads)
+    allActions = utc_actions.compileAllActionsFromAllMinutes()
+    assert sorted(reads) == sorted(entry[2] for entry in minutes.values())
+    assert sum(len(actions) for actions in allActions["consensus"].values()) > 0
+    assert utc_actions.compileActionsFromAllMinutes("consensus") == allActions["consensus"]
+    assert utc_actions.compileActionsFromAllMinutes("unknown") is None
@@ -0,0 +1,50 @@
+# Tests for the benchmark runner (benchmarks.py): the comparison of
+# pipeline runs with the previous run, and the overall result, which sets
+# the exit status.
+
+import json
+
+import pytest
+
+import benchmarks
+
+
+def stages(seconds):
+    return {stage: benchmarks.getStageResult(s, 1024, {"pages": 10}) for stage, s in seconds.items()}
+
+
+def testFindRegressions():
+    previousRun = {"stages": stages({"fetch": 1.0, "parse": 1.0})}
+    run = {"stages": stages({"fetch": 1.2, "parse": 1.5, "search": 9.0})}
+    assert benchmarks.findRegressions(run, previousRun) == [("parse", 1.0, 1.5)]
+
+
+def testPipelineReturnsRegressions(tmp_path, monkeypatch):
+    runs = iter([stages({"fetch": 1.0, "parse": 1.0}), stages({"fetch": 1.0, "parse": 2.0})])
+    monkeypatch.setattr(benchmarks, "runPipelineBenchmark", lambda repeat: next(runs))
+    monkeypatch.setattr(benchmarks, "getVersion", lambda: "v1")
+    path = tmp_path / "results.jsonl"
+    assert benchmarks.benchmarkPipeline(resultsPath=path) == []
+    assert benchmarks.benchmarkPipeline(resultsPath=path) == [("parse", 1.0, 2.0)]
+    saved = [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+    assert [run["stages"]["parse"]["seconds"] for run in saved] == [1.0, 2.0]
+
+
+@pytest.mark.parametrize("withinBudget, extraction, parsing, regressions, passed", [
+    (True, True, True, [], True),
+    # nothing in the local cache to measure
+    (True, None, None, [], True),
+    (False, True, True, [], False),
+    (True, False, True, [], False),
+    (True, True, False, [], False),
+    (True, True, True, [("parse", 1.0, 2.0)], False)
+    ])
+def testOverallResult(monkeypatch, withinBudget, extraction, parsing, regressions, passed):
+    monkeypatch.setattr(benchmarks, "benchmarkImport", lambda: withinBudget)
+    monkeypatch.setattr(benchmarks, "benchmarkMinutesStorage", lambda: None)
+    monkeypatch.setattr(benchmarks, "benchmarkDocRegTableExtraction", lambda: extraction)
+    monkeypatch.setattr(benchmarks, "benchmarkParallelParsing", lambda: parsing)
+    monkeypatch.setattr(benchmarks, "benchmarkPipeline", lambda resultsPath: regressions)
+    assert benchmarks.runBenchmarks() is passed
+    # the pipeline suite alone only depends on the regressions
+    assert benchmarks.runBenchmarks("pipeline") is (len(regressions) == 0)
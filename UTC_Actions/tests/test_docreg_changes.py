@@ -0,0 +1,87 @@
+# Tests for the row-level updates of doc registry tables (utc_actions.py):
+# comparing two versions of a table by doc number, storing only the rows
+# that differ, and the log of changes, including for a change to the live
+# current-year registry page picked up by a refresh.
+
+from urllib.parse import urlsplit
+
+import utc_actions
+
+
+table = [
+    ["L2/19-001", "19001-agenda.htm", "Preliminary agenda", "Rick McGowan", "2019-01-07"],
+    ["L2/19-002", "", "Proposal", "Deborah Anderson", "2019-01-08"],
+    ["L2/19-002", "19002r.pdf", "Proposal (revised)", "Deborah Anderson", "2019-01-09"],
+    ["L2/19-003", "19003.pdf", "Feedback", "Ken Whistler", "2019-01-10"]
+    ]
+
+
+def testDiff():
+    newRow = ["L2/19-004", "19004.pdf", "Added", "Author", "2019-01-11"]
+    changedRow = ["L2/19-002", "19002.pdf", "Proposal", "Deborah Anderson", "2019-01-08"]
+    newTable = [changedRow, table[2], table[0], newRow]
+    changes, rows = utc_actions.diffDocRegTables(table, newTable)
+    assert changes == [
+        ("L2/19-002", "changed", table[1], changedRow),
+        ("L2/19-004", "added", None, newRow),
+        ("L2/19-003", "withdrawn", table[3], None)
+        ]
+    # the repeated doc number is keyed by its order
+    assert rows == [("L2/19-002", 0, changedRow), ("L2/19-002#2", 1, table[2]), ("L2/19-001", 2, table[0]), ("L2/19-004", 3, newRow)]
+    assert utc_actions.diffDocRegTables(table, table) == ([], [])
+
+
+def testChangesAreStoredAndLogged(cache):
+    store = utc_actions.getStore()
+    store.putDocRegTables({2019: table})
+    newRow = ["L2/19-004", "19004.pdf", "Added", "Author", "2019-01-11"]
+    newTable = table[:3] + [newRow]
+    updated, changes = utc_actions.applyDocRegTableChanges(2019, table, newTable)
+    assert updated == newTable
+    assert all(updated[i] is table[i] for i in range(3))
+    assert [(c.year, c.docKey, c.change) for c in changes] == [(2019, "L2/19-004", "added"), (2019, "L2/19-003", "withdrawn")]
+    assert store.getDocRegTable(2019) == newTable
+
+    logged = utc_actions.getDocRegChanges()
+    assert [(c.docKey, c.change, c.oldRow, c.newRow) for c in logged] == [
+        ("L2/19-004", "added", None, newRow), ("L2/19-003", "withdrawn", table[3], None)
+        ]
+    assert utc_actions.getDocRegChanges(logged[0].id) == logged[1:]
+    assert utc_actions.applyDocRegTableChanges(2019, updated, newTable) == (updated, [])
+    assert len(utc_actions.getDocRegChanges()) == 2
+
+
+def testRefreshAppliesRegistryChanges(corpusCopy):
+    folder, server = corpusCopy
+    utc_actions.refreshUtcData()
+    assert utc_actions.getLastDocRegChanges() == []
+    store = utc_actions.getStore()
+    version = store.getDocRegTablesVersion()
+
+    # the live registry page gets a new row, and a row is revised
+    year = max(utc_actions.utcDocRegistry_urls)
+    yy = str(year)[2:]
+    path = folder / urlsplit(utc_actions.utcDocRegistry_urls[year]).path.lstrip("/")
+    oldTable = utc_actions.getUtcDocRegTables()[year]
+    revised = oldTable[0]
+    page = path.read_text(encoding="utf-8")
+    page = page.replace(f"<td>{revised[2]}</td>", "<td>Revised subject</td>", 1)
+    page = page.replace("</table>\n</div>", (
+        f'<tr>\n<td><a href="{yy}999-doc.pdf">L2/{yy}-999</a></td>\n'
+        f'<td>Added document</td>\n<td>Author</td>\n<td>{year}-12-30</td>\n</tr>\n'
+        '</table>\n</div>'
+        ))
+    path.write_text(page, encoding="utf-8")
+
+    requests = server.requests
+    utc_actions.refreshUtcData()
+    assert server.requests == requests + 1
+    changes = utc_actions.getLastDocRegChanges()
+    assert [(c.year, c.docKey, c.change) for c in changes] == [(year, revised[0], "changed"), (year, f"L2/{yy}-999", "added")]
+    assert changes[0].oldRow == revised and changes[0].newRow[2] == "Revised subject"
+    assert [(c.docKey, c.change) for c in utc_actions.getDocRegChanges()] == [(c.docKey, c.change) for c in changes]
+
+    newTable = utc_actions.getDocRegTableFromPage(page)
+    assert utc_actions.getUtcDocRegTables()[year] == newTable
+    assert store.getDocRegTable(year) == newTable
+    assert store.getDocRegTablesVersion() != version
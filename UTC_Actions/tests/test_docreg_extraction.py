@@ -0,0 +1,70 @@
+# Regression tests for the lxml extraction of doc registry tables
+# (getDocRegTableFromPage()), checked against the Beautiful Soup reference
+# (getDocRegTableFromPageUsingSoup()) on saved registry pages with the
+# markup that matters for it: &nbsp;, comments, <br>, and a cp1252 page
+# whose encoding is declared in a <meta> element.
+
+from pathlib import Path
+
+import pytest
+
+import utc_actions
+from utc_fetch import FetchedPage, getDeclaredEncoding
+
+
+fixturesFolder = Path(__file__).parent / "fixtures" / "docreg"
+pageNames = ["nbsp", "comments", "br", "cp1252"]
+
+
+def loadPage(name):
+    # the page as retrieved: raw bytes, with the declared encoding
+    content = (fixturesFolder / f"{name}.html").read_bytes()
+    return FetchedPage(content, getDeclaredEncoding({}, content))
+
+
+@pytest.mark.parametrize("name", pageNames)
+def testLxmlExtractionMatchesSoup(name):
+    page = loadPage(name)
+    assert utc_actions.getDocRegTableFromPage(page) == utc_actions.getDocRegTableFromPageUsingSoup(page)
+    assert utc_actions.verifyDocRegTableExtraction({name: page}) == []
+
+
+@pytest.mark.parametrize("name", pageNames)
+def testDecodedPageGivesSameTable(name):
+    page = loadPage(name)
+    assert utc_actions.getDocRegTableFromPage(page.text()) == utc_actions.getDocRegTableFromPage(page)
+
+
+def testNonBreakingSpaces():
+    table = utc_actions.getDocRegTableFromPage(loadPage("nbsp"))
+    # the heading row and rows of just spaces are left out
+    assert [row[0] for row in table] == ["L2/03-001", "\xa0L2/03-002", "L2/03-003", "L2/03-004"]
+    assert table[0] == ["L2/03-001", "03001-agenda.htm", "Preliminary\xa0agenda for UTC\xa0#94", "Rick\xa0McGowan", "2003-01-06\xa0"]
+    assert table[2][1] == ""
+
+
+def testComments():
+    table = utc_actions.getDocRegTableFromPage(loadPage("comments"))
+    # commented-out rows, comments and scripts in cells are left out
+    assert [row[0] for row in table] == ["L2/10-001", "L2/10-003", "L2/10-004"]
+    assert table[0][2:] == ["Script proposal for Tifinagh", "Author", "2010-01-04"]
+    assert table[1][2] == "Feedback on UAX #9"
+    assert table[2][2] == "Comments & responses"
+
+
+def testLineBreaks():
+    table = utc_actions.getDocRegTableFromPage(loadPage("br"))
+    # <br> adds no text; newlines in the source are kept
+    assert table[0][2:4] == ["Proposal to encodeadditional characters(revised)", "Deborah AndersonRick McGowan"]
+    assert table[1][2:5] == ["Line one\n  continued on a new line\nline two", "A. Author,\nB. Author", "2015-01-06"]
+    assert table[2][1:3] == ["NOTPOSTED", "Starts with a break"]
+    assert table[3][3] == "pre  formatted\n   source"
+
+
+def testWindows1252Page():
+    page = loadPage("cp1252")
+    assert page.encoding == "cp1252"
+    table = utc_actions.getDocRegTableFromPage(page)
+    assert table[0][2:4] == ["“Smart quotes” – and the Euro sign €", "Fran\xe7ois Y\xe9rgeau"]
+    assert table[1][3] == "J\xfcrgen B\xf6hm\xa0— Ng\xf4"
+    assert table[2][2] == "Character references: \xe9 “x” \xe9"
@@ -0,0 +1,126 @@
+# Tests for the export of records (utc_export.py): writing JSONL, CSV and
+# Parquet files with a fixed set of fields, the choice of format, and the
+# errors for unsupported formats and failing record sources; and the
+# exports of actions and search results (utc_actions.py).
+
+import csv
+import json
+
+import pytest
+
+import utc_actions
+import utc_export
+from utc_export import actionFields, exportRecords, getExportFormat, minutesSearchFields
+
+
+records = [
+    {"meeting": 150, "actionId": "150-A1", "actionType": "A", "text": "Update the “FAQ”, é ✓", "position": 0, "sourceStart": 10, "sourceEnd": 16},
+    # a missing field, and fields that aren't in the schema
+    {"meeting": 150, "actionId": "150-C2", "actionType": "C", "text": "Line one,\nline two", "position": 1, "extra": "ignored"}
+    ]
+fieldNames = [name for name, _ in actionFields]
+
+
+def testJsonl(tmp_path):
+    path = tmp_path / "actions.jsonl"
+    assert exportRecords(path, iter(records), actionFields) == 2
+    lines = path.read_text(encoding="utf-8").splitlines()
+    assert [list(json.loads(line)) for line in lines] == [fieldNames, fieldNames]
+    assert json.loads(lines[0]) == records[0]
+    assert json.loads(lines[1])["sourceStart"] is None
+    assert "extra" not in json.loads(lines[1])
+
+
+def testCsv(tmp_path):
+    path = tmp_path / "actions.csv"
+    assert exportRecords(path, records, actionFields) == 2
+    with open(path, encoding="utf-8", newline="") as f:
+        rows = list(csv.reader(f))
+    assert rows[0] == fieldNames
+    assert rows[1] == ["150", "150-A1", "A", "Update the “FAQ”, é ✓", "0", "10", "16"]
+    assert rows[2] == ["150", "150-C2", "C", "Line one,\nline two", "1", "", ""]
+
+
+def testParquet(tmp_path, monkeypatch):
+    pyarrowParquet = pytest.importorskip("pyarrow.parquet")
+    monkeypatch.setattr(utc_export, "parquetRowGroupSize", 2)
+    path = tmp_path / "actions.parquet"
+    assert exportRecords(path, records * 2 + records[:1], actionFields) == 5
+    parquetFile = pyarrowParquet.ParquetFile(path)
+    assert parquetFile.metadata.num_row_groups == 3
+    assert [(field.name, str(field.type)) for field in parquetFile.schema_arrow] == [
+        (name, "int64" if fieldType == "int" else "string") for name, fieldType in actionFields
+        ]
+    rows = parquetFile.read().to_pylist()
+    assert rows[0] == records[0]
+    assert rows[1]["sourceEnd"] is None
+
+
+def testEmptyExport(tmp_path):
+    path = tmp_path / "results.csv"
+    assert exportRecords(path, [], minutesSearchFields) == 0
+    assert path.read_text(encoding="utf-8").splitlines() == ["meeting,match,text"]
+
+
+def testExportFormat():
+    assert getExportFormat("results.JSONL") == "jsonl"
+    assert getExportFormat("results.txt", "csv") == "csv"
+    with pytest.raises(ValueError, match="unsupported export format 'txt'"):
+        getExportFormat("results.txt")
+    with pytest.raises(ValueError):
+        getExportFormat("results.csv", "xlsx")
+
+
+def testUnsupportedFormatWritesNothing(tmp_path):
+    with pytest.raises(ValueError):
+        exportRecords(tmp_path / "results.txt", records, actionFields)
+    assert list(tmp_path.iterdir()) == []
+
+
+def testFailingRecordsCloseTheFile(tmp_path):
+    def failingRecords():
+        yield records[0]
+        raise RuntimeError("source failed")
+
+    path = tmp_path / "actions.jsonl"
+    with pytest.raises(RuntimeError, match="source failed"):
+        exportRecords(path, failingRecords(), actionFields)
+    # what was produced before the failure is written out
+    assert [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()] == [records[0]]
+
+
+#--------------------------------------------------------
+#  Exports of actions and search results
+
+@pytest.fixture
+def refreshed(servedCache):
+    utc_actions.refreshUtcData()
+    return servedCache
+
+
+def testExportTaggedActions(refreshed, tmp_path):
+    path = tmp_path / "actions.jsonl"
+    actions = list(utc_actions.iterTaggedActionRecords("motion"))
+    assert utc_actions.exportTaggedActions(str(path), "motion") == len(actions) > 0
+    exported = [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+    assert [(r["meeting"], r["actionId"], r["text"], r["position"]) for r in exported] == [
+        (a.meetingNumber, a.actionId, a.text, a.position) for a in actions
+        ]
+    assert {r["actionType"] for r in exported} == {"M"}
+    assert utc_actions.exportTaggedActions(str(tmp_path / "none.csv"), "unknown") is None
+
+
+def testExportSearchResults(refreshed, tmp_path):
+    path = tmp_path / "minutes.csv"
+    results = utc_actions.searchForTextInAllMinutes("emoji encoding")
+    assert utc_actions.exportMinutesSearchResults(str(path), "emoji encoding") == sum(len(r) for r in results.values())
+    with open(path, encoding="utf-8", newline="") as f:
+        rows = list(csv.DictReader(f))
+    assert [(int(r["meeting"]), r["text"]) for r in rows] == [(mtg, result) for mtg, mtgResults in results.items() for result in mtgResults]
+
+    path = tmp_path / "registry.jsonl"
+    results = utc_actions.searchForTextInAllDocRegTables("proposal")
+    assert utc_actions.exportDocRegistrySearchResults(str(path), "proposal") == sum(len(r) for r in results.values())
+    exported = [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+    assert [(r["year"], r["docNum"]) for r in exported] == [(year, row[0]) for year, rows in results.items() for row in rows]
+    assert exported[0]["match"] == 1
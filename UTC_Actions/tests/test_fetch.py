@@ -0,0 +1,257 @@
+# Tests for the fetch layer (utc_fetch.py), against the corpus server (see
+# conftest.py): concurrent fetches, per-host spacing of requests, errors,
+# conditional requests, recording and replaying responses, retries against
+# a slow server that fails some requests, and finding page encodings.
+
+import threading
+import time
+
+import pytest
+import requests
+
+import utc_actions
+from benchmark_corpus import CorpusServer
+from utc_fetch import Cassette, FetchedPage, Fetcher, detectEncoding, getContentHash, getDeclaredEncoding
+from utc_instrument import SummarySink, recording
+
+
+registryPaths = [f"L2/L{year}/Register-{year}.html" for year in range(2010, 2018)]
+
+
+def testFetchAllKeepsTheOrderOfUrls(corpusServer, corpusFolder):
+    fetcher = Fetcher(maxWorkers=4)
+    pages = fetcher.fetchAll(corpusServer.baseUrl + path for path in registryPaths)
+    assert all(isinstance(page, FetchedPage) for page in pages)
+    assert [page.content for page in pages] == [(corpusFolder / path).read_bytes() for path in registryPaths]
+    assert {page.encoding for page in pages} == {"utf-8"}
+
+
+def testFetchAllRunsConcurrently():
+    fetcher = Fetcher(maxWorkers=4)
+    running = []
+    maxRunning = []
+    lock = threading.Lock()
+
+    def fetch(url):
+        with lock:
+            running.append(url)
+            maxRunning.append(len(running))
+        time.sleep(0.05)
+        with lock:
+            running.remove(url)
+        return url
+
+    urls = [f"u{i}" for i in range(8)]
+    assert fetcher.fetchAll(urls, fetch) == urls
+    assert max(maxRunning) == 4
+
+
+def testFetchAllStopsAtFirstFailure():
+    fetcher = Fetcher(maxWorkers=2)
+    started = []
+
+    def fetch(url):
+        started.append(url)
+        if url == "u0":
+            raise ValueError("failed")
+        time.sleep(0.05)
+        return url
+
+    with pytest.raises(ValueError, match="failed"):
+        fetcher.fetchAll([f"u{i}" for i in range(20)], fetch)
+    # fetches that hadn't started were cancelled
+    assert len(started) < 5
+
+
+def testRequestsToAHostAreSpacedOut(corpusServer):
+    fetcher = Fetcher(maxWorkers=4, minHostInterval=0.05)
+    t = time.perf_counter()
+    fetcher.fetchAll(corpusServer.baseUrl + path for path in registryPaths[:5])
+    assert time.perf_counter() - t >= 0.2
+
+
+def testMissingPage(corpusServer):
+    fetcher = Fetcher()
+    with pytest.raises(requests.HTTPError):
+        fetcher.fetchPage(corpusServer.baseUrl + "L2/missing.html")
+
+
+#--------------------------------------------------------
+#  Conditional requests
+
+def testNotModified(corpusServer):
+    fetcher = Fetcher()
+    url = corpusServer.baseUrl + registryPaths[0]
+    page, validators = fetcher.fetchPageIfChanged(url)
+    assert page is not None
+    assert validators["etag"] is not None
+    assert validators["hash"] == getContentHash(page.content)
+    assert validators["encoding"] == "utf-8"
+    assert fetcher.fetchPageIfChanged(url, validators) == (None, validators)
+
+
+def testUnchangedContent(corpusServer):
+    # no ETag to send, but the content hash is the same
+    fetcher = Fetcher()
+    url = corpusServer.baseUrl + registryPaths[0]
+    page, validators = fetcher.fetchPageIfChanged(url)
+    page, newValidators = fetcher.fetchPageIfChanged(url, {"hash": validators["hash"]})
+    assert page is None
+    assert newValidators == validators
+    page, newValidators = fetcher.fetchPageIfChanged(url, {"hash": "other"})
+    assert page is not None
+
+
+def testRefreshRevalidatesTheCurrentYearPage(servedCache, corpusServer):
+    utc_actions.refreshUtcData()
+    url = utc_actions.utcDocRegistry_urls[2025]
+    assert utc_actions.getStore().getAllPageValidators()[url]["etag"] is not None
+    requests = corpusServer.requests
+    summary = SummarySink()
+    with recording(summary):
+        rebuilt = utc_actions.refreshUtcData()
+    # one request, answered with "not modified"
+    assert corpusServer.requests == requests + 1
+    assert summary.counters["fetch.notModified"] == 1
+    assert rebuilt["docRegTables"] == []
+
+
+#--------------------------------------------------------
+#  Recorded responses
+
+def testRecordAndReplay(corpusServer, corpusFolder, tmp_path):
+    path = tmp_path / "responses.zip"
+    urls = [corpusServer.baseUrl + p for p in registryPaths[:3]]
+    cassette = Cassette(path)
+    recorder = Fetcher(cassette=cassette, cassetteMode="record")
+    recorded = [recorder.fetchPageIfChanged(url) for url in urls]
+    # a "not modified" response isn't recorded over the page
+    assert recorder.fetchPageIfChanged(urls[0], recorded[0][1]) == (None, recorded[0][1])
+    cassette.save()
+
+    requestCount = corpusServer.requests
+    cassette = Cassette(path)
+    assert len(cassette) == 3 and urls[0] in cassette
+    player = Fetcher(cassette=cassette, cassetteMode="replay")
+    replayed = [player.fetchPageIfChanged(url) for url in urls]
+    assert [(page.content, page.encoding) for page, validators in replayed] == [(page.content, page.encoding) for page, validators in recorded]
+    assert [validators for page, validators in replayed] == [validators for page, validators in recorded]
+    assert replayed[0][0].content == (corpusFolder / registryPaths[0]).read_bytes()
+
+    # a conditional request gets "not modified"
+    summary = SummarySink()
+    with recording(summary):
+        assert player.fetchPageIfChanged(urls[0], replayed[0][1]) == (None, replayed[0][1])
+    assert summary.counters["fetch.notModified"] == 1
+    with pytest.raises(requests.ConnectionError, match="no recorded response"):
+        player.fetchPage(corpusServer.baseUrl + registryPaths[5])
+    # nothing was sent to the server
+    assert corpusServer.requests == requestCount
+
+
+def testUnknownCassetteMode(tmp_path):
+    with pytest.raises(ValueError):
+        Fetcher(cassette=Cassette(tmp_path / "responses.zip"), cassetteMode="other")
+
+
+#--------------------------------------------------------
+#  A slow server that fails some requests
+
+@pytest.fixture
+def faultyServer(corpusFolder):
+    with CorpusServer(corpusFolder, latency=0.01, errorRate=0.3, seed=2) as server:
+        yield server
+
+
+def testFailedRequestsAreRetried(faultyServer, corpusFolder):
+    fetcher = Fetcher(retries=10, backoffFactor=0)
+    urls = [faultyServer.baseUrl + p for p in registryPaths]
+    pages = fetcher.fetchAll(urls)
+    assert [page.content for page in pages] == [(corpusFolder / p).read_bytes() for p in registryPaths]
+    assert faultyServer.errors > 0
+    assert faultyServer.requests == len(urls) + faultyServer.errors
+
+
+def testFailuresWithoutRetries(faultyServer):
+    fetcher = Fetcher(retries=0)
+    urls = [faultyServer.baseUrl + p for p in registryPaths]
+    results = list(fetcher.fetchAsCompleted(urls))
+    failed = [url for url, page, error in results if error is not None]
+    assert len(failed) == faultyServer.errors > 0
+    assert all(isinstance(error, requests.RequestException) for url, page, error in results if error is not None)
+    assert all(page is not None for url, page, error in results if error is None)
+
+
+def testRevalidationWithRetries(faultyServer):
+    fetcher = Fetcher(retries=10, backoffFactor=0)
+    url = faultyServer.baseUrl + registryPaths[0]
+    page, validators = fetcher.fetchPageIfChanged(url)
+    assert page is not None and validators["etag"] is not None
+    for i in range(5):
+        assert fetcher.fetchPageIfChanged(url, validators) == (None, validators)
+
+
+#--------------------------------------------------------
+#  Page encodings
+
+@pytest.mark.parametrize("headers, content, encoding", [
+    ({"Content-Type": "text/html; charset=ISO-8859-1"}, b'<meta charset="utf-8">', "iso8859-1"),
+    ({"Content-Type": "text/html; charset=unknown"}, b'<meta charset="windows-1252">', "cp1252"),
+    ({}, "\ufeff<html>".encode("utf-8"), "utf-8"),
+    ({}, "\ufeff<html>".encode("utf-16-le"), "utf-16"),
+    ({}, b'<html><head><meta http-equiv="Content-Type" content="text/html; charset=windows-1252">', "cp1252"),
+    ({}, b'<html><head><META CHARSET=UTF-8>', "utf-8"),
+    ({"Content-Type": "text/html"}, b'<html><head><title>No encoding</title>', None),
+    # a <meta> declaration beyond the prescan isn't seen
+    ({}, b'<html>' + b' ' * 1024 + b'<meta charset="cp1252">', None)
+    ])
+def testDeclaredEncoding(headers, content, encoding):
+    assert getDeclaredEncoding(headers, content) == encoding
+
+
+def testDetectedEncoding():
+    text = "<html><body><p>Café, résumé, naïve — “quoted” façade</p></body></html>\n" * 20
+    summary = SummarySink()
+    with recording(summary):
+        assert detectEncoding(text.encode("utf-8")) == "utf-8"
+        # detected statistically: a single-byte encoding, though not
+        # necessarily cp1252
+        content = text.encode("cp1252")
+        encoding = detectEncoding(content)
+        assert encoding != "utf-8"
+        assert "Café, résumé" in content.decode(encoding)
+    assert summary.counters["fetch.encodingDetected"] == 2
+    assert summary.spans["fetch.detectEncoding"][0] == 2
+
+
+def testKnownEncodingIsNotDetectedAgain(corpusServer):
+    # the corpus pages don't declare an encoding
+    fetcher = Fetcher()
+    url = corpusServer.baseUrl + registryPaths[0]
+    summary = SummarySink()
+    with recording(summary):
+        page, validators = fetcher.fetchPageIfChanged(url)
+        assert summary.counters["fetch.encodingDetected"] == 1
+        assert fetcher.fetchPage(url, validators["encoding"]).encoding == "utf-8"
+        assert fetcher.fetchPageIfChanged(url, {"encoding": "utf-8"})[0].content == page.content
+    assert summary.counters["fetch.encodingDetected"] == 1
+
+
+def testEncodingsAreDetectedOnce(servedCache, corpusServer):
+    summary = SummarySink()
+    with recording(summary):
+        utc_actions.refreshUtcData()
+    fetches = summary.spans["fetch"][0]
+    assert summary.counters["fetch.encodingDetected"] == fetches
+    store = utc_actions.getStore()
+    assert {v["encoding"] for v in store.getAllPageValidators().values()} == {"utf-8"}
+
+    # full retrievals of stored pages reuse the encoding found before
+    first, last = utc_actions.getFirstAndLastKnownUtcMeetings()
+    store.deleteMinutes([last])
+    summary = SummarySink()
+    with recording(summary):
+        utc_actions.refreshUtcData()
+        assert utc_actions.updateMeetingMinutesIfChanged([last]) == [last]
+    assert "fetch.encodingDetected" not in summary.counters
+    assert utc_actions.getUtcMinutes()[last][-1].encoding == "utf-8"
@@ -0,0 +1,112 @@
+# Tests for the instrumentation (utc_instrument.py): spans and counters
+# passed to the installed sinks, the logging, trace file and summary sinks,
+# and doing nothing when no sink is installed.
+
+import json
+import logging
+
+import pytest
+
+import utc_actions
+import utc_instrument
+from utc_instrument import JsonTraceSink, LoggingSink, SummarySink, count, recording, span, timed
+
+
+@timed("test.add")
+def add(a, b):
+    return a + b
+
+
+def testNothingIsRecordedWithoutSinks():
+    assert not utc_instrument.isEnabled()
+    assert span("test.span", n=1) is utc_instrument._nullSpan
+    with span("test.span") as s:
+        s.set(status=200)
+    count("test.count")
+    assert add(1, 2) == 3
+
+
+def testSummary():
+    summary = SummarySink()
+    with recording(summary):
+        assert utc_instrument.isEnabled()
+        with span("test.span", url="u") as s:
+            s.set(status=304)
+        with pytest.raises(ValueError):
+            with span("test.span"):
+                raise ValueError()
+        assert add(1, 2) == 3
+        count("test.count")
+        count("test.count", 2)
+    assert not utc_instrument.isEnabled()
+    assert summary.spans["test.span"][0] == 2
+    assert summary.spans["test.add"][0] == 1
+    assert summary.counters == {"test.count": 3}
+    report = summary.report().splitlines()
+    assert len(report) == 3
+    assert report[-1].split() == ["test.count", "3"]
+
+
+def testEvents():
+    events = []
+    with recording(events.append):
+        with span("test.span", url="u") as s:
+            s.set(status=304)
+        with pytest.raises(ValueError):
+            with span("test.failed"):
+                raise ValueError()
+        count("test.count", 2, kind="x")
+    assert [(e["type"], e["name"], e["attributes"]) for e in events] == [
+        ("span", "test.span", {"url": "u", "status": 304}),
+        ("span", "test.failed", {"error": "ValueError"}),
+        ("count", "test.count", {"kind": "x"})
+        ]
+    assert events[0]["seconds"] >= 0
+    assert events[2]["value"] == 2
+
+
+def testFailingSinkDoesNotStopOthers(caplog):
+    def failingSink(event):
+        raise RuntimeError("sink failed")
+    summary = SummarySink()
+    with recording(failingSink, summary):
+        count("test.count")
+    assert summary.counters == {"test.count": 1}
+    assert "instrumentation sink failed" in caplog.text
+
+
+def testLoggingSink(caplog):
+    with caplog.at_level(logging.DEBUG, logger="utc_actions.instrument"):
+        with recording(LoggingSink()):
+            with span("test.span", url="u"):
+                pass
+            count("test.count", 2)
+    messages = [r.getMessage() for r in caplog.records]
+    assert messages[0].startswith("test.span: ") and messages[0].endswith(" ms url=u")
+    assert messages[1] == "test.count += 2"
+
+
+def testTraceFile(tmp_path):
+    path = tmp_path / "trace.json"
+    sink = JsonTraceSink(path)
+    with recording(sink):
+        with span("fetch.page", url="u"):
+            pass
+        count("cache.hit")
+        count("cache.hit", 2)
+    # closed when removed, and later events aren't written
+    sink({"type": "count", "name": "cache.hit", "value": 1, "time": 0, "thread": 0, "attributes": {}})
+    events = json.loads(path.read_text(encoding="utf-8"))
+    assert [(e["name"], e["ph"]) for e in events] == [("fetch.page", "X"), ("cache.hit", "C"), ("cache.hit", "C")]
+    assert events[0]["cat"] == "fetch" and events[0]["args"] == {"url": "u"}
+    assert [e["args"]["value"] for e in events[1:]] == [1, 3]
+
+
+def testRefreshIsInstrumented(servedCache):
+    summary = SummarySink()
+    with recording(summary):
+        utc_actions.refreshUtcData()
+    assert summary.spans["pipeline.refresh"][0] == 1
+    assert summary.spans["fetch"][0] == 82
+    assert summary.spans["extract.docRegTable"][0] == len(utc_actions.utcDocRegistry_urls)
+    assert summary.counters["cache.meetingCatalog.miss"] == 1
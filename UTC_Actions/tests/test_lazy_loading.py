@@ -0,0 +1,70 @@
+# Tests for the lazily-loaded module data (utc_actions.py): importing the
+# module retrieves and loads nothing, the registry tables and minutes are
+# loaded on first use, and only refreshUtcData() retrieves the latest pages.
+
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+import benchmarks
+import utc_actions
+
+
+moduleFolder = Path(utc_actions.__file__).resolve().parent
+
+
+def testImportLoadsNothing(tmp_path):
+    # in a fresh interpreter, with network connections failing
+    code = (
+        "import socket\n"
+        "def connect(*args): raise OSError('no network in this test')\n"
+        "socket.socket.connect = connect\n"
+        "import utc_actions\n"
+        "assert utc_actions._utcStore is None\n"
+        "assert utc_actions._utcDocRegTables is None and utc_actions._utc_minutes is None\n"
+        )
+    env = dict(os.environ, UTC_ACTIONS_CACHE=str(tmp_path / "cache"))
+    subprocess.run([sys.executable, "-c", code], cwd=moduleFolder, env=env, check=True)
+    assert not (tmp_path / "cache").exists()
+
+
+def testImportTimeIsWithinBudget():
+    assert benchmarks.measureImportTime(runs=3) <= utc_actions.importTimeBudget
+
+
+def testDataIsLoadedOnFirstUse(servedCache, corpusServer):
+    requests = corpusServer.requests
+    tables = utc_actions.utcDocRegTables
+    assert list(tables) == list(utc_actions.utcDocRegistry_urls)
+    assert len(tables[2019]) > 0
+    minutes = utc_actions.utc_minutes
+    assert len(minutes) > 0
+    assert corpusServer.requests > requests
+
+    # loaded once, then kept
+    requests = corpusServer.requests
+    assert utc_actions.utcDocRegTables is tables
+    assert utc_actions.utc_minutes is minutes
+    assert corpusServer.requests == requests
+
+
+def testCachedDataIsUsedAsIs(servedCache, corpusServer):
+    utc_actions.refreshUtcData()
+    utc_actions.setCacheRoot(servedCache)
+    requests = corpusServer.requests
+    assert len(utc_actions.utcDocRegTables[2025]) > 0
+    assert len(utc_actions.getUtcMinutes()) > 0
+    assert corpusServer.requests == requests
+
+    # the live registry page is only revalidated on request
+    rebuilt = utc_actions.refreshUtcData()
+    assert corpusServer.requests == requests + 1
+    assert rebuilt["minutesPages"] == []
+
+
+def testUnknownAttribute():
+    with pytest.raises(AttributeError, match="notAnAttribute"):
+        utc_actions.notAnAttribute
@@ -0,0 +1,178 @@
+# Tests for finding and updating the minutes of UTC meetings
+# (utc_actions.py): the meeting catalog derived from the registry tables
+# and kept in the store, looking up meetings by number, and updates for a
+# range of meetings that only retrieve the pages of those meetings,
+# revalidating the ones that are stored; and the resumable crawl of all
+# meeting minutes.
+
+from urllib.parse import urlsplit
+
+import pytest
+
+import utc_actions
+from utc_instrument import SummarySink, recording
+from utc_store import getPageHash
+
+
+@pytest.fixture
+def refreshed(servedCache):
+    utc_actions.refreshUtcData()
+    return servedCache
+
+
+@pytest.fixture
+def counters():
+    summary = SummarySink()
+    with recording(summary):
+        yield summary.counters
+
+
+def testMeetingsAreFoundByNumber(refreshed):
+    catalog = utc_actions.getMeetingCatalog()
+    for mtg, (year, sequenceInYear, row, url) in catalog.meetings.items():
+        assert utc_actions.findMinutesRowForMeeting(mtg) == (year, sequenceInYear, row)
+        assert utc_actions.findMinutesUrlForMeeting(mtg) == (year, sequenceInYear, row, url)
+    first, last = catalog.knownRange
+    assert utc_actions.findMinutesRowForMeeting(last + 1) is None
+    assert utc_actions.fetchMeetingMinutes(last + 1) is None
+
+
+def testUpdatingTheLastMeetingsRevalidatesThem(refreshed, corpusServer, counters):
+    first, last = utc_actions.getFirstAndLastKnownUtcMeetings()
+    minutes = utc_actions.getUtcMinutes()
+    pageHashes = {mtg: getPageHash(minutes[mtg][-1]) for mtg in minutes}
+    requests = corpusServer.requests
+    utc_actions.updatePickledMeetingMinutesForMeetingRange(last - 1, last + 10)
+    assert corpusServer.requests == requests + 2
+    assert counters["fetch.notModified"] == 2
+    minutes = utc_actions.getUtcMinutes()
+    assert {mtg: getPageHash(minutes[mtg][-1]) for mtg in minutes} == pageHashes
+
+
+def testMeetingWithoutStoredMinutesIsRetrieved(refreshed, corpusServer, counters):
+    first, last = utc_actions.getFirstAndLastKnownUtcMeetings()
+    store = utc_actions.getStore()
+    store.deleteMinutes([last])
+    requests = corpusServer.requests
+    assert utc_actions.updateMeetingMinutesIfChanged([last - 1, last]) == [last]
+    assert corpusServer.requests == requests + 2
+    assert counters["fetch.notModified"] == 1
+    (year, sequenceInYear, row, url) = utc_actions.findMinutesUrlForMeeting(last)
+    assert store.getMinutesSources([last])[last][:3] == (row[0], url, row[4])
+
+
+#--------------------------------------------------------
+#  The meeting catalog
+
+def testCatalogFromTables(refreshed):
+    tables = utc_actions.getUtcDocRegTables()
+    catalog = utc_actions.MeetingCatalog.fromTables(tables)
+    numbered = [mtg for (year, sequenceInYear, mtg, row) in catalog.rows if mtg is not None]
+    earlyMeetings = list(utc_actions.earlyUtcMinutesRows)
+    assert catalog.knownRange == (min(earlyMeetings), max(numbered))
+    assert set(catalog.meetings) == set(numbered) | set(earlyMeetings)
+    for (year, sequenceInYear, mtg, row), url in zip(catalog.rows, catalog.urls):
+        # (early years have hard-coded rows)
+        assert row in tables[year] or year in utc_actions.earlyMinutes
+        assert url == utc_actions.getDocRegistryBaseUrl(year) + row[1]
+        assert (sequenceInYear, mtg, row, url) in catalog.getYearRows(year)
+    assert utc_actions.getFirstAndLastKnownUtcMeetings() == catalog.knownRange
+
+
+def testCatalogIsKeptInTheStore(refreshed, counters, monkeypatch):
+    catalog = utc_actions.getMeetingCatalog()
+    monkeypatch.setattr(utc_actions, "_meetingCatalog", None)
+    counters.clear()
+    stored = utc_actions.getMeetingCatalog()
+    assert counters["cache.meetingCatalog.storeHit"] == 1
+    assert (stored.rows, stored.knownRange, stored.meetings) == (catalog.rows, catalog.knownRange, catalog.meetings)
+
+    # searches don't derive it again
+    utc_actions.searchForTextInAllMinutes("proposal for")
+    assert "cache.meetingCatalog.miss" not in counters
+    assert counters["cache.meetingCatalog.storeHit"] == 1
+
+
+def testCatalogIsClearedWhenATableChanges(refreshed, monkeypatch):
+    store = utc_actions.getStore()
+    assert store.getMeetingCatalog() is not None
+    year = max(utc_actions.utcDocRegistry_urls)
+    table = store.getDocRegTable(year)
+    store.updateDocRegTableRows(year, [], [], [])
+    assert store.getMeetingCatalog() is None
+    monkeypatch.setattr(utc_actions, "_meetingCatalog", None)
+    utc_actions.getMeetingCatalog()
+    assert store.getMeetingCatalog() is not None
+    store.putDocRegTables({year: table})
+    assert store.getMeetingCatalog() is None
+
+
+#--------------------------------------------------------
+#  The crawl of all meeting minutes
+
+def getPath(folder, url):
+    return folder / urlsplit(url).path.lstrip("/")
+
+
+def testFailedPagesAreRetried(corpusCopy):
+    folder, server = corpusCopy
+    utc_actions.refreshStages(["meetingCatalog"])
+    urls = list(utc_actions.getCatalogMinutesUrls())
+    missing = urls[3:5]
+    pages = {url: getPath(folder, url).read_bytes() for url in missing}
+    for url in missing:
+        getPath(folder, url).unlink()
+
+    requests = server.requests
+    failures = utc_actions.crawlAllMeetingMinutes()
+    assert server.requests == requests + len(urls)
+    assert sorted(failures) == sorted(missing)
+    assert all("404" in error for error in failures.values())
+    assert {url: attempts for url, (attempts, error) in utc_actions.getMinutesCrawlFailures().items()} == {url: 1 for url in missing}
+    store = utc_actions.getStore()
+    assert store.getMeta(utc_actions._minutesCrawlStateKey) == "failed"
+    assert len(store.getMinutesMeetings()) == len(urls) - len(missing)
+
+    # only the failed pages are retrieved again
+    for url, page in pages.items():
+        getPath(folder, url).write_bytes(page)
+    requests = server.requests
+    assert utc_actions.crawlAllMeetingMinutes() == {}
+    assert server.requests == requests + len(missing)
+    assert utc_actions.getMinutesCrawlFailures() == {}
+    items = store.getCrawlItems(utc_actions.minutesCrawl)
+    assert {url: state for url, (state, attempts, error) in items.items()} == {url: "done" for url in urls}
+    assert all(items[url][1] == 2 for url in missing)
+    assert store.getMeta(utc_actions._minutesCrawlStateKey) == "done"
+    assert len(store.getMinutesMeetings()) == len(urls)
+
+    # a restart retrieves everything
+    requests = server.requests
+    assert utc_actions.crawlAllMeetingMinutes(restart=True) == {}
+    assert server.requests == requests + len(urls)
+
+
+def testInterruptedCrawlIsResumed(servedCache, corpusServer, monkeypatch):
+    utc_actions.refreshStages(["meetingCatalog"])
+    urls = list(utc_actions.getCatalogMinutesUrls())
+    storeMinutesPage = utc_actions.storeMinutesPage
+    stored = []
+    def interrupt(url, *args):
+        if len(stored) == 10:
+            raise KeyboardInterrupt()
+        storeMinutesPage(url, *args)
+        stored.append(url)
+    monkeypatch.setattr(utc_actions, "storeMinutesPage", interrupt)
+    with pytest.raises(KeyboardInterrupt):
+        utc_actions.getAllMeetingMinutes()
+    monkeypatch.setattr(utc_actions, "storeMinutesPage", storeMinutesPage)
+    store = utc_actions.getStore()
+    assert store.getMeta(utc_actions._minutesCrawlStateKey) == "running"
+    assert len(store.getMinutesMeetings()) == 10
+
+    # the pages stored before the interruption aren't retrieved again
+    requests = corpusServer.requests
+    minutes = utc_actions.getAllMeetingMinutes()
+    assert corpusServer.requests == requests + len(urls) - 10
+    assert len(minutes) == len(urls)
+    assert store.getMeta(utc_actions._minutesCrawlStateKey) == "done"
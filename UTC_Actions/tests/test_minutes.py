@@ -0,0 +1,85 @@
+# Tests for the minutes docs (utc_actions.py): the structure parsed from a
+# minutes page, and parsing each page version once.
+
+import pytest
+
+import utc_actions
+from utc_fetch import FetchedPage
+from utc_instrument import SummarySink, recording
+from utc_store import UtcStore, getPageHash
+
+
+page = (
+    '<html><head><title>UTC #150 Minutes</title></head><body><h1>Minutes</h1>\n'
+    '<p>[<a name="150-C1">150-C1</a>] Consensus: accept  the\n proposal.</p>\n'
+    '<!-- comment -->\n'
+    '<p>Discussion <b>of fonts</b></p>\n'
+    '</body></html>'
+    )
+
+
+@pytest.fixture
+def counters():
+    summary = SummarySink()
+    with recording(summary):
+        yield summary.counters
+
+
+def testMinutesDoc():
+    doc = utc_actions.parseMinutesDoc(page)
+    assert doc["title"] == "UTC #150 Minutes"
+    assert "[150-C1] Consensus: accept the proposal." in doc["paragraphs"]
+    assert "Discussion of fonts" in doc["paragraphs"]
+    assert not any("comment" in text for text in doc["nodeTexts"])
+    (anchorText, block, start, end) = doc["anchors"][0]
+    assert len(doc["anchors"]) == 1
+    assert anchorText == "150-C1"
+    assert doc["paragraphs"][block].startswith("[150-C1]")
+    assert page[start:end] == "150-C1"
+    # each text node's parent and block
+    i = doc["nodeTexts"].index("of fonts")
+    assert doc["paragraphs"][doc["nodeParents"][i]] == "of fonts"
+    assert doc["paragraphs"][doc["nodeBlocks"][i]] == "Discussion of fonts"
+
+
+def testMinutesDocFromBytes():
+    fetched = FetchedPage(page.replace("fonts", "fonts — café").encode("cp1252"), "cp1252")
+    doc = utc_actions.parseMinutesDoc(fetched)
+    assert "Discussion of fonts — café" in doc["paragraphs"]
+
+
+def testPageIsParsedOnce(cache, counters, monkeypatch):
+    monkeypatch.setattr(utc_actions, "_minutesDocCache", {})
+    fetched = FetchedPage(page.encode("utf-8"), "utf-8")
+    doc = utc_actions.getMinutesDocForPage(fetched)
+    assert utc_actions.getMinutesDocForPage(fetched) is doc
+    assert counters["cache.minutesDoc.miss"] == 1
+    assert counters["cache.minutesDoc.hit"] == 1
+
+
+def testStoredDocsAreUsed(servedCache, counters, monkeypatch):
+    utc_actions.refreshUtcData()
+    monkeypatch.setattr(utc_actions, "_minutesDocCache", {})
+    counters.clear()
+    minutes = utc_actions.getUtcMinutes()
+    for mtg in minutes:
+        utc_actions.findTaggedActionsInMinutes(minutes[mtg])
+    utc_actions.searchForTextInAllMinutes("proposal for")
+    assert "cache.minutesDoc.miss" not in counters
+    assert counters["cache.minutesDoc.storeHit"] == len(minutes)
+
+
+def testStoredMinutesDocs(tmp_path):
+    store = UtcStore(tmp_path / "utcCache.sqlite3")
+    fetched = FetchedPage(page.encode("utf-8"), "utf-8")
+    pageHash = getPageHash(fetched)
+    store.putMinutes({150: [2017, 1, "L2/17-001", "Minutes", fetched]})
+    store.putMinutesDoc(f"2:{pageHash}", pageHash, ["doc"])
+    store.putMinutesDoc("2:replaced", "replaced", ["old doc"])
+    assert store.getStoredMinutesDocKeys([f"2:{pageHash}", "2:replaced", "2:other"]) == {f"2:{pageHash}", "2:replaced"}
+    assert store.getMinutesDoc(f"2:{pageHash}") == ["doc"]
+    # docs of pages that are no longer stored
+    store.pruneMinutesDocs()
+    assert store.getMinutesDoc("2:replaced") is None
+    assert store.getMinutesDoc(f"2:{pageHash}") == ["doc"]
+    store.close()
@@ -0,0 +1,202 @@
+# Tests for the derivation pipeline (utc_pipeline.py): a graph of stages
+# whose artifacts record the hashes of their inputs, so a refresh only
+# rebuilds what's stale, in dependency order, running independent stages
+# concurrently; and the stages of utc_actions, from the registry pages to
+# the minutes indexes, including a store migrated from the .pickle files.
+
+import threading
+from urllib.parse import urlsplit
+
+import pytest
+
+import utc_actions
+from utc_pipeline import Stage, StageGraph, getHash
+from utc_store import FileLock, UtcStore
+
+
+class SourceStage(Stage):
+    name = "source"
+
+    def __init__(self, values):
+        self.values = values
+        self.builds = []
+        self.removed = []
+        self.volatile = []
+
+    def getInputHashes(self, inputs):
+        return {key: getHash(key) for key in self.values}
+
+    def getVolatileKeys(self, keys):
+        return [key for key in self.volatile if key in keys]
+
+    def build(self, inputHashes):
+        self.builds.append(sorted(inputHashes))
+        return {key: getHash(self.values[key]) for key in inputHashes}
+
+    def remove(self, keys):
+        self.removed.extend(keys)
+
+
+class DerivedStage(Stage):
+    inputs = ("source",)
+
+    def __init__(self, name, barrier = None):
+        self.name = name
+        self.barrier = barrier
+        self.builds = []
+        self.stored = {}
+        self.failing = set()
+
+    def getInputHashes(self, inputs):
+        return dict(inputs["source"])
+
+    def findStored(self, inputHashes):
+        return {key: self.stored[key] for key in inputHashes if key in self.stored}
+
+    def build(self, inputHashes):
+        if self.barrier is not None:
+            # waits for the other stage's build to start
+            self.barrier.wait()
+        self.builds.append(sorted(inputHashes))
+        return {key: getHash([self.name, h]) for key, h in inputHashes.items() if key not in self.failing}
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = UtcStore(tmp_path / "utcCache.sqlite3")
+    yield store
+    store.close()
+
+
+def testOnlyStaleArtifactsAreRebuilt(store):
+    source = SourceStage({"a": 1, "b": 2})
+    derived = DerivedStage("derived")
+    graph = StageGraph([source, derived], store)
+    assert graph.refresh() == {"source": ["a", "b"], "derived": ["a", "b"]}
+    assert graph.refresh() == {"source": [], "derived": []}
+
+    # a changed source artifact
+    source.values["b"] = 3
+    source.volatile = ["b"]
+    assert graph.refresh() == {"source": ["b"], "derived": ["b"]}
+    # rebuilt with the same content: nothing derived from it is rebuilt
+    assert graph.refresh() == {"source": ["b"], "derived": []}
+    assert derived.builds == [["a", "b"], ["b"]]
+    assert graph.getRecorded("derived")["b"][0] == getHash(3)
+
+
+def testRemovedAndFailedArtifacts(store):
+    source = SourceStage({"a": 1, "b": 2, "c": 3})
+    derived = DerivedStage("derived")
+    derived.failing = {"c"}
+    graph = StageGraph([source, derived], store)
+    assert graph.refresh()["derived"] == ["a", "b"]
+    # an artifact that wasn't built is retried
+    derived.failing = set()
+    assert graph.refresh()["derived"] == ["c"]
+
+    del source.values["a"]
+    graph.refresh()
+    assert source.removed == ["a"]
+    assert set(graph.getRecorded("derived")) == {"b", "c"}
+
+
+def testStoredArtifactsAreRecorded(store):
+    source = SourceStage({"a": 1, "b": 2})
+    derived = DerivedStage("derived")
+    derived.stored = {"a": "stored"}
+    graph = StageGraph([source, derived], store)
+    graph.refresh(["source"])
+    assert graph.recordStored() == {"derived": ["a"]}
+    assert graph.refresh() == {"source": [], "derived": ["b"]}
+    assert graph.getRecorded("derived")["a"] == (getHash(1), "stored")
+
+
+def testIndependentStagesRunConcurrently(store, tmp_path):
+    # each stage's build waits for the other's to start
+    barrier = threading.Barrier(2, timeout=5)
+    stages = [SourceStage({"a": 1}), DerivedStage("first", barrier), DerivedStage("second", barrier)]
+    lock = FileLock(tmp_path / "update.lock")
+    graph = StageGraph(stages, store)
+    with lock:
+        assert graph.refresh(lock=lock) == {"source": ["a"], "first": ["a"], "second": ["a"]}
+    with pytest.raises(RuntimeError):
+        graph.refresh(lock=lock)
+
+
+def testStagesComeAfterTheirInputs(store):
+    with pytest.raises(ValueError):
+        StageGraph([DerivedStage("derived"), SourceStage({})], store)
+    graph = StageGraph([SourceStage({}), DerivedStage("first"), DerivedStage("second")], store)
+    assert graph.getRequiredStages(["second"]) == ["source", "second"]
+    with pytest.raises(KeyError):
+        graph.getRequiredStages(["other"])
+
+
+#--------------------------------------------------------
+#  The stages of utc_actions
+
+def getPageHashes(store):
+    return {mtg: source[3] for mtg, source in store.getMinutesSources(store.getMinutesMeetings()).items()}
+
+
+def testMigratedStoreIsRefreshedWithoutRetrievingIt(pickleJar, corpusServer):
+    store = utc_actions.getStore()
+    pageHashes = getPageHashes(store)
+    requests = corpusServer.requests
+    rebuilt = utc_actions.refreshUtcData()
+    # only the current-year registry page is revalidated; the catalog is
+    # derived again, and the minutes pages it lists are found in the store
+    assert corpusServer.requests == requests + 1
+    assert rebuilt["docRegPages"] == [max(utc_actions.utcDocRegistry_urls)]
+    assert rebuilt["docRegTables"] == []
+    assert getPageHashes(store) == pageHashes
+    assert len(rebuilt["minutesPages"]) == len(pageHashes)
+
+    requests = corpusServer.requests
+    rebuilt = utc_actions.refreshUtcData()
+    assert corpusServer.requests == requests + 1
+    assert rebuilt["minutesPages"] == [] and rebuilt["minutesDocs"] == []
+
+
+def testUnmatchedMigratedDataIsFound(pickleJar, corpusServer):
+    # registry pages without validators, and minutes without their URL and
+    # date
+    store = utc_actions.getStore()
+    store._write("DELETE FROM page_validators")
+    store._write("UPDATE minutes SET url = NULL, doc_date = NULL")
+    pageHashes = getPageHashes(store)
+    requests = corpusServer.requests
+    rebuilt = utc_actions.refreshUtcData()
+    assert corpusServer.requests == requests + 1
+    assert rebuilt["docRegTables"] == []
+    assert getPageHashes(store) == pageHashes
+    assert len(rebuilt["minutesPages"]) == len(pageHashes)
+
+
+def testOnlyWhatChangedIsRebuilt(corpusCopy):
+    folder, server = corpusCopy
+    utc_actions.refreshUtcData()
+    store = utc_actions.getStore()
+    year = max(utc_actions.utcDocRegistry_urls)
+    (sequenceInYear, mtg, row, url) = utc_actions.getMeetingCatalog().getYearRows(year)[0]
+    meetings = store.getMinutesMeetings()
+
+    # the registry row of a meeting's minutes has a new date, and the
+    # minutes are revised
+    def getPath(url):
+        return folder / urlsplit(url).path.lstrip("/")
+    registryPath = getPath(utc_actions.utcDocRegistry_urls[year])
+    registryPath.write_text(registryPath.read_text(encoding="utf-8").replace(f"<td>{row[4]}</td>", f"<td>{year}-12-31</td>"), encoding="utf-8")
+    minutesPath = getPath(url)
+    minutesPath.write_text(minutesPath.read_text(encoding="utf-8").replace("</body>", "<p>Emoji encoding revised.</p>\n</body>"), encoding="utf-8")
+
+    requests = server.requests
+    rebuilt = utc_actions.refreshUtcData()
+    assert server.requests == requests + 2
+    assert rebuilt["docRegPages"] == [year]
+    assert rebuilt["docRegTables"] == [year]
+    assert rebuilt["minutesPages"] == [url]
+    assert rebuilt["actionIndex"] == [mtg] and rebuilt["textIndex"] == [mtg]
+    assert store.getMinutesMeetings() == meetings
+    assert list(utc_actions.findTextInMinutesIndex("emoji encoding revised")) == [mtg]
@@ -0,0 +1,142 @@
+# Tests for searches (utc_actions.py): text searches in minutes answered
+# from the inverted text index, and searches in the doc registry tables
+# with the columnar registry index.
+
+from array import array
+
+import pytest
+
+import utc_actions
+
+
+@pytest.fixture
+def refreshed(servedCache):
+    utc_actions.refreshUtcData()
+    return servedCache
+
+
+def scanMinutes(text, ignoreCase = True):
+    # {mtg#: [text node indices]} for text, without the text index
+    allMinutes = utc_actions.getUtcMinutes()
+    matches = {}
+    for mtg in allMinutes:
+        nodeTexts = utc_actions.getMinutesDoc(allMinutes[mtg])["nodeTexts"]
+        nodes = [i for i, nodeText in enumerate(nodeTexts) if (text.lower() in nodeText.lower() if ignoreCase else text in nodeText)]
+        if len(nodes) > 0:
+            matches[mtg] = nodes
+    return matches
+
+
+def testNodeTokenPostings():
+    postings = utc_actions.getNodeTokenPostings(["Emoji encoding", "the emoji", ""])
+    assert postings["emoji"] == array("L", [0, 0, 1, 1])
+    assert postings["encoding"] == array("L", [0, 1])
+    assert set(postings) == {"emoji", "encoding", "the"}
+
+
+def testPlainTextQueries():
+    assert utc_actions.getPlainTextQueryTokens("Emoji encoding") == [("emoji", 0, 5), ("encoding", 6, 14)]
+    assert utc_actions.getPlainTextQueryTokens("glyph|font") is None
+    assert utc_actions.getPlainTextQueryTokens(" - ") is None
+
+
+@pytest.mark.parametrize("text", ["proposal", "emoji encoding", "Discussion of", "nicode", "ncoding prop", "font team", "nothing like this"])
+def testIndexedSearchMatchesScan(refreshed, text):
+    found = utc_actions.findTextInMinutesIndex(text)
+    assert found is not None
+    assert found == scanMinutes(text)
+
+
+def testCaseSensitiveSearch(refreshed):
+    assert utc_actions.findTextInMinutesIndex("Discussion", ignoreCase=False) == scanMinutes("Discussion", ignoreCase=False)
+    assert utc_actions.findTextInMinutesIndex("DISCUSSION", ignoreCase=False) == {}
+
+
+def testRegexSearchScans(refreshed):
+    assert utc_actions.findTextInMinutesIndex("emoji|glyph") is None
+    found = utc_actions.findTextInMinutesNodes("emoji|glyph")
+    assert found == {
+        mtg: sorted(set(scanMinutes("emoji").get(mtg, [])) | set(scanMinutes("glyph").get(mtg, [])))
+        for mtg in set(scanMinutes("emoji")) | set(scanMinutes("glyph"))
+        }
+
+
+def testSearchResults(refreshed):
+    results = utc_actions.searchForTextInAllMinutes("emoji encoding")
+    assert len(results) > 0
+    assert all("emoji encoding" in result.lower() for mtgResults in results.values() for result in mtgResults)
+    assert utc_actions.searchForTextInMinutes("emoji encoding", 100) == results.get(100)
+
+
+def testIndexIsUpdatedForNewMinutes(refreshed):
+    store = utc_actions.getStore()
+    assert set(store.getTextIndexMeetings()) == set(store.getMinutesMeetings())
+    assert store.getTextIndexStaleMeetings() == []
+
+
+#--------------------------------------------------------
+#  Searches in the doc registry tables
+
+tables = {
+    2019: [
+        ["L2/19-001", "19001-agenda.htm", "Preliminary  agenda", "Rick McGowan", "2019-01-07"],
+        ["L2/19-002", "", "Emoji\tproposal", "Deborah Anderson", "2019-06-08"]
+        ],
+    2020: [
+        ["L2/20-001", "20001-faq.htm", "Update of the emoji FAQ", "Rick McGowan; Ken Whistler", "2020-01-10 "]
+        ]
+    }
+
+
+def testDocRegIndex():
+    index = utc_actions.DocRegIndex(tables)
+    assert len(index) == 3
+    assert index.subjects == ["Preliminary agenda", "Emoji proposal", "Update of the emoji FAQ"]
+    assert list(index.filterYears(2020, 2020)) == [2]
+    assert list(index.filterSubject("emoji")) == [1, 2]
+    assert list(index.filterSubject("Emoji", ignoreCase=False)) == [1]
+    assert list(index.filterSubject("(emoji|agenda)")) == [0, 1, 2]
+    assert list(index.filterSubject("emoji", textIsRegExPattern=True)) == [1]
+    assert list(index.filterSource("mcgowan")) == [0, 2]
+    assert list(index.filterSource("^Ken")) == []
+    assert list(index.filterSource("Anderson$")) == [1]
+    assert list(index.filterDates("2019-06", "2020")) == [1, 2]
+    assert list(index.filterDates(lastDate="2019-01")) == [0]
+    assert list(index.filterDocNumPrefix("L2/19-")) == [0, 1]
+    assert index.getTableRows([0, 2]) == {2019: tables[2019][:1], 2020: tables[2020]}
+
+
+@pytest.mark.parametrize("pattern", ["x*", "$", "^", "Rick.*|$"])
+def testZeroWidthMatchesStayInTheIndex(pattern):
+    # a zero-width match at the end of the combined text is not a row
+    index = utc_actions.DocRegIndex({2019: tables[2019]})
+    assert list(index.filterSource(pattern)) == [0, 1]
+
+
+def testZeroWidthMatchesStayInTheActionTable():
+    table = utc_actions.UtcActionTable.fromRecords([
+        utc_actions.UtcAction(150, "150-C1", "C", "Consensus", 0),
+        utc_actions.UtcAction(150, "150-A2", "A", "Action", 1)
+        ])
+    assert list(table.filterText("x*")) == [0, 1]
+    assert list(table.filterText("$")) == [1]
+
+
+def testRegistrySearches(refreshed):
+    allTables = utc_actions.getUtcDocRegTables()
+    def scan(keep):
+        results = {}
+        for year, table in allTables.items():
+            rows = [row for row in table if keep(row)]
+            if rows:
+                results[year] = rows
+        return results
+
+    assert utc_actions.searchForTextInAllDocRegTables("proposal") == scan(lambda row: "proposal" in row[2].lower())
+    year = max(allTables)
+    assert utc_actions.searchForTextInDocRegTable("proposal", year) == scan(lambda row: "proposal" in row[2].lower()).get(year, [])
+    assert utc_actions.searchDocRegistry(subject="proposal", firstDate=f"{year}") == scan(
+        lambda row: "proposal" in row[2].lower() and row[4].strip() >= f"{year}")
+    assert utc_actions.searchDocRegistry(docNumPrefix="L2/20-", years=[2020, 2021]) == scan(
+        lambda row: row[0].startswith("L2/20-"))
+    assert utc_actions.searchDocRegistry() == {year: table for year, table in allTables.items() if table}
@@ -0,0 +1,174 @@
+# Tests for a cache folder shared by several threads and processes
+# (utc_store.py, utc_actions.py): the update lock, held by one thread of one
+# process at a time and shared with worker threads, concurrent refreshes of
+# one cache folder, and data loaded from the store being reloaded when
+# another process changes it.
+
+import os
+import subprocess
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pytest
+
+import utc_actions
+from utc_instrument import SummarySink, recording
+from utc_store import FileLock, UtcStore
+
+
+moduleFolder = Path(utc_actions.__file__).resolve().parent
+
+
+def runProcess(code, cacheFolder):
+    # runs code in a fresh interpreter using the cache folder
+    env = dict(os.environ, UTC_ACTIONS_CACHE=str(cacheFolder))
+    return subprocess.Popen([sys.executable, "-c", code], cwd=moduleFolder, env=env, stdout=subprocess.PIPE, text=True)
+
+
+def isLockedByAnotherProcess(path):
+    code = (
+        "from utc_store import FileLock\n"
+        f"lock = FileLock({str(path)!r})\n"
+        "with open(lock.path, 'a+b') as file:\n"
+        "    print(not lock._tryLock(file))\n"
+        )
+    result = subprocess.run([sys.executable, "-c", code], cwd=moduleFolder, stdout=subprocess.PIPE, text=True, check=True)
+    return result.stdout.strip() == "True"
+
+
+#--------------------------------------------------------
+#  The update lock
+
+@pytest.fixture
+def lock(tmp_path):
+    return FileLock(tmp_path / "update.lock")
+
+
+def testLockIsReentrantInTheHoldingThread(lock):
+    assert not lock.isHeld()
+    with lock:
+        with lock:
+            assert lock.isHeld()
+        assert lock.isHeld()
+    assert not lock.isHeld()
+
+
+def testOtherThreadWaitsForHolder(lock):
+    acquired = threading.Event()
+    def acquire():
+        with lock:
+            acquired.set()
+    with lock:
+        thread = threading.Thread(target=acquire)
+        thread.start()
+        assert not acquired.wait(0.2)
+    thread.join(5)
+    assert acquired.is_set()
+
+
+def testThreadsTakeTurns(lock):
+    holders = []
+    def update(n):
+        for i in range(20):
+            with lock:
+                holders.append(n)
+                holders.append(n)
+    with ThreadPoolExecutor(4) as pool:
+        list(pool.map(update, range(4)))
+    # each holder's two appends are together
+    assert len(holders) == 160
+    assert all(holders[i] == holders[i + 1] for i in range(0, len(holders), 2))
+
+
+def testSharingWithWorkerThread(lock):
+    def work():
+        with lock.sharing():
+            assert lock.isHeld()
+            with lock:
+                return lock.isHeld()
+    with lock:
+        with ThreadPoolExecutor(1) as pool:
+            assert pool.submit(work).result(5)
+        assert lock.isHeld()
+    # other threads wait for it again
+    with ThreadPoolExecutor(1) as pool:
+        assert not pool.submit(lock.isHeld).result(5)
+
+
+def testSharingRequiresHeldLock(lock):
+    with pytest.raises(RuntimeError):
+        with lock.sharing():
+            pass
+
+
+def testLockFileIsLockedOnceAndReleased(lock):
+    with lock:
+        with lock:
+            assert isLockedByAnotherProcess(lock.path)
+        assert isLockedByAnotherProcess(lock.path)
+    assert not isLockedByAnotherProcess(lock.path)
+
+
+#--------------------------------------------------------
+#  A cache folder shared by processes
+
+def testConcurrentRefreshesOfOneCache(cache, corpusServer):
+    # two processes refresh the empty cache folder at once: one retrieves
+    # everything, and the other only revalidates the current-year page
+    code = (
+        "import utc_actions\n"
+        "from benchmark_corpus import useCorpusServer\n"
+        f"useCorpusServer({corpusServer.baseUrl!r})\n"
+        "utc_actions.refreshUtcData()\n"
+        "print(len(utc_actions.getUtcMinutes()))\n"
+        )
+    requests = corpusServer.requests
+    processes = [runProcess(code, cache) for i in range(2)]
+    outputs = [process.communicate(timeout=120)[0] for process in processes]
+    assert [process.returncode for process in processes] == [0, 0]
+    assert corpusServer.requests == requests + 82 + 1
+
+    store = utc_actions.getStore()
+    meetings = store.getMinutesMeetings()
+    assert [int(output) for output in outputs] == [len(meetings)] * 2
+    assert len(utc_actions.getUtcMinutes()) == len(meetings)
+
+
+def testStoreIsReadByAnotherProcess(servedCache, corpusServer):
+    utc_actions.refreshUtcData()
+    code = (
+        "import utc_actions\n"
+        "tables = utc_actions.getUtcDocRegTables()\n"
+        "print(sum(len(table) for table in tables.values()), len(utc_actions.getUtcMinutes()))\n"
+        )
+    requests = corpusServer.requests
+    # while this process holds the update lock
+    with utc_actions.getStore().updating:
+        output = runProcess(code, servedCache).communicate(timeout=60)[0]
+    assert corpusServer.requests == requests
+    tables = utc_actions.getUtcDocRegTables()
+    assert output.split() == [str(sum(len(table) for table in tables.values())), str(len(utc_actions.getUtcMinutes()))]
+
+
+def testDataIsReloadedWhenChangedElsewhere(servedCache, corpusServer):
+    utc_actions.refreshUtcData()
+    year = max(utc_actions.utcDocRegistry_urls)
+    tables = utc_actions.getUtcDocRegTables()
+    table = [list(row) for row in tables[year]]
+    assert utc_actions.getUtcDocRegTables() is tables
+
+    # another connection to the store, as another process would have
+    other = UtcStore(servedCache / utc_actions.utcStore_file)
+    try:
+        with other.updating:
+            other.putDocRegTables({year: table[1:]})
+    finally:
+        other.close()
+    summary = SummarySink()
+    with recording(summary):
+        reloaded = utc_actions.getUtcDocRegTables()
+    assert summary.counters["cache.storeChangedElsewhere"] == 1
+    assert reloaded is not tables
+    assert [list(row) for row in reloaded[year]] == table[1:]
@@ -0,0 +1,137 @@
+# Tests for the doc registry snapshot file (utc_snapshot.py): writing and
+# reading back tables, the layout of the offset arrays, and the errors for
+# files that aren't complete snapshots from this platform.
+
+from array import array
+import json
+import pickle
+import struct
+import sys
+
+import pytest
+
+import utc_snapshot
+from utc_snapshot import DocRegSnapshot, DocRegSnapshotTable, snapshotMagic, writeDocRegSnapshot
+
+
+tables = {
+    2019: [
+        ["L2/19-001", "19001-agenda.htm", "Preliminary agenda", "Rick McGowan", "2019-01-07"],
+        ["L2/19-002", "", "Proposal to encode\nsome characters", "Deborah Anderson", "2019-01-08"]
+        ],
+    2020: [],
+    2021: [
+        ["L2/21-001", "21001.pdf", "Émoji — “quoted” ✓ 𝒜", "", "2021-01-04"]
+        ]
+    }
+
+
+def writeSnapshot(path, version = "v1"):
+    writeDocRegSnapshot(path, tables, version)
+    return DocRegSnapshot(path)
+
+
+def readHeader(path):
+    data = path.read_bytes()
+    magic, headerStart, headerLength = struct.unpack_from(utc_snapshot._prefixFormat, data)
+    return data, json.loads(data[headerStart:headerStart + headerLength])
+
+
+def testRoundTrip(tmp_path):
+    snapshot = writeSnapshot(tmp_path / "tables.snapshot")
+    assert snapshot.version == "v1"
+    assert list(snapshot.tables) == [2019, 2020, 2021]
+    for year, table in tables.items():
+        assert isinstance(snapshot.tables[year], DocRegSnapshotTable)
+        assert len(snapshot.tables[year]) == len(table)
+        assert list(snapshot.tables[year]) == table
+        assert snapshot.tables[year] == table
+    assert snapshot.tables[2019] != tables[2021]
+
+
+def testTableIsASequence(tmp_path):
+    table = writeSnapshot(tmp_path / "tables.snapshot").tables[2019]
+    assert table[-1] == tables[2019][-1]
+    assert table[0:1] == tables[2019][0:1]
+    assert table[::-1] == tables[2019][::-1]
+    with pytest.raises(IndexError):
+        table[2]
+    # each row is read as a new list
+    table[0][0] = "changed"
+    assert table[0][0] == "L2/19-001"
+    # pickled (and so sent to other processes) as a list
+    assert pickle.loads(pickle.dumps(table)) == tables[2019]
+    assert type(pickle.loads(pickle.dumps(table))) is list
+
+
+def testOffsetArrays(tmp_path):
+    path = tmp_path / "tables.snapshot"
+    writeSnapshot(path)
+    data, header = readHeader(path)
+    rows = [row for table in tables.values() for row in table]
+    assert header["yearStarts"] == [0, 2, 2, 3]
+    assert header["byteOrder"] == sys.byteorder
+    assert len(header["columns"]) == utc_snapshot.columnCount
+    for column, (offsetsStart, dataStart, dataLength) in enumerate(header["columns"]):
+        # sections are 8-byte aligned, so the offsets can be used in place
+        assert offsetsStart % 8 == 0 and dataStart % 8 == 0
+        offsets = array(utc_snapshot._offsetType)
+        offsets.frombytes(data[offsetsStart:offsetsStart + offsets.itemsize * (len(rows) + 1)])
+        columnData = data[dataStart:dataStart + dataLength]
+        assert offsets[0] == 0 and offsets[-1] == dataLength
+        cells = [str(columnData[offsets[i]:offsets[i + 1]], "utf-8") for i in range(len(rows))]
+        assert cells == [row[column] for row in rows]
+
+
+def testEmptyTables(tmp_path):
+    path = tmp_path / "tables.snapshot"
+    writeDocRegSnapshot(path, {})
+    snapshot = DocRegSnapshot(path)
+    assert snapshot.version is None
+    assert snapshot.tables == {}
+
+
+def testReplacesPreviousSnapshot(tmp_path):
+    path = tmp_path / "tables.snapshot"
+    previous = writeSnapshot(path, "v1")
+    writeDocRegSnapshot(path, {2022: [["L2/22-001", "", "New", "", "2022-01-03"]]}, "v2")
+    assert DocRegSnapshot(path).version == "v2"
+    # the previous snapshot, still mapped, is unchanged
+    assert previous.tables[2019] == tables[2019]
+    assert [p.name for p in tmp_path.iterdir()] == ["tables.snapshot"]
+
+
+def testRowWithWrongNumberOfCells(tmp_path):
+    path = tmp_path / "tables.snapshot"
+    with pytest.raises(ValueError, match="row of 4 cells"):
+        writeDocRegSnapshot(path, {2019: [["L2/19-001", "", "Subject", "2019-01-07"]]})
+    # no temporary file is left
+    assert list(tmp_path.iterdir()) == []
+
+
+@pytest.mark.parametrize("length", [0, 10, 100, -1])
+def testTruncatedFile(tmp_path, length):
+    path = tmp_path / "tables.snapshot"
+    writeSnapshot(path)
+    data = path.read_bytes()
+    path.write_bytes(data[:length])
+    with pytest.raises(ValueError):
+        DocRegSnapshot(path)
+
+
+def testNotASnapshot(tmp_path):
+    path = tmp_path / "tables.snapshot"
+    writeSnapshot(path)
+    data = path.read_bytes()
+    path.write_bytes(b"NOTASNAP" + data[len(snapshotMagic):])
+    with pytest.raises(ValueError, match="not a doc registry snapshot"):
+        DocRegSnapshot(path)
+
+
+def testOtherByteOrder(tmp_path, monkeypatch):
+    path = tmp_path / "tables.snapshot"
+    monkeypatch.setattr(utc_snapshot.sys, "byteorder", "big" if sys.byteorder == "little" else "little")
+    writeDocRegSnapshot(path, tables, "v1")
+    monkeypatch.undo()
+    with pytest.raises(ValueError, match="another byte order"):
+        DocRegSnapshot(path)
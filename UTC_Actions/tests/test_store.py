@@ -0,0 +1,210 @@
+# Tests for the local store (utc_store.py): registry pages and tables
+# stored per year, minutes stored per meeting and compressed, and the
+# migration of the .pickle files of earlier versions.
+
+import pickle
+
+import pytest
+
+import utc_actions
+from utc_fetch import FetchedPage
+from utc_store import CompressedPage, StoredMinutes, UtcStore, getPageHash, getPageText
+
+
+table = [
+    ["L2/19-001", "19001-agenda.htm", "Preliminary agenda", "Rick McGowan", "2019-01-07"],
+    ["L2/19-002", "", "Proposal", "Deborah Anderson", "2019-01-08"]
+    ]
+
+
+def minutesPage(meetingNumber, text = "Minutes"):
+    html = f"<html><head><title>UTC #{meetingNumber} Minutes</title></head><body><p>{text} — café</p></body></html>"
+    return FetchedPage(html.encode("utf-8"), "utf-8")
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = UtcStore(tmp_path / "utcCache.sqlite3")
+    yield store
+    store.close()
+
+
+def testDocRegPages(store):
+    page = FetchedPage("<html>Register — 2019</html>".encode("cp1252"), "cp1252")
+    store.putDocRegPages({2019: page, 2020: FetchedPage(b"<html>2020</html>", "utf-8")})
+    assert store.getDocRegPageYears() == [2019, 2020]
+    stored = store.getDocRegPage(2019)
+    assert (stored.content, stored.encoding) == (page.content, "cp1252")
+    assert stored.text() == "<html>Register — 2019</html>"
+    assert store.getDocRegPage(2021) is None
+
+
+def testDocRegTables(store):
+    store.putDocRegTables({2019: table, 2020: []})
+    assert store.getDocRegTableYears() == [2019, 2020]
+    assert store.getDocRegTable(2019) == table
+    assert store.getDocRegTable(2020) == []
+    assert store.getDocRegTable(2021) is None
+
+    # a year is replaced without the others
+    store.putDocRegTables({2020: table[:1]})
+    assert store.getAllDocRegTables() == {2019: table, 2020: table[:1]}
+
+
+def testDocRegTablesVersion(store):
+    assert store.getDocRegTablesVersion() is None
+    store.putDocRegTables({2019: table})
+    version = store.getDocRegTablesVersion()
+    assert version is not None
+    assert store.getDocRegTablesVersion() == version
+    assert store.getDocRegTable(2019) == table
+
+    store.putDocRegTables({2019: table})
+    secondVersion = store.getDocRegTablesVersion()
+    assert secondVersion != version
+
+    newRow = ["L2/19-003", "", "Added", "Author", "2019-01-09"]
+    store.updateDocRegTableRows(2019, [("L2/19-003", 2, newRow)], [], [("L2/19-003", "added", None, newRow)])
+    assert store.getDocRegTablesVersion() not in (version, secondVersion)
+    assert store.getDocRegTable(2019) == table + [newRow]
+    assert [c[2:4] for c in store.getDocRegChanges()] == [("L2/19-003", "added")]
+
+
+def testMinutesRoundTrip(store):
+    page = minutesPage(150)
+    store.putMinutes({150: [2017, 1, "L2/17-001", "Minutes", page], 151: None}, {150: ("u150.htm", "2017-01-20")})
+    assert store.getMinutesMeetings() == [150]
+    entry = store.getMinutes(150)
+    assert entry[:4] == [2017, 1, "L2/17-001", "Minutes"]
+    assert getPageText(entry[-1]) == page.text()
+    assert getPageHash(entry[-1]) == getPageHash(page)
+    assert store.getMinutesSources([150]) == {150: ("L2/17-001", "u150.htm", "2017-01-20", getPageHash(page))}
+    assert store.getMinutes(151) is None
+
+
+def testMinutesAreStoredPerMeeting(store):
+    store.putMinutes({mtg: [2017, mtg - 149, f"L2/17-{mtg}", "Minutes", minutesPage(mtg)] for mtg in (150, 151, 152)})
+    store.putMinutes({151: [2017, 2, "L2/17-151", "Revised", minutesPage(151, "Revised")]})
+    minutes = StoredMinutes(store)
+    assert list(minutes) == [150, 151, 152] and len(minutes) == 3
+    assert 151 in minutes and 153 not in minutes
+    assert minutes[151][3] == "Revised"
+    assert "Revised" in getPageText(minutes[151][-1])
+    assert getPageText(minutes[150][-1]) == minutesPage(150).text()
+    with pytest.raises(KeyError):
+        minutes[153]
+
+    store.deleteMinutes([150])
+    assert list(minutes) == [151, 152]
+
+
+def testMigrationFromPickleFiles(tmp_path, store):
+    # the .pickle files have pages as str
+    files = [tmp_path / name for name in ("pages.pickle", "tables.pickle", "minutes.pickle")]
+    pages = {2019: "<html>Register — 2019</html>"}
+    minutes = {150: [2019, 1, "L2/19-001", "Minutes", minutesPage(150).text()]}
+    for path, data in zip(files, (pages, {2019: table}, minutes)):
+        with open(path, "wb") as file:
+            pickle.dump(data, file)
+
+    def getSources(pages, tables, minutes):
+        assert tables == {2019: table}
+        return ({"u2019": {"hash": getPageHash(pages[2019]), "encoding": "utf-8"}}, {150: ("u150.htm", "2019-01-07")})
+
+    assert store.migrateFromPickleFiles(*files, getSources)
+    assert store.getDocRegPage(2019).text() == pages[2019]
+    assert store.getDocRegTable(2019) == table
+    assert store.getDocRegTablesVersion() is not None
+    assert getPageText(store.getMinutes(150)[-1]) == minutes[150][-1]
+    assert store.getAllPageValidators()["u2019"]["hash"] == getPageHash(store.getDocRegPage(2019))
+    assert store.getMinutesSources([150])[150][:3] == ("L2/19-001", "u150.htm", "2019-01-07")
+
+    # only once
+    assert not store.migrateFromPickleFiles(*files, getSources)
+
+
+def testMigrationWithoutPickleFiles(tmp_path, store):
+    assert store.migrateFromPickleFiles(tmp_path / "a.pickle", tmp_path / "b.pickle", tmp_path / "c.pickle")
+    assert store.isMigratedFromPickleFiles()
+    assert store.getDocRegPageYears() == []
+    assert store.getDocRegTablesVersion() is None
+    assert store.getMinutesMeetings() == []
+
+
+def testMigrationOnFirstUse(pickleJar):
+    # the migrated pages get validators, and the minutes the URL and date
+    # of their registry rows
+    store = utc_actions.getStore()
+    validators = store.getAllPageValidators()
+    for year, url in utc_actions.utcDocRegistry_urls.items():
+        assert validators[url]["hash"] == getPageHash(store.getDocRegPage(year))
+    meetings = utc_actions.getMeetingCatalog().meetings
+    sources = store.getMinutesSources(store.getMinutesMeetings())
+    assert len(sources) == len(meetings)
+    for mtg, (docNum, url, date, pageHash) in sources.items():
+        (year, sequenceInYear, row, minutesUrl) = meetings[mtg]
+        assert (docNum, url, date) == (row[0], minutesUrl, row[4])
+
+
+def testCrawlItems(store):
+    store.putCrawlItem("minutes", "u1.htm", "failed", "timeout")
+    store.putCrawlItem("minutes", "u1.htm", "done")
+    store.putCrawlItem("minutes", "u2.htm", "failed", "404")
+    assert store.getCrawlItems("minutes") == {"u1.htm": ("done", 2, None), "u2.htm": ("failed", 1, "404")}
+    store.clearCrawl("minutes")
+    assert store.getCrawlItems("minutes") == {}
+
+
+def testArtifacts(store):
+    store.putArtifacts("pages", {"a": ("in1", "out1"), "b": ("in2", "out2")})
+    store.putArtifacts("docs", {"a": ("in3", "out3")})
+    store.putArtifacts("pages", {"a": ("in4", "out4")})
+    assert store.getArtifacts("pages") == {"a": ("in4", "out4"), "b": ("in2", "out2")}
+    store.deleteArtifacts("pages", ["a"])
+    assert store.getArtifacts("pages") == {"b": ("in2", "out2")}
+    assert store.getArtifacts("docs") == {"a": ("in3", "out3")}
+    assert store.getArtifacts("other") == {}
+
+
+#--------------------------------------------------------
+#  Compressed minutes pages
+
+def testMinutesAreStoredCompressed(store):
+    minutes = {mtg: [2017, 1, f"L2/17-{mtg}", "Minutes", minutesPage(mtg, "Minutes of the meeting " * 20)] for mtg in range(150, 160)}
+    store.putMinutes(minutes)
+    assert store.hasCompressionDict()
+    for mtg, entry in minutes.items():
+        stored = store.getMinutes(mtg)[-1]
+        assert isinstance(stored, CompressedPage)
+        assert len(stored) < len(entry[-1].content)
+        assert stored.content() == entry[-1].content
+        assert getPageText(stored) == entry[-1].text()
+        assert getPageHash(stored) == getPageHash(entry[-1])
+    stats = store.getMinutesStorageStats()
+    assert stats["pages"] == 10
+    assert stats["storedBytes"] < stats["pageBytes"]
+
+
+def testFewPagesAreCompressedLater(store):
+    # too few pages to train a compression dictionary on
+    page = FetchedPage("<html><body><p>Minutes — café</p></body></html>".encode("cp1252"), "cp1252")
+    store.putMinutes({150: [2017, 1, "L2/17-001", "Minutes", page]})
+    stored = store.getMinutes(150)[-1]
+    assert isinstance(stored, FetchedPage)
+    assert (stored.content, stored.encoding) == (page.content, "cp1252")
+
+    store.compressStoredMinutes()
+    stored = store.getMinutes(150)[-1]
+    assert isinstance(stored, CompressedPage)
+    assert stored.encoding == "cp1252"
+    assert getPageText(stored) == page.text()
+    assert getPageHash(stored) == getPageHash(page)
+
+
+def testQueriesOnCompressedMinutes(servedCache):
+    minutes = utc_actions.getUtcMinutes()
+    entry = minutes[100]
+    assert isinstance(entry[-1], CompressedPage)
+    actions = utc_actions.findTaggedActionsInMinutes(entry)
+    assert len(actions) > 0 and all(action.startswith("[100-") for action in actions)
+    assert utc_actions.searchForTextInMinutes("Discussion of", 100, reportNoMatch=False)
@@ -1,10 +1,29 @@
-import requests
 from bs4 import BeautifulSoup, Comment, Tag, NavigableString
+from lxml import etree
 from pathlib import Path
-import pickle
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+import bisect
+import functools
+import logging
 import re
 import os
+import threading
+import time
 
+from utc_fetch import getFetcher
+from utc_instrument import span, timed, count
+from utc_pipeline import Stage, StageGraph, getHash
+from utc_export import exportRecords, actionFields, minutesSearchFields, docRegSearchFields
+from utc_store import UtcStore, StoredMinutes, getPageText, getPageContent, getPageHash, getDocRegRowKeys
+from utc_snapshot import DocRegSnapshot, writeDocRegSnapshot
+
+
+# Progress messages and warnings are logged, rather than printed; e.g., to
+# see progress, logging.basicConfig(level=logging.INFO). Timings and
+# counters for the pipeline stages are available through the sinks in
+# utc_instrument.py.
+logger = logging.getLogger("utc_actions")
 
 utcDocRegistry_urls = {
     2000: "https://www.unicode.org/L2/L2000/Register-2000.html",
@@ -54,22 +73,251 @@ earlyMinutes = {
 }
 
 
-# relative paths for pickle files to cache raw doc registry pages, 
-# contents of the table in those pages, and content of UTC meeting
-# minute pages
-def createPickleJarFolder():
-    if not os.path.exists("pickle_jar"):
-        os.makedirs("pickle_jar")
+# Folder for the local cache: from the UTC_ACTIONS_CACHE environment
+# variable if it's set, else pickle_jar in the working folder. Processes on
+# a host can share one cache by giving them the same folder (see
+# utc_store.py for how concurrent updates are handled); use setCacheRoot()
+# to change it. The folder is created when the cache is first used.
+cacheRoot = os.environ.get("UTC_ACTIONS_CACHE", "pickle_jar")
+
+# file name in cacheRoot for the store (an SQLite database) used to cache
+# raw doc registry pages, contents of the table in those pages, and content
+# of UTC meeting minute pages; see utc_store.py
+utcStore_file = 'utcCache.sqlite3'
+
+# file names in cacheRoot for the .pickle files used to cache the same data
+# in earlier versions; their content is migrated to the store on first use
+utcDocRegPages_pickleFile = 'utcDocRegPages.pickle'
+utcDocRegTables_pickleFile = 'utcDocRegTables.pickle'
+utcMinutesPages_pickleFile = 'utcAllMeetingMinutesPages.pickle'
+
+# file name in cacheRoot for a snapshot of the doc registry tables, which is
+# memory-mapped to load them; see utc_snapshot.py
+utcDocRegTables_snapshotFile = 'utcDocRegTables.snapshot'
 
-createPickleJarFolder()
-utcDocRegPages_pickleFile = 'pickle_jar/utcDocRegPages.pickle'
-utcDocRegTables_pickleFile = 'pickle_jar/utcDocRegTables.pickle'
-utcMinutesPages_pickleFile = 'pickle_jar/utcAllMeetingMinutesPages.pickle'
+
+def getCachePath(fileName):
+    return Path(cacheRoot) / fileName
+
+
+def createPickleJarFolder():
+    # Creates the cache folder; the store does this when it's opened.
+    getCachePath(".").mkdir(parents=True, exist_ok=True)
 
 docRegistryTableColumns = ["Document Number", "URL", "Subject", "Source", "Date"]
 
 whitespace_pattern = '[ \xa0\n]*'
 
+# Budget (in seconds) for a cold "import utc_actions". Importing the module
+# must not fetch pages or load cached data; see benchmarks.py.
+importTimeBudget = 0.5
+
+
+
+#--------------------------------------------------------
+#  Lazily-loaded module data
+
+# Loaded on first use; see getUtcDocRegTables() and getUtcMinutes().
+_utcDocRegTables = None
+_utc_minutes = None
+_utcStore = None
+_storeDataVersion = None
+
+
+def getStore():
+    '''Returns the UtcStore for the local cache, opening it on first use.
+
+    When the store is first opened, any data in .pickle files from earlier
+    versions is migrated into it (once).
+    '''
+    global _utcStore
+    if _utcStore is None:
+        store = UtcStore(getCachePath(utcStore_file))
+        pickleFiles = [getCachePath(f) for f in (utcDocRegPages_pickleFile, utcDocRegTables_pickleFile, utcMinutesPages_pickleFile)]
+        migrated = False
+        if not store.isMigratedFromPickleFiles():
+            with store.updating:
+                migrated = store.migrateFromPickleFiles(*pickleFiles, _getMigratedSources)
+        if migrated and any(f.is_file() for f in pickleFiles):
+            logger.info("migrated cached data from .pickle files")
+        _utcStore = store
+    return _utcStore
+
+
+def _getMigratedSources(pages, tables, minutes):
+    # Returns (validators, minutes sources) for data migrated from .pickle
+    # files (see UtcStore.migrateFromPickleFiles()): the content hash of each
+    # registry page, and the URL and date of each meeting's minutes row in
+    # the migrated tables. With these, a refresh finds the migrated pages
+    # stored, rather than retrieving them all again.
+    validators = {
+        utcDocRegistry_urls[year]: {"hash": getPageHash(page), "encoding": getPageContent(page)[1]}
+        for year, page in pages.items()
+        if year in utcDocRegistry_urls
+        }
+    meetings = MeetingCatalog.fromTables({year: table for year, table in tables.items() if year in utcDocRegistry_urls}).meetings
+    sources = {}
+    for mtg, entry in minutes.items():
+        found = meetings.get(mtg)
+        if entry is not None and found is not None and str(found[2][0]) == entry[2]:
+            (year, sequenceInYear, minutesRow, url) = found
+            sources[mtg] = (url, minutesRow[4])
+    return (validators, sources)
+
+
+def updatesStore(function):
+    '''Decorator for functions that update the store: the store's update
+    lock (see UtcStore.updating) is held while they run, so that processes
+    sharing the cache, and threads of one process, take turns.
+    '''
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        with getStore().updating:
+            return function(*args, **kwargs)
+    return wrapper
+
+
+def setCacheRoot(folder):
+    '''Sets the folder for the local cache (see cacheRoot), e.g., a folder
+    shared by several processes. The store in the previous folder is closed,
+    and data loaded from it is dropped.
+    '''
+    global cacheRoot, _utcStore, _stageGraph, _storeDataVersion
+    if _utcStore is not None:
+        _utcStore.close()
+    cacheRoot = str(folder)
+    _utcStore = None
+    _stageGraph = None
+    _storeDataVersion = None
+    _dropLoadedData()
+
+
+def _dropLoadedData():
+    # Drops data loaded from the store, to be reloaded on next use.
+    global _utcDocRegTables, _utc_minutes, _meetingCatalog, _docRegIndex, _textIndexTokens
+    _utcDocRegTables = None
+    _utc_minutes = None
+    _meetingCatalog = None
+    _docRegIndex = None
+    _textIndexTokens = None
+
+
+def _checkStoreDataVersion():
+    # Drops loaded data if another process has changed the store since it
+    # was loaded. (The store's own changes don't change its data version.)
+    global _storeDataVersion
+    version = getStore().getDataVersion()
+    if version != _storeDataVersion:
+        if _storeDataVersion is not None:
+            count("cache.storeChangedElsewhere")
+            _dropLoadedData()
+        _storeDataVersion = version
+
+
+def getUtcDocRegTables():
+    '''Returns the yearly doc registry tables, loading them on first use.
+
+    Cached data is used as-is (see getAllDocRegistryTables()); the live
+    current-year page is not retrieved. Call updateDocRegTablesWithLatest()
+    or refreshUtcData() to get the latest registry data.
+
+    The tables are loaded from a memory-mapped snapshot (see
+    _loadDocRegTables()), as read-only sequences of rows, each row read as a
+    list of str.
+
+    Also available as the module attribute utcDocRegTables.
+    '''
+    global _utcDocRegTables
+    _checkStoreDataVersion()
+    if _utcDocRegTables is None:
+        _utcDocRegTables = _loadDocRegTables()
+    return _utcDocRegTables
+
+
+def _loadDocRegTables():
+    # Returns the tables of the snapshot file, if it's of the stored tables.
+    # Otherwise, the tables are read from the store (derived first, if there
+    # are none), and a new snapshot is written and returned; if it can't be
+    # written (e.g., on Windows, while another process has the previous one
+    # mapped), the tables read from the store are returned.
+    store = getStore()
+    version = store.getDocRegTablesVersion()
+    if version is None:
+        getAllDocRegistryTables()
+        version = store.getDocRegTablesVersion()
+    path = getCachePath(utcDocRegTables_snapshotFile)
+    snapshot = _openDocRegSnapshot(path)
+    if snapshot is not None and snapshot.version == version:
+        count("cache.docRegSnapshot.hit")
+        return snapshot.tables
+
+    # The version is read before the tables, so if another process changes
+    # the tables meanwhile, the snapshot is taken as of the older version and
+    # is replaced on the next load.
+    count("cache.docRegSnapshot.miss")
+    tables = store.getAllDocRegTables()
+    try:
+        writeDocRegSnapshot(path, tables, version)
+    except OSError as e:
+        logger.info(f"couldn't write doc registry snapshot {path}: {e}")
+        return tables
+    snapshot = _openDocRegSnapshot(path)
+    # another process may have replaced it with one of other tables
+    return snapshot.tables if snapshot is not None and snapshot.version == version else tables
+
+
+def _openDocRegSnapshot(path):
+    # Returns the DocRegSnapshot at path, or None if there's none or it
+    # can't be read.
+    try:
+        return DocRegSnapshot(path)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        logger.info(f"couldn't read doc registry snapshot {path}: {e}")
+        return None
+
+
+def getUtcMinutes():
+    '''Returns the UTC meeting minutes data, loading it on first use.
+
+    The dict-like structure is {mtg#: [year, qtr, doc #, title, page
+    content]}; entries are read from the store as they're accessed. Cached
+    data is used as-is (see getAllMeetingMinutes()); no new minutes are
+    retrieved. Call updateAllMeetingMinutesWithLatest() or refreshUtcData()
+    to get minutes for recent meetings.
+
+    Also available as the module attribute utc_minutes.
+    '''
+    global _utc_minutes
+    if _utc_minutes is None:
+        _utc_minutes = getAllMeetingMinutes()
+    return _utc_minutes
+
+
+def refreshUtcData():
+    '''Retrieves the latest doc registry and meeting minutes data from the
+    Unicode site, updating the local cache and the loaded module data.
+
+    Only what may have changed is retrieved, and only data derived from
+    what has changed is re-derived; see refreshStages().
+
+    Importing the module doesn't do this; it must be requested explicitly.
+
+    Returns {stage name: [keys of the artifacts that were rebuilt]}.
+    '''
+    return refreshStages()
+
+
+def __getattr__(name):
+    # Module attributes for the lazily-loaded data (PEP 562). Lookups only
+    # get here if name isn't otherwise defined in the module.
+    if name == "utcDocRegTables":
+        return getUtcDocRegTables()
+    if name == "utc_minutes":
+        return getUtcMinutes()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 
 #--------------------------------------------------------
@@ -79,61 +327,83 @@ def getAllDocRegistryPages():
     """Get's html source for all of the UTC doc registry pages in
     utcDocRegistry_urls.
     
-    Will load content from a local .pickle file, if present. Otherwise will fetch
+    Will load content from the local store, if present. Otherwise will fetch
     the pages from the Unicode site.
 
-    Returns a dict with year as key and the html source text of the page as value.
+    Returns a dict with year as key and the page (a FetchedPage: the raw html
+    source and its encoding) as value.
     """
 
-    pickle_file = Path(utcDocRegPages_pickleFile)
-    if pickle_file.is_file():
-        with open(utcDocRegPages_pickleFile, 'rb') as file:
-            docRegPages = pickle.load(file)
-    else:
-        # retrieve pages; pickle for future use
-        createPickleJarFolder()
-        docRegPages = {}
-        for year, url in utcDocRegistry_urls.items():
-            print(f"retrieving doc registry page for {year}")
-            docRegPages[year] = requests.get(url).text
-        with open(utcDocRegPages_pickleFile, 'wb') as file:
-            pickle.dump(docRegPages, file, protocol=pickle.HIGHEST_PROTOCOL)
-    return docRegPages
+    store = getStore()
+    if len(store.getDocRegPageYears()) == 0:
+        with store.updating:
+            # another process may have retrieved them meanwhile
+            if len(store.getDocRegPageYears()) == 0:
+                # retrieve pages; store for future use
+                years = list(utcDocRegistry_urls)
+                logger.info(f"retrieving doc registry pages for {years[0]} to {years[-1]}")
+                fetchDocRegPagesIfChanged(years)
+    return store.getAllDocRegPages()
+
+
+def fetchFullPage(fetcher, validators, url):
+    # a full retrieval, reusing the page's encoding if it's known (the
+    # validators are kept for later conditional requests)
+    return fetcher.fetchPageIfChanged(url, {"encoding": validators.get(url, {}).get("encoding")})
+
+
+def fetchDocRegPagesIfChanged(years: list):
+    '''Retrieves the doc registry pages for the given years into the store.
+
+    Pages already in the store are revalidated with a conditional request,
+    using the validators (ETag, Last-Modified, content hash) saved from the
+    previous retrieval; if the server reports the page is not modified, or
+    the content is identical, the stored page is kept.
+
+    Returns a list of the years for which the page content changed.
+    '''
+    store = getStore()
+    validators = store.getAllPageValidators()
+    fetcher = getFetcher()
+    urls = [utcDocRegistry_urls[year] for year in years]
+    storedYears = store.getDocRegPageYears()
+    cachedUrls = {utcDocRegistry_urls[year] for year in years if year in storedYears}
+
+    def fetch(url):
+        if url in cachedUrls:
+            return fetcher.fetchPageIfChanged(url, validators.get(url))
+        return fetchFullPage(fetcher, validators, url)
+
+    changedPages = {}
+    newValidators = {}
+    for year, url, (page, pageValidators) in zip(years, urls, fetcher.fetchAll(urls, fetch)):
+        if pageValidators is not None:
+            newValidators[url] = pageValidators
+        if page is None:
+            logger.info(f"doc registry page for {year} is unchanged")
+        else:
+            changedPages[year] = page
+
+    store.putDocRegPages(changedPages)
+    store.putPageValidators(newValidators)
+    return list(changedPages)
 
 
 def updateDocRegPagesToLatest():
     '''Gets an up-to-date dict of pages from utcDocRegistry_urls.
     
-    Will start with a local .pickle file, if present. Otherwise, will fetch all
-    pages from the Unicode site and create a .pickle file for future use.
+    Will start with the local store, if present. Otherwise, will fetch all
+    pages from the Unicode site and store them for future use.
 
-    The current-year document registry is a live page, so the latest version of
-    that page is always retrieved, and the .pickle file is updated.
+    The current-year document registry is a live page, so it is always
+    revalidated with the server; if it has changed, the latest version is
+    retrieved and the store is updated. Pages for years that are new in
+    utcDocRegistry_urls, or whose URL has changed, are retrieved.
 
-    Returns a dict with year as key and the html source text of the page as value.
+    Returns a dict with year as key and the page (a FetchedPage) as value.
     '''
-
-    # check if there's a pickle file; if not, we need to get all
-    # pages regardless
-    pickle_file = Path(utcDocRegPages_pickleFile)
-    if not pickle_file.is_file():
-        docRegPages = getAllDocRegistryPages
-    else:
-        with open(utcDocRegPages_pickleFile, 'rb') as file:
-            docRegPages = pickle.load(file)
-
-        # compare years in docRegPages with years in utcDocRegistry_urls
-        # we know we need to update the current year regardless
-        pickledYears = list(docRegPages)
-        knownYears = list(utcDocRegistry_urls)
-        yearsToGet = knownYears[len(pickledYears): -1] + [knownYears[-1]]
-        for year in yearsToGet:
-            print(f"retrieving doc registry page for {year}")
-            url = utcDocRegistry_urls[year]
-            docRegPages[year] = requests.get(url).text
-        with open(utcDocRegPages_pickleFile, 'wb') as file:
-            pickle.dump(docRegPages, file, protocol=pickle.HIGHEST_PROTOCOL)
-    return docRegPages
+    refreshStages(["docRegPages"])
+    return getStore().getAllDocRegPages()
 
 
 
@@ -209,6 +479,31 @@ def desoupDocRegTableCells(rows: list):
     return rows
 
 
+@functools.lru_cache(maxsize=None)
+def _isLxmlEncoding(encoding):
+    try:
+        etree.HTMLParser(encoding=encoding)
+        return True
+    except LookupError:
+        return False
+
+
+def getPageMarkup(page):
+    '''Returns (markup, encoding) to parse a page (a str, FetchedPage or
+    CompressedPage) with lxml or Beautiful Soup: the raw bytes and their
+    encoding, so that lxml does the decoding and no encoding detection is
+    needed. If lxml doesn't support the encoding, the decoded text is
+    returned, with None.
+    '''
+    if isinstance(page, str):
+        return (page, None)
+    (content, encoding) = getPageContent(page)
+    if not _isLxmlEncoding(encoding):
+        return (content.decode(encoding, "replace"), None)
+    return (content, encoding)
+
+
+@timed("extract.docRegTable")
 def getDocRegTableFromPage(page):
     '''Takes doc registry HTML page content and returns a cleaned-up list.
     
@@ -219,14 +514,103 @@ def getDocRegTableFromPage(page):
       - subject (title; may be multi-line)
       - source (authors)
       - date
+
+    The rows are extracted from an lxml tree of the page; the result is the
+    same as from getDocRegTableFromPageUsingSoup(), but several times faster.
     '''
-    soup = BeautifulSoup(page, "lxml")
+    (markup, encoding) = getPageMarkup(page)
+    root = etree.HTML(markup, etree.HTMLParser(encoding=encoding))
+    contents = root.xpath(_docRegContentsXPath)
+    table = contents[0].xpath(_docRegTableXPath)[0]
+
+    rows = []
+    isFirstRow = True
+    for tr in table.iterdescendants("tr"):
+        # skip empty rows, and the heading row (see desoupTableRows())
+        if getSoupText(tr).strip(" \xa0\n") == "":
+            continue
+        cells = list(tr.iterdescendants("th", "td"))
+        if isFirstRow:
+            isFirstRow = False
+            if cells[0].tag == "th":
+                continue
+        a = next(cells[0].iterdescendants("a"), None)
+        rows.append([
+            getSoupText(cells[0]),
+            '' if a is None else a.get("href"),
+            getSoupText(cells[1]),
+            getSoupText(cells[2]),
+            getSoupText(cells[3])
+            ])
+    return rows
+
+
+# First element with class "contents", and the first element within it with
+# class "subtle" (as soup.find(class_=...) would find them)
+_docRegContentsXPath = "(//*[contains(concat(' ', normalize-space(@class), ' '), ' contents ')])[1]"
+_docRegTableXPath = "(.//*[contains(concat(' ', normalize-space(@class), ' '), ' subtle ')])[1]"
+
+def getSoupText(element):
+    '''Returns the text of an lxml element as Beautiful Soup gives it for
+    the same element (.text): comments and the content of script, style and
+    template elements are left out, and strings that are only ASCII
+    whitespace are collapsed to a newline or space, except within <pre> or
+    <textarea>.
+    '''
+    parts = []
+    inPre = element.tag in _preserveWhitespaceTags or next(element.iterancestors(*_preserveWhitespaceTags), None) is not None
+    _appendSoupText(element, parts, inPre)
+    return "".join(parts)
+
+
+_asciiSpaces = " \n\t\f\r"
+_preserveWhitespaceTags = ("pre", "textarea")
+_nonTextTags = ("script", "style", "template")
+
+def _appendSoupString(s, parts, inPre):
+    if not inPre and s.strip(_asciiSpaces) == "":
+        s = "\n" if "\n" in s else " "
+    parts.append(s)
+
+def _appendSoupText(element, parts, inPre):
+    if element.text:
+        _appendSoupString(element.text, parts, inPre)
+    for child in element:
+        # comments and processing instructions have a non-str tag
+        if isinstance(child.tag, str) and child.tag not in _nonTextTags:
+            _appendSoupText(child, parts, inPre or child.tag in _preserveWhitespaceTags)
+        if child.tail:
+            _appendSoupString(child.tail, parts, inPre)
+
+
+@timed("extract.docRegTable.soup")
+def getDocRegTableFromPageUsingSoup(page):
+    '''Derives the doc registry table from a page (see
+    getDocRegTableFromPage()) using a full Beautiful Soup tree. Kept as the
+    reference for verifyDocRegTableExtraction().
+    '''
+    (markup, encoding) = getPageMarkup(page)
+    soup = BeautifulSoup(markup, "lxml", from_encoding=encoding)
     tableSoup = soup.find(class_="contents").find(class_="subtle")
     rows = desoupTableRows(tableSoup)
     rows = desoupDocRegTableCells(rows)
     return rows
 
 
+def verifyDocRegTableExtraction(pages = None):
+    '''Checks that getDocRegTableFromPage() gives the same table as
+    getDocRegTableFromPageUsingSoup() for each doc registry page, by default
+    the stored pages for all years. Returns a list of the years that differ.
+    '''
+    if pages is None:
+        store = getStore()
+        pages = {year: store.getDocRegPage(year) for year in store.getDocRegPageYears()}
+    return [
+        year for year, page in pages.items()
+        if getDocRegTableFromPage(page) != getDocRegTableFromPageUsingSoup(page)
+        ]
+
+
 def getAllDocRegistryTables(forceRefresh = False):
     '''Get the UTC doc registries as a dict of cleaned-up tables.
     
@@ -239,64 +623,44 @@ def getAllDocRegistryTables(forceRefresh = False):
       - source (authors)
       - date
     
-    Will retrieve the data from a local .pickle file, if present. If not, a
-    .pickle file will be created for future use.
+    Will retrieve the data from the local store, if present. If not, the tables
+    will be derived and stored for future use.
     '''
 
-    # load from pickle file, if present
-    pickle_file = Path(utcDocRegTables_pickleFile)
-    if pickle_file.is_file() and not forceRefresh:
-        with open(utcDocRegTables_pickleFile, 'rb') as file:
-            tables = pickle.load(file)
-    else:
-        # derive table soups; pickle them for future
-        createPickleJarFolder()
-        pages = getAllDocRegistryPages()
-        tables = {}
-        for year, page in pages.items():
-            print(f"getting doc registry table for {year}")
-            tables[year] = getDocRegTableFromPage(page)
-        with open(pickle_file, 'wb') as file:
-            pickle.dump(tables, file, protocol=pickle.HIGHEST_PROTOCOL)
-    return tables
+    # load from the store, if present
+    store = getStore()
+    if len(store.getDocRegTableYears()) == 0 or forceRefresh:
+        with store.updating:
+            # another process may have derived them meanwhile
+            if len(store.getDocRegTableYears()) == 0 or forceRefresh:
+                # derive table soups; store them for future
+                pages = getAllDocRegistryPages()
+                tables = {}
+                for year, page in pages.items():
+                    logger.info(f"getting doc registry table for {year}")
+                    tables[year] = getDocRegTableFromPage(page)
+                store.putDocRegTables(tables)
+    return store.getAllDocRegTables()
 
 
 def updateDocRegTablesWithLatest():
     '''Gets an up-to-date dict of yearly document registry tables.
     
-    Will start with data from a local .pickle file, if present. Otherwise, a new
-    .pickle file will be created for future use.
+    Will start with data from the local store, if present. Otherwise, the
+    tables will be derived and stored for future use.
 
-    The current-year document registry is a live page, so the latest version of
-    that page is always retrieved, and the .pickle file is updated.
+    The current-year document registry is a live page, so it is always
+    revalidated with the server. A table is re-derived only if its page has
+    changed (see refreshStages()), and then only the rows that were added,
+    changed or withdrawn (compared by doc number) are updated in the store.
+    The changes are available from getLastDocRegChanges(), and are logged in
+    the store (see getDocRegChanges()).
 
     Returns a dict with year as key and the document registry table for that
     year as value. Each yearly table is a list of lists.
     '''
-
-    # check if there's a pickle file; if not, we need to get all
-    # tables regardless
-    pickle_file = Path(utcDocRegTables_pickleFile)
-    if not pickle_file.is_file():
-        docRegTables = getAllDocRegistryTables()
-    else:
-        # get pickled tables
-        with open(utcDocRegTables_pickleFile, 'rb') as file:
-            docRegTables = pickle.load(file)
-        # compare years; we know we need to update the current year regardless
-        pickledYears = list(docRegTables)
-        knownYears = list(utcDocRegistry_urls)
-        yearsToGet = knownYears[len(pickledYears): -1] + [knownYears[-1]]
-        # before updating tables, update the pages
-        docRegPages = updateDocRegPagesToLatest()
-        # now update tables for recent years
-        for year in yearsToGet:
-            print(f"getting doc registry table for {year}")
-            docRegTables[year] = getDocRegTableFromPage(docRegPages[year])
-        with open(pickle_file, 'wb') as file:
-            pickle.dump(docRegTables, file, protocol=pickle.HIGHEST_PROTOCOL)
-    return docRegTables
-
+    refreshStages(["docRegTables"])
+    return getUtcDocRegTables()
 
 
 def searchForTextInDocRegTable(text, year, ignoreCase = True, textIsRegExPattern = False):
@@ -317,40 +681,60 @@ def searchForTextInDocRegTable(text, year, ignoreCase = True, textIsRegExPattern
 
     # check that year is in range of known years
     if year not in list(utcDocRegistry_urls):
-        print(f'UTC document registry infomation is not available for {year}.')
+        logger.warning(f'UTC document registry infomation is not available for {year}.')
         return
     
-    if not textIsRegExPattern:
-        text = ".*" + text + ".*"
-    if ignoreCase:
-        pattern = re.compile(text, re.IGNORECASE)
-    else:
-        pattern = re.compile(text)
-
-    docRegTable = utcDocRegTables[year]
-    docResultRows = [
-        r for r in docRegTable
-        if re.match(pattern, re.sub('\\s+', ' ', r[2])) is not None
-    ]
-    return docResultRows
+    index = getDocRegIndex()
+    rows = intersectRows(index.filterYears(year, year), index.filterSubject(text, ignoreCase, textIsRegExPattern))
+    return index.getTableRows(rows).get(year, [])
 
 
 def searchForTextInAllDocRegTables(text, ignoreCase = True):
     # returns a dict {year: [results]}
-    results = {}
-    count = 0
-    for year in list(utcDocRegTables):
-        result = searchForTextInDocRegTable(text, year, ignoreCase)
-        if len(result) != 0:
-            count += len(result)
-            results[year] = result
-    if count == 0:
-        print("No matches found")
-    elif count == 1:
-        print("1 match found")
+    index = getDocRegIndex()
+    rows = index.filterSubject(text, ignoreCase)
+    matchCount = len(rows)
+    if matchCount == 0:
+        logger.info("No matches found")
+    elif matchCount == 1:
+        logger.info("1 match found")
     else:
-        print(f'{count} matches found')
-    return results
+        logger.info(f'{matchCount} matches found')
+    return index.getTableRows(rows)
+
+
+@timed("search.docRegistry")
+def searchDocRegistry(subject = None, source = None, firstDate = None, lastDate = None,
+                      docNumPrefix = None, years = None, ignoreCase = True):
+    '''Searches the doc registry tables for all years, and returns a dict
+    {year: [rows]} of the rows matching all of the given criteria:
+      - subject: text (or regex pattern) in the subject
+      - source: text (or regex pattern) in the source (authors)
+      - firstDate, lastDate: date range, inclusive, as "yyyy-mm-dd" (or a
+        prefix, such as "2019" or "2019-06")
+      - docNumPrefix: doc number prefix, such as "L2/19-"
+      - years: an iterable of registry years
+    '''
+    index = getDocRegIndex()
+    filters = []
+    if subject is not None:
+        filters.append(index.filterSubject(subject, ignoreCase))
+    if source is not None:
+        filters.append(index.filterSource(source, ignoreCase))
+    if firstDate is not None or lastDate is not None:
+        filters.append(index.filterDates(firstDate, lastDate))
+    if docNumPrefix is not None:
+        filters.append(index.filterDocNumPrefix(docNumPrefix))
+    if years is not None:
+        rows = array('L')
+        for year in sorted(set(years)):
+            rows.extend(index.filterYears(year, year))
+        filters.append(rows)
+    if len(filters) == 0:
+        rows = range(len(index))
+    else:
+        rows = intersectRows(*filters)
+    return index.getTableRows(rows)
 
 
 def writeToFileSearchForTextInDocRegistryResults(filename:str, text:str, year = None, ignoreCase = True):
@@ -359,7 +743,7 @@ def writeToFileSearchForTextInDocRegistryResults(filename:str, text:str, year =
     else:
         results = searchForTextInDocRegTable(text, year, ignoreCase)
     if len(results) == 0:
-        print("No results found")
+        logger.info("No results found")
     else:
         f = open(filename, "w", encoding="utf-8")
         for year, resultRows in results.items():
@@ -371,28 +755,296 @@ def writeToFileSearchForTextInDocRegistryResults(filename:str, text:str, year =
         f.close()
 
 
+#--------------------------------------------------------
+#  Changes in the doc registry tables
+#
+# When the live current-year registry changes, the new table is compared
+# with the stored one row by row, keyed by doc number (see
+# getDocRegRowKeys()), and only the differences are stored. Each change is a
+# DocRegChange; the changes are logged in the store with increasing ids, so
+# that a job that acts on new documents can ask for just the changes since
+# the last ones it saw.
+
+# Changes from the last call to updateDocRegTablesWithLatest().
+_lastDocRegChanges = []
+
+
+class DocRegChange:
+    '''A change to a row of a doc registry table.
+
+    change is "added", "changed" or "withdrawn". oldRow is None for added
+    rows, and newRow is None for withdrawn rows. id is the id of the change
+    in the store's change log (None if not from the log).
+    '''
+    __slots__ = ("year", "docKey", "change", "oldRow", "newRow", "id")
+
+    def __init__(self, year, docKey, change, oldRow, newRow, id = None):
+        self.year = year
+        self.docKey = docKey
+        self.change = change
+        self.oldRow = oldRow
+        self.newRow = newRow
+        self.id = id
+
+    def __eq__(self, other):
+        if not isinstance(other, DocRegChange):
+            return NotImplemented
+        return all(getattr(self, a) == getattr(other, a) for a in self.__slots__)
+
+    def __repr__(self):
+        return f"DocRegChange({self.year}, {self.docKey!r}, {self.change!r})"
+
+
+def diffDocRegTables(oldTable, newTable):
+    '''Compares two versions of a doc registry table by doc number.
+
+    Returns (changes, rows): changes is a list of (doc key, change, old row,
+    new row) as for DocRegChange (added and changed rows in the order of the
+    new table, then withdrawn rows); rows is a list of (doc key, position,
+    row) for the rows of the new table that are added, changed or have moved.
+    '''
+    oldKeys = getDocRegRowKeys(oldTable)
+    oldRows = {key: (position, row) for position, (key, row) in enumerate(zip(oldKeys, oldTable))}
+    changes = []
+    rows = []
+    newKeys = getDocRegRowKeys(newTable)
+    for position, (key, row) in enumerate(zip(newKeys, newTable)):
+        old = oldRows.get(key)
+        if old is None:
+            changes.append((key, "added", None, row))
+            rows.append((key, position, row))
+        elif old[1] != row:
+            changes.append((key, "changed", old[1], row))
+            rows.append((key, position, row))
+        elif old[0] != position:
+            rows.append((key, position, row))
+    newKeys = set(newKeys)
+    for key in oldKeys:
+        if key not in newKeys:
+            changes.append((key, "withdrawn", oldRows[key][1], None))
+    return changes, rows
+
+
+def applyDocRegTableChanges(year, oldTable, newTable):
+    '''Updates the stored doc registry table for year from oldTable to
+    newTable, writing only the rows that differ, and logs the changes.
+
+    Returns (table, changes): the updated table, which shares the unchanged
+    rows with oldTable, and a list of DocRegChange.
+    '''
+    changes, rows = diffDocRegTables(oldTable, newTable)
+    if len(rows) == 0 and len(changes) == 0:
+        return oldTable, []
+    withdrawnKeys = [key for (key, change, oldRow, newRow) in changes if change == "withdrawn"]
+    getStore().updateDocRegTableRows(year, rows, withdrawnKeys, changes)
+
+    oldRows = dict(zip(getDocRegRowKeys(oldTable), oldTable))
+    table = []
+    for key, row in zip(getDocRegRowKeys(newTable), newTable):
+        oldRow = oldRows.get(key)
+        table.append(oldRow if oldRow == row else row)
+    return table, [DocRegChange(year, *c) for c in changes]
+
+
+def getLastDocRegChanges():
+    '''Returns the list of DocRegChange from the last call to
+    updateDocRegTablesWithLatest() (or refreshUtcData()).
+    '''
+    return list(_lastDocRegChanges)
+
+
+def getDocRegChanges(sinceId = 0):
+    '''Returns the doc registry changes logged in the store after the given
+    change id, as a list of DocRegChange, oldest first. E.g., to act on new
+    documents since the last check:
+
+        changes = getDocRegChanges(lastSeenId)
+        newDocs = [c.newRow for c in changes if c.change == "added"]
+        if changes:
+            lastSeenId = changes[-1].id
+    '''
+    return [
+        DocRegChange(year, key, change, oldRow, newRow, changeId)
+        for (changeId, year, key, change, oldRow, newRow) in getStore().getDocRegChanges(sinceId)
+        ]
+
+
+#--------------------------------------------------------
+#  Indexed search in doc registry tables
+#
+# The rows of all the yearly tables are held in one columnar DocRegIndex,
+# with normalized subject and source text and a token index of subjects, so
+# that searches over all years don't loop over every row. It's derived from
+# the loaded tables, and rebuilt when they change.
+
+_docRegIndex = None
+
+
+class DocRegIndex:
+    '''Columnar form of the doc registry tables, for searching.
+
+    Columns are parallel sequences indexed by row, in year and table order:
+      - years: array of registry years
+      - tableRows: array of row numbers within the year's table
+      - docNums, dates: lists of str
+      - subjects: list of subjects, normalized (whitespace runs collapsed to
+        a space)
+    yearRows has the (start, end) range of rows for each year.
+    The normalized sources are held in one str (sources), each followed by a
+    newline; sourceStarts has the offset of each row's source.
+
+    subjectPostings is a token index of subjects: {token: array of (row,
+    position) pairs} (see getNodeTokenPostings()). docNumOrder and dateOrder
+    are the rows sorted by doc number and date.
+
+    Filtering methods return arrays of row indices, which can be combined
+    with intersectRows() and turned into table rows with getTableRows().
+    '''
+
+    def __init__(self, tables: dict):
+        self.tables = tables
+        self.years = array('H')
+        self.tableRows = array('L')
+        self.docNums = []
+        self.subjects = []
+        self.dates = []
+        sources = []
+        for year, table in tables.items():
+            for i, r in enumerate(table):
+                self.years.append(year)
+                self.tableRows.append(i)
+                self.docNums.append(r[0])
+                self.subjects.append(re.sub('\\s+', ' ', r[2]))
+                sources.append(re.sub('\\s+', ' ', r[3]) + "\n")
+                self.dates.append(r[4].strip())
+        self.sources = ''.join(sources)
+        self.yearRows = {}
+        for i, year in enumerate(self.years):
+            start, end = self.yearRows.get(year, (i, i))
+            self.yearRows[year] = (start, i + 1)
+        self.sourceStarts = array('L', [0])
+        for source in sources:
+            self.sourceStarts.append(self.sourceStarts[-1] + len(source))
+        self.subjectPostings = getNodeTokenPostings(self.subjects)
+        self.docNumOrder = array('L', sorted(range(len(self)), key=self.docNums.__getitem__))
+        self.dateOrder = array('L', sorted(range(len(self)), key=self.dates.__getitem__))
+        self._sortedDocNums = [self.docNums[i] for i in self.docNumOrder]
+        self._sortedDates = [self.dates[i] for i in self.dateOrder]
+
+    def __len__(self):
+        return len(self.docNums)
+
+    def getTableRows(self, rows):
+        '''Returns a dict {year: [table rows]} for the given rows.'''
+        results = {}
+        for year, tableRows in self.iterTableRows(rows):
+            results.setdefault(year, []).extend(tableRows)
+        return results
+
+    def iterTableRows(self, rows):
+        '''Yields (year, [table rows]) for the given rows, a year at a time:
+        each year's rows are built when the previous year's have been used.
+        The rows of a year come together when rows are in ascending order, as
+        the filter methods return them.
+        '''
+        year, tableRows = None, []
+        for i in rows:
+            if self.years[i] != year:
+                if tableRows:
+                    yield year, tableRows
+                year, tableRows = self.years[i], []
+            tableRows.append(self.tables[year][self.tableRows[i]])
+        if tableRows:
+            yield year, tableRows
+
+    def filterYears(self, firstYear, lastYear):
+        rows = array('L')
+        for year, (start, end) in self.yearRows.items():
+            if firstYear <= year <= lastYear:
+                rows.extend(range(start, end))
+        return rows
+
+    def filterSubject(self, text, ignoreCase = True, textIsRegExPattern = False):
+        '''Rows with subjects containing text, which can be a regex
+        pattern. If textIsRegExPattern is True, the pattern must match at the
+        start of the subject (see searchForTextInDocRegTable()).
+
+        Plain text is looked up in the token index; other patterns are
+        matched against each subject.
+        '''
+        if textIsRegExPattern:
+            pattern = re.compile(text, re.IGNORECASE if ignoreCase else 0)
+            return array('L', (i for i, subject in enumerate(self.subjects) if pattern.match(subject) is not None))
+
+        pattern = re.compile(".*" + text + ".*", re.IGNORECASE if ignoreCase else 0)
+        queryTokens = getPlainTextQueryTokens(text)
+        if queryTokens is not None:
+            termsForQueryTokens = getIndexTermsForQuery(queryTokens, len(text), self.subjectPostings)
+            if termsForQueryTokens is not None:
+                def getPostings(terms):
+                    for term in terms:
+                        postings = self.subjectPostings.get(term)
+                        if postings is not None:
+                            yield 0, postings
+                candidates = findPhraseCandidates(termsForQueryTokens, getPostings)
+                rows = sorted(i for (_, i) in candidates)
+                return array('L', (i for i in rows if pattern.match(self.subjects[i]) is not None))
+
+        return array('L', (i for i, subject in enumerate(self.subjects) if pattern.match(subject) is not None))
+
+    def filterSource(self, pattern, ignoreCase = True):
+        '''Rows with a source (authors) matching a regex pattern. The
+        pattern is searched for in the combined text of all rows (with ^
+        and $ matching at the start and end of each row), so it should not
+        match across newlines.
+        '''
+        pattern = re.compile(pattern, re.MULTILINE | (re.IGNORECASE if ignoreCase else 0))
+        rows = array('L')
+        for m in pattern.finditer(self.sources):
+            row = bisect.bisect_right(self.sourceStarts, m.start()) - 1
+            if row >= len(self):
+                # a zero-width match at the end of the text
+                break
+            if len(rows) == 0 or rows[-1] != row:
+                rows.append(row)
+        return rows
+
+    def filterDates(self, firstDate = None, lastDate = None):
+        '''Rows dated from firstDate to lastDate, inclusive. Dates are
+        "yyyy-mm-dd" strings; firstDate and lastDate can be prefixes, such as
+        "2019" or "2019-06".
+        '''
+        start = 0 if firstDate is None else bisect.bisect_left(self._sortedDates, firstDate)
+        end = len(self) if lastDate is None else bisect.bisect_right(self._sortedDates, lastDate + "\uffff")
+        return array('L', sorted(self.dateOrder[start:end]))
+
+    def filterDocNumPrefix(self, prefix):
+        '''Rows with doc numbers starting with prefix, such as "L2/19-".'''
+        start = bisect.bisect_left(self._sortedDocNums, prefix)
+        end = bisect.bisect_left(self._sortedDocNums, prefix + "\uffff")
+        return array('L', sorted(self.docNumOrder[start:end]))
+
+
+def getDocRegIndex():
+    '''Returns the DocRegIndex for the loaded doc registry tables, building
+    it on first use or after the tables have changed.
+    '''
+    global _docRegIndex
+    tables = getUtcDocRegTables()
+    if _docRegIndex is None or _docRegIndex.tables is not tables:
+        count("cache.docRegIndex.miss")
+        with span("index.docRegistry"):
+            _docRegIndex = DocRegIndex(tables)
+    else:
+        count("cache.docRegIndex.hit")
+    return _docRegIndex
+
+
 #--------------------------------------------------------
 #  Functions for UTC meeting minutes documents
 
 def getFirstAndLastKnownUtcMeetings():
-    tables = utcDocRegTables
-    earliest = 999
-    latest = 0
-    for y, t in tables.items():
-        if y in list(earlyMinutes):
-            if earlyMinutes[y][0] < earliest:
-                earliest = earlyMinutes[y][0]
-            if earlyMinutes[y][-1] > latest:
-                latest = earlyMinutes[y][-1]
-        else:
-            minutes_rows = findMinutesRowsInYearRows(y, t)
-            firstMtgNum = getMeetingNumberFromMinutesRow(minutes_rows[0])
-            if firstMtgNum < earliest:
-                earliest = firstMtgNum
-            lastMtgNum = getMeetingNumberFromMinutesRow(minutes_rows[-1])
-            if lastMtgNum > latest:
-                latest = lastMtgNum
-    return (earliest, latest)
+    return getMeetingCatalog().knownRange
 
 
 def getMeetingNumberFromMinutesRow(minutesRow):
@@ -410,7 +1062,7 @@ def getMinutesRowsForEarlyYear(year):
 
 def findMinutesRowsInYearRows(year, table:list):
     if year in (earlyMinutes.keys()):
-        return getMinutesRowsForEarlyYear()
+        return getMinutesRowsForEarlyYear(year)
     minutes_rows = [
         row for row in table
         if re.search('minute', row[2].lower()) is not None
@@ -423,21 +1075,106 @@ def findMinutesRowsInYearRows(year, table:list):
 
 
 def findMinutesRowForMeeting(meetingNumber):
-    tables = utcDocRegTables
-    for y, t in tables.items():
-        # looking at doc registry for year y, check for meetingNumber
-        if (meetingNumber in earlyUtcMinutesRows.keys()):
-            r = earlyUtcMinutesRows(meetingNumber)
-            return (r[0], r[1], r)
-        else:
+    # Returns (year, sequence in year, minutes row) for a meeting, or None.
+    found = getMeetingCatalog().meetings.get(meetingNumber)
+    if found is None: return
+    return found[:3]
+
+
+#--------------------------------------------------------
+#  Catalog of UTC meetings
+#
+# Finding the minutes rows in the doc registry tables means filtering every
+# row of every year, so it's done once: the results are kept in a meeting
+# catalog, which is persisted in the store. The store clears it whenever a
+# doc registry table changes, and it's then rebuilt on next use.
+
+_meetingCatalog = None
+
+
+class MeetingCatalog:
+    '''The minutes rows in the doc registry tables (see
+    findMinutesRowsInYearRows()).
+
+    rows is a list of (year, sequence in year, mtg#, minutes row), in year
+    and table order; mtg# is from the row's subject, and is None if the
+    subject doesn't give it. urls has the minutes URL for each row. (URLs
+    depend on utcDocRegistry_urls, so aren't stored.)
+
+    meetings is a dict {mtg#: (year, sequence in year, minutes row, minutes
+    url)}; if a meeting number appears in more than one row, the first is
+    used. Early meetings (see earlyUtcMinutesRows) use the hard-coded rows.
+
+    knownRange is (first, last) known meeting number.
+    '''
+
+    def __init__(self, rows, knownRange):
+        self.rows = rows
+        self.knownRange = knownRange
+        self.urls = [getDocRegistryBaseUrl(year) + minutesRow[1] for (year, _, _, minutesRow) in rows]
+        self.meetings = {}
+        for (year, sequenceInYear, mtgNum, minutesRow), url in zip(rows, self.urls):
+            if mtgNum is not None:
+                self.meetings.setdefault(mtgNum, (year, sequenceInYear, minutesRow, url))
+        for mtgNum, (year, sequenceInYear, minutesRow) in earlyUtcMinutesRows.items():
+            self.meetings[mtgNum] = (year, sequenceInYear, minutesRow, getDocRegistryBaseUrl(year) + minutesRow[1])
+        self.tables = None
+
+    @classmethod
+    def fromTables(cls, tables: dict):
+        '''Derives the catalog from the doc registry tables.'''
+        rows = []
+        earliest = 999
+        latest = 0
+        for y, t in tables.items():
             minutes_rows = findMinutesRowsInYearRows(y, t)
-        for i in range(len(minutes_rows)):
-            r = minutes_rows[i]
-            m = re.search('(UTC ?[a-zA-Z ]*#?)([0-9]*)', r[2])
-            if m.group(2) != '' and meetingNumber == int(m.group(2)):
-                return (y, i + 1, r)
-            else:
-                continue
+            for i in range(len(minutes_rows)):
+                r = minutes_rows[i]
+                m = re.search('(UTC ?[a-zA-Z ]*#?)([0-9]*)', r[2])
+                mtgNum = int(m.group(2)) if m is not None and m.group(2) != '' else None
+                rows.append((y, i + 1, mtgNum, r))
+            # first and last known meetings
+            if y in list(earlyMinutes):
+                earliest = min(earliest, earlyMinutes[y][0])
+                latest = max(latest, earlyMinutes[y][-1])
+            elif len(minutes_rows) > 0:
+                earliest = min(earliest, getMeetingNumberFromMinutesRow(minutes_rows[0]))
+                latest = max(latest, getMeetingNumberFromMinutesRow(minutes_rows[-1]))
+        return cls(rows, (earliest, latest))
+
+    def getYearRows(self, year):
+        '''Returns (sequence in year, mtg#, minutes row, minutes url) for
+        the minutes rows of a year.
+        '''
+        return [
+            (sequenceInYear, mtgNum, minutesRow, url)
+            for (y, sequenceInYear, mtgNum, minutesRow), url in zip(self.rows, self.urls)
+            if y == year
+            ]
+
+
+def getMeetingCatalog():
+    '''Returns the MeetingCatalog for the doc registry tables: from memory,
+    or the store, or derived from the tables if a table has changed since
+    it was stored.
+    '''
+    global _meetingCatalog
+    tables = getUtcDocRegTables()
+    if _meetingCatalog is None or _meetingCatalog.tables is not tables:
+        store = getStore()
+        stored = store.getMeetingCatalog()
+        if stored is not None:
+            count("cache.meetingCatalog.storeHit")
+            catalog = MeetingCatalog(*stored)
+        else:
+            count("cache.meetingCatalog.miss")
+            catalog = MeetingCatalog.fromTables(tables)
+            store.putMeetingCatalog(catalog.rows, catalog.knownRange)
+        catalog.tables = tables
+        _meetingCatalog = catalog
+    else:
+        count("cache.meetingCatalog.hit")
+    return _meetingCatalog
 
 
 def getMinutesDetails(base_url, doc_row:list, lastMeetingNumber:int = 0):
@@ -448,10 +1185,9 @@ def getMinutesDetails(base_url, doc_row:list, lastMeetingNumber:int = 0):
     if mtg_num > lastMeetingNumber:
         url = base_url + doc_row[1]
         if lastMeetingNumber > 0:
-            print(f"retrieving UTC meeting {mtg_num} minutes doc")
-        page = requests.get(url).text
-        soup = BeautifulSoup(page, 'lxml')
-        title = soup.title.text
+            logger.info(f"retrieving UTC meeting {mtg_num} minutes doc")
+        page = getFetcher().fetchPage(url)
+        title, _ = getTitleAndMeetingNumberFromMinutesPage(page, checkMeetingNumber = False)
         details = [mtg_num, str(doc_row[0]), str(title), page]
     return details
 
@@ -464,67 +1200,228 @@ def fetchMinutesForMeetingRange(firstMeeting=1, lastMeeting=999):
     ### first supported year; and lastMeeting will be the last meeting with
     ### posted minutes in the last supported year.
 
+    utc_minutes = getUtcMinutes()
     firstMeeting = max(firstMeeting, min(list(utc_minutes.keys())))
     lastMeeting = min(lastMeeting, max(list(utc_minutes.keys())))
 
-    print("Fetching minutes for meetings", firstMeeting, "to", lastMeeting)
+    logger.info(f"Fetching minutes for meetings {firstMeeting} to {lastMeeting}")
 
     # Docs will be fetched from the server; pickled docs are not used.
 
-    allMtgMinutes = {}
-    for i in range(firstMeeting, lastMeeting + 1):
-        allMtgMinutes[i] = fetchMeetingMinutes(i)
-    return allMtgMinutes
+    return fetchMeetingMinutesForList(range(firstMeeting, lastMeeting + 1))
 
 
 def refreshUtcMinutes():
-    utc_minutes = getAllMeetingMinutes()
+    global _utc_minutes
+    _utc_minutes = getAllMeetingMinutes(forceRefresh=True)
 
 
 def getAllMeetingMinutes(forceRefresh = False):
-    ### Returns a dict with data for all UTC meeting minutes in the supported range.
-    ### The dict structure is {mtg#: [year, qtr, doc #, title, page content]}.
-    ### Uses pickled data if present; if not, it will pickle the results.
-
-    pickle_file = Path(utcMinutesPages_pickleFile)
-    if pickle_file.is_file() and not forceRefresh:
-        with open(utcMinutesPages_pickleFile, 'rb') as file:
-            allMtgMinutes = pickle.load(file)
+    ### Returns a dict-like view of the data for all UTC meeting minutes in the
+    ### supported range, with structure {mtg#: [year, qtr, doc #, title, page content]}.
+    ### Uses stored data if present; if not, it will store the results.
+    ###
+    ### Minutes are retrieved by a resumable crawl (see crawlAllMeetingMinutes);
+    ### if an earlier crawl was interrupted, it's resumed. With forceRefresh,
+    ### a new crawl is started.
+
+    store = getStore()
+    if forceRefresh:
+        crawlAllMeetingMinutes(restart=True)
+    elif len(store.getMinutesMeetings()) == 0 or store.getMeta(_minutesCrawlStateKey) == "running":
+        with store.updating:
+            # another process may have crawled them meanwhile
+            if len(store.getMinutesMeetings()) == 0 or store.getMeta(_minutesCrawlStateKey) == "running":
+                crawlAllMeetingMinutes()
+    return StoredMinutes(store)
+
+
+
+#--------------------------------------------------------
+#  Resumable crawl of all meeting minutes
+#
+# Retrieving the minutes of every meeting means hundreds of page fetches.
+# Each page is stored as soon as it arrives, and its outcome ("done" or
+# "failed", with the error) recorded in the store, so if the crawl is
+# interrupted, the next run picks up where it stopped. A page that can't be
+# fetched or processed is recorded as failed and the crawl goes on; calling
+# crawlAllMeetingMinutes() again retries just the failed pages.
+#
+# Pages are keyed by URL. The crawl state ("running", "done" or "failed")
+# is kept in the store's meta table.
+
+minutesCrawl = "allMinutes"
+_minutesCrawlStateKey = f"crawl:{minutesCrawl}"
+
+# Seconds between progress reports while crawling
+crawlProgressInterval = 5.0
+
+
+@updatesStore
+def crawlAllMeetingMinutes(restart = False):
+    '''Retrieves and stores the minutes of all meetings in the meeting
+    catalog, resuming an earlier crawl unless restart is True: pages already
+    retrieved by it are skipped, and pages that failed are retried.
+
+    Progress and throughput are logged as the crawl goes. When every page
+    has been retrieved, minutes stored for meetings that the crawl didn't
+    find (e.g., migrated from the .pickle files) are removed, and the
+    indexes are updated.
+
+    Returns {url: error} for the pages that failed.
+    '''
+    store = getStore()
+    minutesDocs = getCatalogMinutesUrls()
+
+    if restart:
+        store.clearCrawl(minutesCrawl)
+    items = store.getCrawlItems(minutesCrawl)
+    doneUrls = {url for url, (state, attempts, error) in items.items() if state == "done" and url in minutesDocs}
+    toFetch = [url for url in minutesDocs if url not in doneUrls]
+    if len(doneUrls) > 0:
+        logger.info(f"resuming crawl of UTC meeting minutes: {len(doneUrls)} of {len(minutesDocs)} pages already retrieved")
+    store.setMeta(_minutesCrawlStateKey, "running")
+
+    validators = store.getAllPageValidators()
+    fetcher = getFetcher()
+    def fetch(url):
+        return fetchFullPage(fetcher, validators, url)
+
+    failures = {}
+    progress = CrawlProgress("UTC meeting minutes pages", len(minutesDocs), len(minutesDocs) - len(toFetch))
+    for url, result, error in fetcher.fetchAsCompleted(toFetch, fetch):
+        if error is None:
+            try:
+                storeMinutesPage(url, *result, minutesDocs, doneUrls)
+            except Exception as e:
+                error = e
+        if error is None:
+            store.putCrawlItem(minutesCrawl, url, "done")
+            doneUrls.add(url)
+        else:
+            failures[url] = f"{type(error).__name__}: {error}"
+            store.putCrawlItem(minutesCrawl, url, "failed", failures[url])
+            logger.warning(f"failed to retrieve {url}: {failures[url]}")
+        progress.update(error is None)
+    progress.finish()
+
+    if len(failures) > 0:
+        store.setMeta(_minutesCrawlStateKey, "failed")
+        logger.warning(f"{len(failures)} minutes pages failed; call crawlAllMeetingMinutes() to retry them")
     else:
-        allMtgMinutes = {}
-        tables = utcDocRegTables
-        for y, t in tables.items():
-            # looking at doc registry for one year (y)
-            year_reg_url = utcDocRegistry_urls[y]
-            base_url = year_reg_url[:year_reg_url.rindex("/") + 1]
-            # get the doc registry rows for UTC minutes -- minutes_rows is a list of lists
-            if (y in earlyMinutes.keys()):
-                minutes_rows = getMinutesRowsForEarlyYear(y)
-            else:
-                minutes_rows = findMinutesRowsInYearRows(y, t)
-            print(f"retrieving UTC meeting minutes docs for {y}")
-            for i in range(len(minutes_rows)):
-# The following lines are similar to lines in updateAllMeetingMinutesToLatest().
-# However, they can't be refactored into a shared function. In getAllMeetingMinutes,
-# we can fetch all minutes pages. But in updateAllMeetingMinutesToLatest() we don't
-# want to fetch pages that have previously been cached. In that case, we filter
-# minutes_rows checking the meeting number in the row title field. But in some early
-# doc registry pages, the title field for UTC meeting docs didn't always include
-# the meeting number, and the only way to get the meeting number is to fetch the
-# page.
-                url = base_url + minutes_rows[i][1]
-                page = requests.get(url).text
-                soup = BeautifulSoup(page, 'lxml')
-                title = soup.title.text
-                m = re.search('(UTC ?#?)([0-9]*)', title)
-                assert m is not None
-                mtg_num = int(m.group(2))
-                allMtgMinutes[mtg_num] = [y, i + 1, str(minutes_rows[i][0]), str(title), page]
-
-        with open(pickle_file, 'wb') as file:
-            pickle.dump(allMtgMinutes, file, protocol=pickle.HIGHEST_PROTOCOL)
-            pass
-    return allMtgMinutes
+        store.setMeta(_minutesCrawlStateKey, "done")
+        staleMeetings = [
+            mtg for mtg, (doc_num, url, date, pageHash) in store.getMinutesSources(store.getMinutesMeetings()).items()
+            if url not in doneUrls
+            ]
+        if len(staleMeetings) > 0:
+            store.deleteMinutes(staleMeetings)
+    compressMinutesIfNoDict()
+    store.pruneMinutesDocs()
+    updateMinutesIndexes()
+    return failures
+
+
+def getCatalogMinutesUrls():
+    '''Returns {url: (year, sequence in year, minutes row, position in
+    catalog)} for the minutes rows in the meeting catalog.
+
+    Minutes pages are retrieved by URL rather than by meeting number: in
+    some early doc registry pages, the title field for UTC meeting docs
+    didn't always include the meeting number, and the only way to get the
+    meeting number is to fetch the page.
+    '''
+    catalog = getMeetingCatalog()
+    minutesUrls = {}
+    for y in getUtcDocRegTables():
+        for (i, mtg_num, row, url) in catalog.getYearRows(y):
+            minutesUrls[url] = (y, i, row, len(minutesUrls))
+    return minutesUrls
+
+
+def storeMinutesPage(url, page, pageValidators, minutesUrls, currentUrls):
+    '''Stores a minutes page retrieved from url, a key of minutesUrls (see
+    getCatalogMinutesUrls()), with its validators.
+
+    If more than one row has minutes for the meeting, the last one in the
+    catalog is kept, whatever order the pages arrive in: the page isn't
+    stored if the meeting's stored minutes are from a URL in currentUrls
+    that's later in the catalog.
+    '''
+    store = getStore()
+    y, i, row, position = minutesUrls[url]
+    title, mtg_num = getTitleAndMeetingNumberFromMinutesPage(page)
+    storedUrl = store.getMinutesSources([mtg_num]).get(mtg_num, (None, None))[1]
+    if storedUrl in currentUrls and storedUrl in minutesUrls and minutesUrls[storedUrl][3] > position:
+        return
+    entry = [y, i, str(row[0]), str(title), page]
+    store.putMinutes({mtg_num: entry}, {mtg_num: (url, row[4])})
+    store.putPageValidators({url: pageValidators})
+    # the doc parsed for the title is stored too
+    buildMinutesDocs({mtg_num: entry}, workers=1)
+
+
+def compressMinutesIfNoDict():
+    # Pages stored one at a time before there was a compression dictionary
+    # are kept uncompressed (see utc_store.compressionDictMinSamples); once
+    # a batch of them is stored, they're compressed with a dictionary
+    # trained on them.
+    store = getStore()
+    if not store.hasCompressionDict():
+        store.compressStoredMinutes()
+
+
+def getMinutesCrawlFailures():
+    '''Returns {url: (attempts, error)} for minutes pages that failed in
+    the crawl of all meeting minutes and haven't been retrieved since.
+    '''
+    return {
+        url: (attempts, error)
+        for url, (state, attempts, error) in getStore().getCrawlItems(minutesCrawl).items()
+        if state == "failed"
+        }
+
+
+
+class CrawlProgress:
+    '''Counts the items processed by a crawl, and logs progress and
+    throughput at most every crawlProgressInterval seconds. total is the
+    number of items in the crawl, of which skipped were done by an earlier
+    run.
+    '''
+
+    def __init__(self, description, total, skipped = 0):
+        self.description = description
+        self.total = total
+        self.skipped = skipped
+        self.done = 0
+        self.failed = 0
+        self.start = time.perf_counter()
+        self.lastReport = self.start
+
+    def update(self, succeeded = True):
+        if succeeded:
+            self.done += 1
+            count("crawl.done")
+        else:
+            self.failed += 1
+            count("crawl.failed")
+        now = time.perf_counter()
+        if now - self.lastReport >= crawlProgressInterval:
+            self.lastReport = now
+            self.report()
+
+    def report(self):
+        processed = self.done + self.failed
+        seconds = time.perf_counter() - self.start
+        rate = processed / seconds if seconds > 0 else 0.0
+        complete = self.skipped + processed
+        percent = complete / self.total if self.total > 0 else 1.0
+        logger.info(f"{self.description}: {complete} of {self.total} ({percent:.0%}), {self.failed} failed, {rate:.1f}/s")
+
+    def finish(self):
+        if self.done + self.failed > 0:
+            self.report()
 
 
 def updatePickledMeetingMinutesForMeetingList(meetingList):
@@ -534,23 +1431,23 @@ def updatePickledMeetingMinutesForMeetingList(meetingList):
 def updatePickledMeetingMinutes(meetingNumber):
     updatePickledMeetingMinutesForMeetingRange(meetingNumber, meetingNumber)
 
+@updatesStore
 def updatePickledMeetingMinutesForMeetingRange(firstMeeting = 1, lastMeeting = 999):
-    ### Opens an existing utcMinutesPages_pickleFile, fetches the pages for
-    ### specified meetings and replaces the content for those meetings, then
-    ### saves the updated pickle file. Also updates utc_minutes.
+    ### Fetches the pages for specified meetings and replaces the stored
+    ### content for those meetings only. Also updates utc_minutes.
+    ###
+    ### Meetings whose minutes are already stored are only re-fetched if
+    ### they've changed (see updateMeetingMinutesIfChanged).
     ### 
-    ### If utcMinutesPages_pickleFile doesn't exist, calls getAllMeetingMinutes.
+    ### If no minutes have been stored, calls getAllMeetingMinutes.
     ###
     ### If not specified, firstMeeting will be the first meeting from the
     ### first supported year; and lastMeeting will be the last meeting with
     ### posted minutes in the last supported year.
 
-    pickle_file = Path(utcMinutesPages_pickleFile)
-    if pickle_file.is_file():
-        with open(utcMinutesPages_pickleFile, 'rb') as file:
-            allMtgMinutes = pickle.load(file)
-    else:
-        print("Pickle file for meeting minutes not found; fetching all meeting minutes...")
+    store = getStore()
+    if len(store.getMinutesMeetings()) == 0:
+        logger.info("Stored meeting minutes not found; fetching all meeting minutes...")
         getAllMeetingMinutes()
         return
     
@@ -561,84 +1458,333 @@ def updatePickledMeetingMinutesForMeetingRange(firstMeeting = 1, lastMeeting = 9
     if lastMeeting > lastKnown:
         lastMeeting = lastKnown
 
-    # Fetch the file and update data
-    for i in range(firstMeeting, lastMeeting + 1):
-        allMtgMinutes[i] = fetchMeetingMinutes(i)
-
-    with open(pickle_file, 'wb') as file:
-        print("Saving updated pickle file")
-        pickle.dump(allMtgMinutes, file, protocol=pickle.HIGHEST_PROTOCOL)
+    # Fetch the files that have changed and update data
+    updateMeetingMinutesIfChanged(range(firstMeeting, lastMeeting + 1))
+    updateMinutesIndexes()
 
     # Since this has been updated, update utc_minutes
-    global utc_minutes
-    utc_minutes = allMtgMinutes
+    global _utc_minutes
+    _utc_minutes = StoredMinutes(store)
 
 
 
-def fetchMeetingMinutes(meetingNumber):
-    ### Returns the doc content & details for minutes of a given UTC meeting.
-    ### If minutes are not found, returns None.
+def getDocRegistryBaseUrl(year):
+    # Doc registry links are relative to the folder of the registry page.
+    year_reg_url = utcDocRegistry_urls[year]
+    return year_reg_url[:year_reg_url.rindex("/") + 1]
 
-    if meetingNumber in earlyUtcMinutesRows.keys():
-        (year, sequenceInYear, minutesRow) = earlyUtcMinutesRows[meetingNumber]
-    else:
-        (year, sequenceInYear, minutesRow) = findMinutesRowForMeeting(meetingNumber)
-    if minutesRow is None: return
 
-    year_reg_url = utcDocRegistry_urls[year]
-    base_url = year_reg_url[:year_reg_url.rindex("/") + 1]
-    minutesURL = base_url + minutesRow[1]
-    print(f"retrieving UTC meeting {meetingNumber} minutes doc")
-    page = requests.get(minutesURL).text
-    soup = BeautifulSoup(page, 'lxml')
-    title = soup.title.text
+def getTitleAndMeetingNumberFromMinutesPage(page, checkMeetingNumber = True):
+    # Returns (title, meeting number) from a minutes page. Early doc
+    # registry rows don't reliably give the meeting number, so the
+    # page title is the authoritative source. The page is parsed once
+    # into a minutes doc, which is cached for later queries.
+    title = getMinutesDocForPage(page)["title"]
+    if not checkMeetingNumber:
+        return (title, None)
     m = re.search('(UTC ?#?)([0-9]*)', title)
     assert m is not None
-    mtg_num = int(m.group(2))
+    return (title, int(m.group(2)))
+
+
+def findMinutesUrlForMeeting(meetingNumber):
+    ### Returns (year, sequence in year, minutes row, url) for the minutes
+    ### of a given UTC meeting. If minutes are not found, returns None.
+
+    return getMeetingCatalog().meetings.get(meetingNumber)
+
+
+def makeMinutesEntry(year, sequenceInYear, minutesRow, page):
+    title, mtg_num = getTitleAndMeetingNumberFromMinutesPage(page)
     return [year, sequenceInYear, str(minutesRow[0]), str(title), page]
 
 
+def fetchMeetingMinutes(meetingNumber):
+    ### Returns the doc content & details for minutes of a given UTC meeting.
+    ### If minutes are not found, returns None.
+
+    found = findMinutesUrlForMeeting(meetingNumber)
+    if found is None: return
+    (year, sequenceInYear, minutesRow, minutesURL) = found
+    logger.info(f"retrieving UTC meeting {meetingNumber} minutes doc")
+    page = getFetcher().fetchPage(minutesURL)
+    return makeMinutesEntry(year, sequenceInYear, minutesRow, page)
+
+
+def fetchMeetingMinutesForList(meetingList):
+    ### Fetches the minutes for each meeting in meetingList concurrently.
+    ### Returns a dict {mtg#: [year, qtr, doc #, title, page content]}; the
+    ### value is None for meetings whose minutes are not found.
+
+    allMtgMinutes = {}
+    found = {}
+    for i in meetingList:
+        allMtgMinutes[i] = None
+        f = findMinutesUrlForMeeting(i)
+        if f is not None:
+            logger.info(f"retrieving UTC meeting {i} minutes doc")
+            found[i] = f
+
+    pages = getFetcher().fetchAll(f[3] for f in found.values())
+    for (i, (year, sequenceInYear, minutesRow, url)), page in zip(found.items(), pages):
+        allMtgMinutes[i] = makeMinutesEntry(year, sequenceInYear, minutesRow, page)
+    return allMtgMinutes
+
+
+@updatesStore
+def updateMeetingMinutesIfChanged(meetingList):
+    '''Updates the stored minutes for the given meetings, retrieving only
+    those that are new or may have changed.
+
+    For meetings whose minutes are stored and whose doc registry row (doc #,
+    URL and date) is unchanged, the page is revalidated with a conditional
+    request (see fetchDocRegPagesIfChanged()), and the stored minutes are
+    kept if the server reports the page is not modified or the content is
+    identical. Other meetings are fetched.
+
+    Returns a list of the meetings for which minutes were stored.
+    '''
+    store = getStore()
+    found = {}
+    for i in meetingList:
+        f = findMinutesUrlForMeeting(i)
+        if f is not None:
+            found[i] = f
+    storedSources = store.getMinutesSources(found)
+    validators = store.getAllPageValidators()
+
+    conditions = {} # url: validators for a conditional request, or None
+    for i, (year, sequenceInYear, minutesRow, url) in found.items():
+        stored = storedSources.get(i)
+        if stored is not None and stored[:3] == (str(minutesRow[0]), url, minutesRow[4]):
+            # minutes stored before validators were kept have just the hash
+            conditions[url] = validators.get(url, {"hash": stored[3]})
+        else:
+            conditions[url] = None
+        logger.info(f"retrieving UTC meeting {i} minutes doc")
+
+    fetcher = getFetcher()
+    def fetch(url):
+        if conditions[url] is None:
+            return fetchFullPage(fetcher, validators, url)
+        return fetcher.fetchPageIfChanged(url, conditions[url])
+
+    newMtgMinutes = {}
+    sources = {}
+    newValidators = {}
+    urls = [f[3] for f in found.values()]
+    for (i, (year, sequenceInYear, minutesRow, url)), (page, pageValidators) in zip(found.items(), fetcher.fetchAll(urls, fetch)):
+        newValidators[url] = pageValidators
+        if page is None:
+            logger.info(f"UTC meeting {i} minutes doc is unchanged")
+        else:
+            newMtgMinutes[i] = makeMinutesEntry(year, sequenceInYear, minutesRow, page)
+            sources[i] = (url, minutesRow[4])
+
+    store.putMinutes(newMtgMinutes, sources)
+    store.putPageValidators(newValidators)
+    buildMinutesDocs(newMtgMinutes, workers=1 if len(newMtgMinutes) < 8 else None)
+    store.pruneMinutesDocs()
+    return list(newMtgMinutes)
+
+
 def updateAllMeetingMinutesWithLatest():
-    pickle_file = Path(utcMinutesPages_pickleFile)
-    if not pickle_file.is_file():
-        allMtgMinutes = getAllMeetingMinutes()
+    ### Updates the stored minutes, and the action and text indexes, from
+    ### the latest doc registry: minutes are retrieved for meetings that are
+    ### new, or whose registry row has changed (see refreshStages()).
+    ### Returns the dict-like view of all minutes (see getAllMeetingMinutes).
+
+    refreshStages(["actionIndex", "textIndex"])
+    return getUtcMinutes()
+
+
+#--------------------------------------------------------
+#  Parsed minutes documents
+#
+# Searches and action extraction work from a "minutes doc" derived from a
+# single parse of a minutes page, rather than re-parsing the HTML each time.
+# A minutes doc is a dict:
+#   - title: the page title
+#   - paragraphs: normalized text (whitespace runs collapsed to a space) of
+#     elements containing text: the parent element of each text node, and
+#     the nearest block-level ancestor (see minutesBlockElements)
+#   - nodeTexts: text of each text node (excluding comments), in document order
+#   - nodeParents, nodeBlocks: for each text node, index in paragraphs of
+#     its parent element and block ancestor (None if there is no block)
+#   - anchors: for each "tagged" action anchor (see findTaggedActionsInMinutes),
+#     (anchor text, index in paragraphs of its block ancestor, start and end
+#     offsets of the anchor text in the page source; -1 if not located)
+#
+# Minutes docs are cached in the store keyed by the hash of the page content,
+# and so are only re-derived when a page changes. They're stored by the
+# functions that update the store (see buildMinutesDocs()); functions that
+# only read or fetch keep the docs they parse in memory.
+
+# Element types that have historically been used for a paragraph in minutes
+# pages. (Different minutes docs are structured differently; some, badly.)
+minutesBlockElements = ["blockquote", "dd", "div", "p", "ul"]
+
+# Bump when the structure of minutes docs changes, so cached docs are rebuilt.
+minutesDocVersion = 2
+
+_postAnchorPattern = re.compile("^[a-z]?\\s*]")
+
+# Recently-used minutes docs, by cache key. (Pipeline stages that use
+# minutes docs can run on concurrent threads; see refreshStages().)
+_minutesDocCache = {}
+_minutesDocCacheSize = 16
+_minutesDocCacheLock = threading.Lock()
+
+
+@timed("parse.minutes")
+def parseMinutesDoc(page):
+    '''Parses minutes page content (a str, FetchedPage or CompressedPage)
+    and returns a minutes doc (a dict; see above).
+    '''
+    (markup, encoding) = getPageMarkup(page)
+    soup = BeautifulSoup(markup, 'lxml', from_encoding=encoding)
+    source = None
+    paragraphs = []
+    paragraphIndex = {}
+
+    def getParagraph(element):
+        if element is None:
+            return None
+        i = paragraphIndex.get(id(element))
+        if i is None:
+            i = len(paragraphs)
+            paragraphs.append(re.sub('\\s+', ' ', element.text))
+            paragraphIndex[id(element)] = i
+        return i
+
+    nodeTexts = []
+    nodeParents = []
+    nodeBlocks = []
+    for s in soup.descendants:
+        if isinstance(s, NavigableString) and not isinstance(s, Comment):
+            nodeTexts.append(str(s))
+            nodeParents.append(getParagraph(s.parent))
+            nodeBlocks.append(getParagraph(s.find_parent(minutesBlockElements)))
+
+    anchors = []
+    sourcePos = 0
+    for a in soup.find_all("a"):
+        if (a.string is not None
+            and isinstance(a.next_sibling, NavigableString) and _postAnchorPattern.match(a.next_sibling) is not None
+            and isinstance(a.previous_sibling, NavigableString) and a.previous_sibling.strip() == '['): #some cases have whitespace
+            # locate the anchor text in the source; anchors are in document order
+            if source is None:
+                source = markup if encoding is None else markup.decode(encoding, "replace")
+            m = re.compile('<a\\b[^>]*>(?:\\s|<[^>]*>)*(' + re.escape(str(a.string)) + ')').search(source, sourcePos)
+            if m is None:
+                (start, end) = (-1, -1)
+            else:
+                (start, end) = m.span(1)
+                sourcePos = end
+            anchors.append((str(a.string), getParagraph(a.find_parent(minutesBlockElements)), start, end))
+
+    return {
+        "title": soup.title.text if soup.title is not None else None,
+        "paragraphs": paragraphs,
+        "nodeTexts": nodeTexts,
+        "nodeParents": nodeParents,
+        "nodeBlocks": nodeBlocks,
+        "anchors": anchors
+        }
+
+
+def getMinutesDocForPage(page):
+    '''Returns the minutes doc for minutes page content (a str, FetchedPage
+    or CompressedPage), from memory or the store if available; otherwise the
+    page is parsed and the result kept in memory (but not stored; see
+    buildMinutesDocs()).
+    '''
+    pageHash = getPageHash(page)
+    key = f"{minutesDocVersion}:{pageHash}"
+    minutesDoc = _minutesDocCache.get(key)
+    if minutesDoc is not None:
+        count("cache.minutesDoc.hit")
     else:
-        # get pickled minutes info
-        with open(utcMinutesPages_pickleFile, 'rb') as file:
-            allMtgMinutes = pickle.load(file)
-        # get details on last stored meeting
-        allStoredMeetings = list(allMtgMinutes)
-        lastStoredMeetingNumber = allStoredMeetings[-1]
-        lastStoredMeetingYear = allMtgMinutes[lastStoredMeetingNumber][0]
-        # compare to known
-        lastKnownYear = list(utcDocRegistry_urls)[-1]
-        yearsToCheck = list(range(lastStoredMeetingYear, lastKnownYear + 1))
-
-        docRegTables = utcDocRegTables
-        for y in yearsToCheck:
-            # looking at doc registry for one year (y)
-            year_reg_url = utcDocRegistry_urls[y]
-            base_url = year_reg_url[:year_reg_url.rindex("/") + 1]
-            # get the doc registry rows for UTC minutes
-            yearTable = docRegTables[y]
-            minutes_rows = findMinutesRowsInYearRows(y, yearTable)
+        store = getStore()
+        minutesDoc = store.getMinutesDoc(key)
+        if minutesDoc is not None:
+            count("cache.minutesDoc.storeHit")
+        else:
+            count("cache.minutesDoc.miss")
+            minutesDoc = parseMinutesDoc(page)
+        with _minutesDocCacheLock:
+            if len(_minutesDocCache) >= _minutesDocCacheSize:
+                del _minutesDocCache[next(iter(_minutesDocCache))]
+            _minutesDocCache[key] = minutesDoc
+    return minutesDoc
+
+
+def getMinutesDoc(doc:list):
+    '''Returns the minutes doc for a minutes entry
+    ([year, qtr, doc #, title, page content]).
+    '''
+    return getMinutesDocForPage(doc[-1])
+
+
+def _parseMinutesPage(page):
+    # For worker processes; page may be a CompressedPage, which is smaller
+    # to pass between processes.
+    return parseMinutesDoc(page)
+
+
+@timed("parse.minutesPages")
+def parseMinutesPages(pages, workers = None, chunksize = 4):
+    '''Parses minutes pages (str, FetchedPage or CompressedPage) into
+    minutes docs, using a pool of worker processes. Returns a list of
+    minutes docs in the same order as pages.
+
+    workers is the number of worker processes (default: the number of CPUs);
+    if 1, pages are parsed in this process. chunksize is the number of pages
+    sent to a worker at a time.
+
+    (On platforms that start worker processes by importing the main module,
+    such as Windows, calls from a script must be under an
+    "if __name__ == '__main__':" guard.)
+    '''
+    pages = list(pages)
+    if workers == 1 or len(pages) <= 1:
+        return [_parseMinutesPage(page) for page in pages]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(_parseMinutesPage, pages, chunksize=chunksize))
+
+
+def buildMinutesDocs(minutesData, workers = None, chunksize = 4):
+    '''Ensures minutes docs are stored for all entries in minutesData
+    ({mtg#: [year, qtr, doc #, title, page content]}). Docs already parsed
+    into memory are stored as they are; other pages are parsed in parallel
+    (see parseMinutesPages). Returns the number of pages parsed.
+
+    The store's update lock is held while the docs are stored.
+    '''
+    store = getStore()
+    toStore = {}
+    toParse = {}
+    for mtgNum, doc in minutesData.items():
+        pageHash = getPageHash(doc[-1])
+        key = f"{minutesDocVersion}:{pageHash}"
+        if key in toStore or key in toParse or store.getMinutesDoc(key) is not None:
+            continue
+        minutesDoc = _minutesDocCache.get(key)
+        if minutesDoc is not None:
+            toStore[key] = (pageHash, minutesDoc)
+        else:
+            toParse[key] = (pageHash, doc[-1])
+    if len(toParse) > 0:
+        logger.info(f"parsing {len(toParse)} minutes pages")
+        minutesDocs = parseMinutesPages((page for (pageHash, page) in toParse.values()), workers, chunksize)
+        for (key, (pageHash, page)), minutesDoc in zip(toParse.items(), minutesDocs):
+            toStore[key] = (pageHash, minutesDoc)
+    if len(toStore) > 0:
+        with store.updating:
+            for key, (pageHash, minutesDoc) in toStore.items():
+                store.putMinutesDoc(key, pageHash, minutesDoc)
+    return len(toParse)
 
-            for i in range(len(minutes_rows)):
-                mtg_num = getMeetingNumberFromMinutesRow(minutes_rows[i])
-                if mtg_num > lastStoredMeetingNumber:
-                    url = base_url + minutes_rows[i][1]
-                    print(f"retrieving UTC meeting {mtg_num} minutes doc")
-                    page = requests.get(url).text
-                    soup = BeautifulSoup(page, 'lxml')
-                    title = soup.title.text
-                    m = re.search('(UTC ?#?)([0-9]*)', title)
-                    assert m is not None
-                    mtg_num = int(m.group(2))
-                    allMtgMinutes[mtg_num] = [y, i + 1, str(minutes_rows[i][0]), str(title), page]
-
-        with open(pickle_file, 'wb') as file:
-            pickle.dump(allMtgMinutes, file, protocol=pickle.HIGHEST_PROTOCOL)
-    return allMtgMinutes
 
 
 def findActionsInMinutes(doc:list, actionType):
@@ -660,25 +1806,54 @@ def findActionsInMinutes(doc:list, actionType):
         The approach taken here is to search for strings ("Action Item", etc.)
         and then look for a parent element. The list of parent element types
         is determined by what has historically been used in minutes pages.
-    '''
-    pageContent = doc[-1]
-    soup = BeautifulSoup(pageContent, 'lxml')
 
-    # define the re patterns for the action types
-    patterns = {
-        "AI": "A(C|c)(T|t)(I|i)(O|o)(N|n) (I|i)(T|t)(E|e)(M|m)",
-        "consensus": "C(O|o)(N|n)(S|s)(E|e)(N|n)(S|s)(U|u)(S|s)",
-        "motion": "M(O|o)(T|t)(I|i)(O|o)(N|n)",
-        "note": "N(O|o)(T|t)(E|e):"
-        }
-    pattern = patterns[actionType]
-    actionStrings = soup.find_all(string = re.compile(pattern))
-    actions = [
-        # Different minutes docs are structured differently (and some, badly)
-        re.sub('\\s+', ' ', s.find_parent(["blockquote", "dd", "div", "p", "ul"]).text)
-        for s in actionStrings
-        if not isinstance(s, Comment)
-        ]
+        All action types are found together (see findAllActionsInMinutes());
+        to get several types, call that instead.
+    '''
+    return findAllActionsInMinutes(doc)[actionType]
+
+
+# One pattern for all the action types used by findActionsInMinutes (the
+# first letter is upper case, the rest either case). Each type starts with a
+# different letter, which identifies the type of a match.
+_untaggedActionPattern = re.compile(
+    "A(?:C|c)(?:T|t)(?:I|i)(?:O|o)(?:N|n) (?:I|i)(?:T|t)(?:E|e)(?:M|m)"
+    "|C(?:O|o)(?:N|n)(?:S|s)(?:E|e)(?:N|n)(?:S|s)(?:U|u)(?:S|s)"
+    "|M(?:O|o)(?:T|t)(?:I|i)(?:O|o)(?:N|n)"
+    "|N(?:O|o)(?:T|t)(?:E|e):"
+    )
+_untaggedActionTypesByLetter = {"A": "AI", "C": "consensus", "M": "motion", "N": "note"}
+untaggedActionTypes = list(_untaggedActionTypesByLetter.values())
+
+
+@timed("extract.actions")
+def findAllActionsInMinutes(doc:list):
+    '''Gets the actions of every type from a minutes doc in a single pass:
+    returns a dict {actionType: [actions]} with a list for each of
+    untaggedActionTypes (see findActionsInMinutes()).
+
+    Each text node is searched once with a combined pattern for all the
+    action types; only nodes that match are searched further, to find every
+    type they contain. A node's block is included under each of its types.
+    '''
+    minutesDoc = getMinutesDoc(doc)
+    paragraphs = minutesDoc["paragraphs"]
+    actions = {actionType: [] for actionType in untaggedActionTypes}
+    search = _untaggedActionPattern.search
+    for text, block in zip(minutesDoc["nodeTexts"], minutesDoc["nodeBlocks"]):
+        if block is None:
+            continue
+        m = search(text)
+        if m is None:
+            continue
+        # matches of different types can overlap, so search again from the
+        # next position rather than after the match
+        letters = set()
+        while m is not None:
+            letters.add(text[m.start()])
+            m = search(text, m.start() + 1)
+        for letter in letters:
+            actions[_untaggedActionTypesByLetter[letter]].append(paragraphs[block])
     return actions
 
 
@@ -686,7 +1861,7 @@ def getAnchorParentText(a):
     try:
         p = re.sub('\\s+',' ', a.find_parent(["blockquote", "dd", "div", "p", "ul"]).text)
     except:
-        print(f"exception: {a.text}")
+        logger.warning(f"exception: {a.text}")
         p = None
     return p
 
@@ -697,12 +1872,13 @@ def validateActionType(actionType, acceptNone = True):
     elif actionType is None:
         return False
     elif actionType not in ["ai", "consensus", "decision", "lballot", "motion", "note", "all"]:
-        print("The actionType parameter must be 'ai', 'consensus', 'decision', 'lballot', 'motion', or 'note'.")
+        logger.error("The actionType parameter must be 'ai', 'consensus', 'decision', 'lballot', 'motion', or 'note'.")
         return False
     else:
         return True
 
 
+@timed("extract.taggedActions")
 def findTaggedActionsInMinutes(doc:list, actionType = "all"):
     ''' Gets a list of actions (all types) from a minutes doc. This assumes a
         convention applied since UTC #90 that a "tagging" tool is run on the
@@ -712,39 +1888,27 @@ def findTaggedActionsInMinutes(doc:list, actionType = "all"):
         (More precisely, the anchor is applied to the string within square brackets.)
 
         Takes a row from a minutes entry and returns a list of action strings.
-    '''
-    patterns = {
-        "ai": '[0-9]{0,3}-AI?[0-9a-z]{1,4}',
-        "consensus": '[0-9]{0,3}-C[0-9a-z]{1,4}',
-        "decision": '[0-9]{0,3}-(C|L|M)[0-9a-z]{1,4}',
-        "motion": '[0-9]{0,3}-M[0-9a-z]{1,4}',
-        "note": '[0-9]{0,3}-N[0-9a-z]{1,4}',
-        "lballot": '[0-9]{0,3}-L[0-9a-z]{1,4}',
-        "all": '[0-9]{0,3}-(AI?|C|L|M|N)[0-9a-z]{1,4}'
-    }
-    postAnchorPattern = re.compile("^[a-z]?\\s*]")
 
+        Each anchor is classified by the action ID pattern for all types
+        (actionIdPattern); the types wanted are then picked out by their
+        type codes (actionTypeCodes).
+    '''
     if not validateActionType(actionType):
         return
 
-    pageContent = doc[-1]
-    soup = BeautifulSoup(pageContent, 'lxml')
-    # define the pattern for the action ID contained in the anchor element
-    pattern = patterns[actionType]
-    actionAnchorElements = soup.find_all("a", string=re.compile(pattern))
+    minutesDoc = getMinutesDoc(doc)
+    paragraphs = minutesDoc["paragraphs"]
+    typeCodes = actionTypeCodes[actionType]
     actions = [
-        # a.find_parent(["blockquote", "div", "p", "ul"]).text
-        # getAnchorParentText(a)
-        re.sub('\\s+',' ', a.find_parent(["blockquote", "dd", "div", "p", "ul"]).text).strip()
-        for a in actionAnchorElements
-        if isinstance(a.next_sibling, NavigableString) and postAnchorPattern.match(a.next_sibling) is not None
-            and isinstance(a.previous_sibling, NavigableString) and a.previous_sibling.strip() == '[' #some cases have whitespace
+        paragraphs[block].strip()
+        for anchorText, block, start, end in minutesDoc["anchors"]
+        if block is not None and any(m.group(2)[0] in typeCodes for m in actionIdPattern.finditer(anchorText))
         ]
     return actions
 
 
 
-def compileActionsFromAllMinutes(actionType):
+def compileActionsFromAllMinutes(actionType, workers = 1, chunksize = 4):
     ''' Compiles all actions of a given type from all UTC meetings.
 
         Takes an action type string: "AI", "consensus", "motion" or "note".
@@ -752,95 +1916,641 @@ def compileActionsFromAllMinutes(actionType):
         Returns a dictionary with entries of the form mtgNum: [actions list].
         For example compilesActionsFromAllMinutes("AI")[179] would return the
         list of all action items from meeting 179.
+
+        If workers is not 1, minutes pages that haven't yet been parsed are
+        parsed in parallel by a pool of that many processes (None for the
+        number of CPUs); see parseMinutesPages. The results are the same.
     '''
 
     if not validateActionType(actionType, acceptNone=False):
         return
 
-    allActions = {}
-    meetings = utc_minutes
+    return compileAllActionsFromAllMinutes(workers, chunksize)[actionType]
+
+
+def compileAllActionsFromAllMinutes(workers = 1, chunksize = 4):
+    '''Compiles the actions of every type from all UTC meetings, with one
+    pass over each meeting's minutes (see findAllActionsInMinutes()).
+
+    Returns a dict {actionType: {mtgNum: [actions list]}} with an entry for
+    each of untaggedActionTypes; meetings without actions of a type are
+    left out of its dict. workers and chunksize are as for
+    compileActionsFromAllMinutes().
+    '''
+    allActions = {actionType: {} for actionType in untaggedActionTypes}
+    meetings = getUtcMinutes()
+    if workers != 1:
+        buildMinutesDocs(meetings, workers, chunksize)
     for mtgNum, mtg in meetings.items():
-        print(f"getting actions for meeting {mtgNum}")
-        actions = findActionsInMinutes(mtg, actionType)
-        if len(actions) > 0:
-            allActions[mtgNum] = actions
+        logger.debug(f"getting actions for meeting {mtgNum}")
+        for actionType, actions in findAllActionsInMinutes(mtg).items():
+            if len(actions) > 0:
+                allActions[actionType][mtgNum] = actions
     return allActions
 
 
-def compileTaggedActionsFromAllMinutes(actionType = "all", minutesData = None):
+def compileTaggedActionsFromAllMinutes(actionType = "all", minutesData = None, workers = 1, chunksize = 4):
     ### Compiles all actions of all types from all UTC meetings for which
     ### the minutes have had the "tag" tool applied (started with UTC #90).
     ###
     ### The optional minutesData parameter can be used to pass in custom
     ### minutes data (e.g., for a limited range of meetings). Otherwise,
-    ### minutes for all supported meetings will be used, using pickled data
+    ### minutes for all supported meetings will be used, using stored data
     ### if present.
+    ###
+    ### If workers is not 1, minutes pages that haven't yet been parsed are
+    ### parsed in parallel by a pool of that many processes (None for the
+    ### number of CPUs); see parseMinutesPages. The results are the same.
 
 
     if not validateActionType(actionType):
         return
 
     if minutesData is None:
-        allMinutes = utc_minutes
+        allMinutes = getUtcMinutes()
     else:
         allMinutes = minutesData
 
+    if workers != 1:
+        buildMinutesDocs({m: doc for m, doc in allMinutes.items() if m >= 90}, workers, chunksize)
+
     allActions = {}
     for mtgNum, mtg in allMinutes.items():
         if mtgNum >= 90:
-            print(f"getting actions for meeting {mtgNum}")
+            logger.debug(f"getting actions for meeting {mtgNum}")
             actions = findTaggedActionsInMinutes(mtg, actionType)
             if len(actions) > 0 :
                 allActions[mtgNum] = actions
     return allActions
 
 
-def writeToFileTaggedActionsFromAllMinutes(filename: str, actionType = "all", minutesData = None):
+def writeToFileTaggedActionsFromAllMinutes(filename: str, actionType = "all", minutesData = None, workers = 1):
 
     if not validateActionType(actionType):
         return
 
-    allActions = compileTaggedActionsFromAllMinutes(actionType, minutesData)
+    if minutesData is None:
+        allMinutes = getUtcMinutes()
+    else:
+        allMinutes = minutesData
+    if workers != 1:
+        buildMinutesDocs({m: doc for m, doc in allMinutes.items() if m >= 90}, workers)
+
+    # written a meeting at a time
     f = open(filename, "w", encoding="utf-8")
-    for mtgNum, actions in allActions.items():
-        f.write(str(mtgNum) + "\n")
-        for a in actions:
-            f.write(a + "\n")
+    for mtgNum, mtg in allMinutes.items():
+        if mtgNum >= 90:
+            logger.debug(f"getting actions for meeting {mtgNum}")
+            actions = findTaggedActionsInMinutes(mtg, actionType)
+            if len(actions) > 0:
+                f.write(str(mtgNum) + "\n")
+                for a in actions:
+                    f.write(a + "\n")
     f.close()
 
 
+#--------------------------------------------------------
+#  Index of tagged actions by action ID
+#
+# The tagged actions from all stored minutes are indexed by action ID (e.g.,
+# "180-C12"), with the meeting number, action type code (A, C, L, M or N),
+# action text and position of the action among the tagged actions in the
+# minutes. The index is kept in the store and updated for meetings whose
+# minutes are new or have changed.
+
+actionIdPattern = re.compile('([0-9]{0,3})-(AI?|C|L|M|N)[0-9a-z]{1,4}')
+
+# Action type codes for the actionType values used by findTaggedActionsInMinutes
+actionTypeCodes = {
+    "ai": "A",
+    "consensus": "C",
+    "decision": "CLM",
+    "lballot": "L",
+    "motion": "M",
+    "note": "N",
+    "all": "ACLMN"
+}
+
+
+class UtcAction:
+    '''A tagged action from UTC minutes.
+
+      - meetingNumber: the UTC meeting number
+      - actionId: e.g. "180-C12"
+      - actionType: type code: "A" (action item), "C" (consensus), "L" (letter
+        ballot), "M" (motion) or "N" (note)
+      - text: the action text, with whitespace normalized
+      - position: position among the tagged actions in the minutes
+      - start, end: offsets of the action ID anchor text in the page source
+        (-1 if not located)
+    '''
+    __slots__ = ("meetingNumber", "actionId", "actionType", "text", "position", "start", "end")
+
+    def __init__(self, meetingNumber, actionId, actionType, text, position, start = -1, end = -1):
+        self.meetingNumber = meetingNumber
+        self.actionId = actionId
+        self.actionType = actionType
+        self.text = text
+        self.position = position
+        self.start = start
+        self.end = end
+
+    def __repr__(self):
+        return f"UtcAction({self.actionId!r}, {self.text[:40]!r})"
+
+    def __eq__(self, other):
+        return isinstance(other, UtcAction) and all(
+            getattr(self, a) == getattr(other, a) for a in UtcAction.__slots__
+            )
+
+
+@timed("extract.taggedActions")
+def findTaggedActionRecordsInMinutes(doc:list, meetingNumber, actionType = "all"):
+    '''Returns a list of UtcAction records for the tagged actions in a
+    minutes entry. (See findTaggedActionsInMinutes.)
+
+    The action ID is taken from the anchor and the bracketed text around it
+    (e.g., "[180-C12a]" gives "180-C12a"). If the anchor omits the meeting
+    number, meetingNumber is prefixed.
+    '''
+    if not validateActionType(actionType):
+        return
+
+    minutesDoc = getMinutesDoc(doc)
+    paragraphs = minutesDoc["paragraphs"]
+    typeCodes = actionTypeCodes[actionType]
+    actions = []
+    position = 0
+    for anchorText, block, start, end in minutesDoc["anchors"]:
+        m = actionIdPattern.search(anchorText)
+        if block is None or m is None:
+            continue
+        text = paragraphs[block].strip()
+        actionId = anchorText.strip()
+        idMatch = re.search('\\[\\s*' + re.escape(actionId) + '([a-z]?)\\s*\\]', text)
+        if idMatch is not None:
+            actionId += idMatch.group(1)
+        if m.group(1) == '':
+            actionId = str(meetingNumber) + actionId
+        typeCode = m.group(2)[0]
+        if typeCode in typeCodes:
+            actions.append(UtcAction(meetingNumber, actionId, typeCode, text, position, start, end))
+        position += 1
+    return actions
+
+
+def updateActionIndex():
+    '''Updates the action index for stored minutes that are new or have
+    changed since they were indexed. Returns the list of meetings indexed.
+    '''
+    return list(indexMeetingActions(getStore().getActionIndexStaleMeetings()))
+
+
+@timed("index.actions")
+def indexMeetingActions(meetingNumbers):
+    '''(Re)indexes the tagged actions in the stored minutes of the given
+    meetings. Returns {mtg#: hash of the minutes page indexed}.
+    '''
+    store = getStore()
+    pageHashes = {}
+    for mtgNum in meetingNumbers:
+        doc = store.getMinutes(mtgNum)
+        actions = findTaggedActionRecordsInMinutes(doc, mtgNum) if mtgNum >= 90 else []
+        pageHashes[mtgNum] = getPageHash(doc[-1])
+        store.putMeetingActions(mtgNum, pageHashes[mtgNum], actions)
+    return pageHashes
+
+
+def getUtcActionIndexEntries(actionIDs):
+    '''Looks up action IDs in the action index. Returns a dict
+    {action ID: UtcAction}; IDs that aren't found are omitted.
+
+    If an ID occurs more than once (in the same minutes, or reused in other
+    meetings' minutes), the first occurrence in the minutes of the meeting
+    the ID names is returned; if there's none there, the first in the latest
+    meeting's minutes.
+    '''
+    actionIDs = list(actionIDs)
+    store = getStore()
+    found = store.getActions(actionIDs)
+    if len(found) < len(actionIDs) and len(updateActionIndex()) > 0:
+        found.update(store.getActions([a for a in actionIDs if a not in found]))
+    entries = {}
+    for actionId, occurrences in found.items():
+        mtgNum, *details = _chooseActionOccurrence(actionId, occurrences)
+        entries[actionId] = UtcAction(mtgNum, actionId, *details)
+    return entries
+
+
+def _chooseActionOccurrence(actionId, occurrences):
+    # occurrences are (mtg#, ...) in meeting and position order; see
+    # getUtcActionIndexEntries()
+    m = re.match('[0-9]+', actionId)
+    namedMeeting = int(m.group(0)) if m is not None else None
+    for occurrence in occurrences:
+        if occurrence[0] == namedMeeting:
+            return occurrence
+    latestMeeting = occurrences[-1][0]
+    return next(o for o in occurrences if o[0] == latestMeeting)
+
+
+def findUtcActions(actionIDs):
+    '''Returns a dict {action ID: action text} for a batch of action IDs;
+    the value is None for IDs that aren't found.
+    '''
+    found = getUtcActionIndexEntries(actionIDs)
+    return {a: (found[a].text if a in found else None) for a in actionIDs}
+
+
+class UtcActionTable:
+    '''Columnar table of tagged actions, for filtering large numbers of
+    actions without creating an object per action.
+
+    Columns are parallel sequences indexed by row:
+      - meetingNumbers: array of meeting numbers
+      - actionIds: list of action IDs
+      - actionTypes: str of type codes, one character per row
+      - positions, starts, ends: arrays (see UtcAction)
+    The action texts are held in one str (texts), each followed by a newline;
+    textStarts has the offset of each row's text (plus a final end offset).
+
+    Filtering methods return arrays of row indices, which can be combined with
+    intersectRows() and turned into UtcAction records with getRecords().
+    '''
+
+    def __init__(self):
+        self.meetingNumbers = array('H')
+        self.actionIds = []
+        self.actionTypes = ''
+        self.positions = array('l')
+        self.starts = array('l')
+        self.ends = array('l')
+        self.texts = ''
+        self.textStarts = array('L', [0])
+
+    @classmethod
+    def fromRecords(cls, records):
+        '''Builds a table from an iterable of UtcAction records.'''
+        table = cls()
+        types = []
+        texts = []
+        for r in records:
+            table.meetingNumbers.append(r.meetingNumber)
+            table.actionIds.append(r.actionId)
+            types.append(r.actionType)
+            table.positions.append(r.position)
+            table.starts.append(r.start)
+            table.ends.append(r.end)
+            # texts are normalized, so have no newlines
+            texts.append(r.text + "\n")
+            table.textStarts.append(table.textStarts[-1] + len(texts[-1]))
+        table.actionTypes = ''.join(types)
+        table.texts = ''.join(texts)
+        return table
+
+    def __len__(self):
+        return len(self.actionIds)
+
+    def getText(self, row):
+        return self.texts[self.textStarts[row]:self.textStarts[row + 1] - 1]
+
+    def getRecords(self, rows = None):
+        '''Yields UtcAction records for the given rows (default all).'''
+        if rows is None:
+            rows = range(len(self))
+        for i in rows:
+            yield UtcAction(
+                self.meetingNumbers[i], self.actionIds[i], self.actionTypes[i], self.getText(i),
+                self.positions[i], self.starts[i], self.ends[i]
+                )
+
+    def filterMeetings(self, firstMeeting = 0, lastMeeting = 999):
+        return array('L', (i for i, m in enumerate(self.meetingNumbers) if firstMeeting <= m <= lastMeeting))
+
+    def filterTypes(self, actionType = "all"):
+        '''Rows with the given action type ("ai", "consensus", "decision",
+        "lballot", "motion", "note" or "all").
+        '''
+        typeCodes = actionTypeCodes[actionType]
+        rows = array('L')
+        for code in typeCodes:
+            rows.extend(m.start() for m in re.finditer(code, self.actionTypes))
+        return array('L', sorted(rows))
+
+    def filterText(self, pattern, ignoreCase = True):
+        '''Rows with text matching a regex pattern. The pattern is searched
+        for in the combined text of all rows, so it should not match across
+        newlines.
+        '''
+        pattern = re.compile(pattern, re.IGNORECASE if ignoreCase else 0)
+        rows = array('L')
+        for m in pattern.finditer(self.texts):
+            row = bisect.bisect_right(self.textStarts, m.start()) - 1
+            if row >= len(self):
+                # a zero-width match at the end of the text
+                break
+            if len(rows) == 0 or rows[-1] != row:
+                rows.append(row)
+        return rows
+
+
+def intersectRows(*rowArrays):
+    # Rows present in all of the given row index arrays, in order.
+    common = set(rowArrays[0]).intersection(*rowArrays[1:])
+    return array('L', sorted(common))
+
+
+def compileTaggedActionRecordsFromAllMinutes(actionType = "all", minutesData = None):
+    '''Compiles the tagged actions from all UTC meetings (see
+    compileTaggedActionsFromAllMinutes) as a list of UtcAction records.
+    '''
+    if not validateActionType(actionType):
+        return
+
+    return list(iterTaggedActionRecords(actionType, minutesData))
+
+
+def iterTaggedActionRecords(actionType = "all", minutesData = None):
+    '''Yields UtcAction records for the tagged actions from all UTC meetings
+    (see compileTaggedActionsFromAllMinutes), one meeting at a time.
+    '''
+    if minutesData is None:
+        allMinutes = getUtcMinutes()
+    else:
+        allMinutes = minutesData
+    for mtgNum, mtg in allMinutes.items():
+        if mtgNum >= 90:
+            yield from findTaggedActionRecordsInMinutes(mtg, mtgNum, actionType)
+
+
+@timed("index.actionTable")
+def getUtcActionTable(actionType = "all"):
+    '''Returns a UtcActionTable with the tagged actions from all stored
+    minutes, built from the action index.
+    '''
+    if not validateActionType(actionType):
+        return
+    updateActionIndex()
+    typeCodes = actionTypeCodes[actionType]
+    return UtcActionTable.fromRecords(
+        UtcAction(mtgNum, actionId, actionTypeCode, text, position, start, end)
+        for (actionId, mtgNum, actionTypeCode, text, position, start, end) in getStore().getAllActions()
+        if actionTypeCode in typeCodes
+        )
+
+
 def findUtcAction(actionID):
-    pattern = re.compile('([0-9]{1,3})-((?i:AI?|C|M|M|N))[0-9]{1,3}[a-z]?')
+    pattern = re.compile('([0-9]{1,3})-((?i:AI?|C|L|M|N))[0-9]{1,3}[a-z]?')
     m = re.match(pattern, actionID)
     if m is None:
-        print(f'{actionID} is not a valid action ID')
+        logger.warning(f'{actionID} is not a valid action ID')
     else:
         mtgNum = int(m.group(1))
-        actionType = m.group(2).upper()
-        actionTypeKeys = {"A": "ai", "C": "consensus", "L": "lballot", "M": "motion", "N": "note"}
-        actionTypeKey = actionTypeKeys[actionType]
-        actions = findTaggedActionsInMinutes(utc_minutes[mtgNum], actionTypeKey)
-        for a in actions:
-            if a[0:len(actionID)+2] == "[" + actionID + "]":
-                return a
-        print(f'Action {actionID} not found in UTC #{mtgNum} minutes')
+        found = getUtcActionIndexEntries([actionID])
+        if actionID in found:
+            return found[actionID].text
+        logger.warning(f'Action {actionID} not found in UTC #{mtgNum} minutes')
+
+
+#--------------------------------------------------------
+#  Text search in minutes
+#
+# The text of all stored minutes has an inverted index, kept in the store:
+# for each (lowercased) word token, the text nodes of each meeting's minutes
+# doc that contain it, with the token's position within the node. Searches
+# for plain text (no regex syntax) use the index to find candidate nodes,
+# including for multi-word phrases, then confirm each with the search
+# pattern; other patterns are matched against every text node.
+
+_tokenPattern = re.compile('\\w+')
+_regexSyntaxPattern = re.compile('[.^$*+?{}\\[\\]\\\\|()]')
+
+# If a partial word in a search matches more indexed tokens than this, the
+# search falls back to scanning.
+maxTextIndexTermExpansion = 5000
+
+# Tokens in the text index; loaded on first use.
+_textIndexTokens = None
+
+
+def getNodeTokenPostings(nodeTexts):
+    '''Returns a dict {token: array of (node index, position) pairs} for
+    the given text nodes.
+    '''
+    postings = {}
+    for nodeIndex, nodeText in enumerate(nodeTexts):
+        for position, m in enumerate(_tokenPattern.finditer(nodeText.lower())):
+            p = postings.get(m.group())
+            if p is None:
+                p = postings[m.group()] = array('L')
+            p.append(nodeIndex)
+            p.append(position)
+    return postings
+
+
+def getPlainTextQueryTokens(text):
+    '''Returns a list of (lowercased token, start, end) for the word tokens
+    in a search text, or None if the text has regex syntax or no word
+    characters (and so can't be searched using a token index).
+    '''
+    if _regexSyntaxPattern.search(text) is not None:
+        return None
+    queryTokens = [(m.group().lower(), m.start(), m.end()) for m in _tokenPattern.finditer(text)]
+    if len(queryTokens) == 0:
+        return None
+    return queryTokens
+
+
+def getIndexTermsForQuery(queryTokens, textLength, indexTokens):
+    '''For each query token (see getPlainTextQueryTokens), returns the list
+    of indexed tokens it can match, or None if that is too many.
+
+    Tokens at the ends of the search text may be partial words: e.g.,
+    "nicode con" matches "Unicode consortium".
+    '''
+    termsForQueryTokens = []
+    for (token, start, end) in queryTokens:
+        startsWord = start > 0
+        endsWord = end < textLength
+        if startsWord and endsWord:
+            terms = [token]
+        elif startsWord:
+            terms = [t for t in indexTokens if t.startswith(token)]
+        elif endsWord:
+            terms = [t for t in indexTokens if t.endswith(token)]
+        else:
+            terms = [t for t in indexTokens if token in t]
+        if len(terms) > maxTextIndexTermExpansion:
+            return None
+        termsForQueryTokens.append(terms)
+    return termsForQueryTokens
+
+
+def findPhraseCandidates(termsForQueryTokens, getPostings):
+    '''Finds the text units that have the query tokens in consecutive
+    positions.
+
+    getPostings(terms) yields (group, postings) for the given index terms,
+    postings being an array of (unit index, position) pairs (as from
+    getNodeTokenPostings()). Returns a dict {(group, unit index): set of
+    positions at which the phrase could start}.
+    '''
+    candidates = None
+    for i, terms in enumerate(termsForQueryTokens):
+        positions = {}
+        for group, postings in getPostings(terms):
+            for unitIndex, position in zip(postings[0::2], postings[1::2]):
+                positions.setdefault((group, unitIndex), set()).add(position - i)
+        if candidates is None:
+            candidates = positions
+        else:
+            candidates = {
+                unit: starts & positions[unit]
+                for unit, starts in candidates.items()
+                if unit in positions and not starts.isdisjoint(positions[unit])
+                }
+        if len(candidates) == 0:
+            break
+    return candidates
+
+
+def updateTextIndex():
+    '''Updates the text index for stored minutes that are new or have
+    changed since they were indexed. Returns the list of meetings indexed.
+    '''
+    return list(indexMeetingText(getStore().getTextIndexStaleMeetings()))
+
+
+@timed("index.text")
+def indexMeetingText(meetingNumbers):
+    '''(Re)indexes the text of the stored minutes of the given meetings.
+    Returns {mtg#: hash of the minutes page indexed}.
+    '''
+    global _textIndexTokens
+    store = getStore()
+    pageHashes = {}
+    for mtgNum in meetingNumbers:
+        doc = store.getMinutes(mtgNum)
+        postings = getNodeTokenPostings(getMinutesDoc(doc)["nodeTexts"])
+        pageHashes[mtgNum] = getPageHash(doc[-1])
+        store.putMeetingTextPostings(mtgNum, pageHashes[mtgNum], {t: p.tobytes() for t, p in postings.items()})
+    if len(pageHashes) > 0:
+        _textIndexTokens = None
+    return pageHashes
+
+
+def updateMinutesIndexes():
+    # Updates the action and text indexes after minutes are stored.
+    updateActionIndex()
+    updateTextIndex()
+
+
+def _getTextIndexTokens():
+    global _textIndexTokens
+    _checkStoreDataVersion()
+    if _textIndexTokens is None:
+        _textIndexTokens = getStore().getTextIndexTokens()
+    return _textIndexTokens
+
+
+def findTextInMinutesIndex(text, ignoreCase = True, meetings = None):
+    '''Searches for plain text in stored minutes using the text index.
+
+    Returns a dict {mtg#: [text node indices]} for text nodes in the minutes
+    docs that contain text (the same nodes that a regex search of every text
+    node would find). If text has regex syntax, or has no word characters,
+    returns None, and a scan is needed.
+
+    meetings optionally limits the search to a set of meeting numbers.
+    '''
+    queryTokens = getPlainTextQueryTokens(text)
+    if queryTokens is None:
+        return None
+
+    updateTextIndex()
+    store = getStore()
+    termsForQueryTokens = getIndexTermsForQuery(queryTokens, len(text), _getTextIndexTokens())
+    if termsForQueryTokens is None:
+        return None
+
+    def getPostings(terms):
+        for (term, mtgNum, blob) in store.getTextPostings(terms):
+            if meetings is None or mtgNum in meetings:
+                postings = array('L')
+                postings.frombytes(blob)
+                yield mtgNum, postings
+
+    candidates = findPhraseCandidates(termsForQueryTokens, getPostings)
+    if len(candidates) == 0:
+        return {}
+
+    # Confirm the candidate nodes with the search pattern.
+    candidateNodes = {}
+    for (mtgNum, nodeIndex) in sorted(candidates):
+        candidateNodes.setdefault(mtgNum, []).append(nodeIndex)
+    pattern = re.compile(text, re.IGNORECASE) if ignoreCase else re.compile(text)
+    allMinutes = getUtcMinutes()
+    matches = {}
+    for mtgNum, nodes in candidateNodes.items():
+        nodeTexts = getMinutesDoc(allMinutes[mtgNum])["nodeTexts"]
+        nodes = [i for i in nodes if pattern.search(nodeTexts[i]) is not None]
+        if len(nodes) > 0:
+            matches[mtgNum] = nodes
+    return matches
+
+
+@timed("search.minutes")
+def findTextInMinutesNodes(text, ignoreCase = True, meetings = None):
+    '''Returns a dict {mtg#: [text node indices]} for text nodes in stored
+    minutes matching the regex pattern text; uses the text index for plain
+    text, and otherwise scans the minutes docs of the given meetings (default
+    all).
+    '''
+    matches = findTextInMinutesIndex(text, ignoreCase, meetings)
+    if matches is not None:
+        return matches
+
+    allMinutes = getUtcMinutes()
+    if meetings is None:
+        meetings = list(allMinutes)
+    pattern = re.compile(text, re.IGNORECASE) if ignoreCase else re.compile(text)
+    matches = {}
+    for mtgNum in meetings:
+        nodeTexts = getMinutesDoc(allMinutes[mtgNum])["nodeTexts"]
+        nodes = [i for i, nodeText in enumerate(nodeTexts) if pattern.search(nodeText) is not None]
+        if len(nodes) > 0:
+            matches[mtgNum] = nodes
+    return matches
+
+
+def getMinutesSearchResults(meetingNumber, nodes, reportMatch = True):
+    # The search results for matching text nodes in a meeting's minutes:
+    # the normalized text of each node's parent element.
+    if reportMatch:
+        if len(nodes) == 1:
+            logger.info(f'1 match found in UTC #"{meetingNumber}')
+        else:
+            logger.info(f'{len(nodes)} matches found in UTC #{meetingNumber}')
+    minutesDoc = getMinutesDoc(getUtcMinutes()[meetingNumber])
+    paragraphs = minutesDoc["paragraphs"]
+    nodeParents = minutesDoc["nodeParents"]
+    return [paragraphs[nodeParents[i]] for i in nodes]
 
 
 def searchForTextInAllMinutes(text, ignoreCase = True):
     # return a dict {mtgNum: [results]}
     results = {}
-    count = 0
-    for mtgNum in list(utc_minutes):
-        result = searchForTextInMinutes(text, mtgNum, ignoreCase, True, False)
-        if result is not None:
-            count += len(result)
-            results[mtgNum] = result
-    if count == 0:
-        print("No matches found")
-    elif count == 1:
-        print("1 match found")
+    matchCount = 0
+    for mtgNum, nodes in findTextInMinutesNodes(text, ignoreCase).items():
+        result = getMinutesSearchResults(mtgNum, nodes)
+        matchCount += len(result)
+        results[mtgNum] = result
+    if matchCount == 0:
+        logger.info("No matches found")
+    elif matchCount == 1:
+        logger.info("1 match found")
     else:
-        print(f'{count} matches found')
+        logger.info(f'{matchCount} matches found')
     return results
 
 def searchForTextInMinutes(text, meetingNumber, ignoreCase = True, reportMatch = True, reportNoMatch = True):
@@ -853,31 +2563,16 @@ def searchForTextInMinutes(text, meetingNumber, ignoreCase = True, reportMatch =
     # check that meetingNumber is in range of known meetings
     firstKnown, lastKnown = getFirstAndLastKnownUtcMeetings()
     if meetingNumber not in range(firstKnown, lastKnown + 1):
-        print("Meeting number ", meetingNumber, " is not a known UTC meeting.")
+        logger.warning(f"Meeting number {meetingNumber} is not a known UTC meeting.")
         return
     
-    minutes = utc_minutes[meetingNumber]
-    soup = BeautifulSoup(minutes[-1],'lxml')
-    if ignoreCase:
-        matches = soup.find_all(string=re.compile(text, re.IGNORECASE))
-    else:
-        matches = soup.find_all(string=re.compile(text))
-    if len(matches) == 0:
+    matches = findTextInMinutesNodes(text, ignoreCase, [meetingNumber])
+    if meetingNumber not in matches:
         if reportNoMatch:
-            print("No matches found")
+            logger.info("No matches found")
         return
     else:
-        if reportMatch:
-            if len(matches) == 1:
-                print(f'1 match found in UTC #"{meetingNumber}')
-            else:
-                print(f'{len(matches)} matches found in UTC #{meetingNumber}')
-        results = [
-            re.sub('\\s+', ' ', s.parent.text)
-            for s in matches
-            if not isinstance(s, Comment)
-        ]
-        return results
+        return getMinutesSearchResults(meetingNumber, matches[meetingNumber], reportMatch)
 
 
 def writeToFileSearchForTextInMinutesResults(filename: str, text: str, meetingNumber = None, ignoreCase = True):
@@ -888,7 +2583,7 @@ def writeToFileSearchForTextInMinutesResults(filename: str, text: str, meetingNu
     else:
         results = searchForTextInMinutes(text, meetingNumber, ignoreCase, reportMatch=False, reportNoMatch=False)
     if len(results) == 0:
-        print("No results found")
+        logger.info("No results found")
     else:
         f = open(filename, "w", encoding="utf-8")
         for mtgNum, mtgResults in results.items():
@@ -898,15 +2593,397 @@ def writeToFileSearchForTextInMinutesResults(filename: str, text: str, meetingNu
         f.close()
 
 
+#--------------------------------------------------------
+#  Refreshing derived data: the stage graph
+#
+# Everything in the local cache is derived, directly or not, from pages on
+# the Unicode site. The derivations form a graph of stages (see
+# utc_pipeline.py), each keeping a record of what its artifacts were built
+# from, so a refresh only retrieves or re-derives what's stale:
+#
+#   docRegPages     registry page per year (by URL; the current year's page
+#                   is always revalidated)
+#   docRegTables    table per year, from the year's page
+#   meetingCatalog  the minutes rows of all tables
+#   minutesPages    minutes page per minutes URL in the catalog, from its
+#                   registry row (doc #, URL, date)
+#   minutesDocs     parsed minutes doc per stored meeting, from its page
+#   actionIndex     action index entries per meeting, from its page
+#   textIndex       text index entries per meeting, from its page
+#
+# actionIndex and textIndex are independent, so they're refreshed
+# concurrently.
+#
+# Data stored when it's loaded on first use (getAllDocRegistryPages(),
+# getAllDocRegistryTables()) or crawled (crawlAllMeetingMinutes()) isn't
+# derived through the graph; each stage's findStored() recognizes it from
+# the stored page hashes, so the next refresh records it instead of
+# retrieving and deriving it all again.
+
+_stageGraph = None
+
+
+class DocRegPagesStage(Stage):
+    name = "docRegPages"
+
+    def getInputHashes(self, inputs):
+        return {year: getHash(url) for year, url in utcDocRegistry_urls.items()}
+
+    def getVolatileKeys(self, years):
+        # the current-year registry is a live page
+        return [max(years)] if len(years) > 0 else []
+
+    def findStored(self, inputHashes):
+        # stored pages retrieved from the year's URL, per its validators; a
+        # page stored without validators is taken to be from the year's URL
+        store = getStore()
+        validators = store.getAllPageValidators()
+        storedYears = set(store.getDocRegPageYears())
+        found = {}
+        for year in inputHashes:
+            if year in storedYears:
+                pageHash = getPageHash(store.getDocRegPage(year))
+                if validators.get(utcDocRegistry_urls[year], {}).get("hash") in (None, pageHash):
+                    found[year] = pageHash
+        return found
+
+    def build(self, inputHashes):
+        years = list(inputHashes)
+        for year in years:
+            logger.info(f"retrieving doc registry page for {year}")
+        fetchDocRegPagesIfChanged(years)
+        store = getStore()
+        return {year: getPageHash(store.getDocRegPage(year)) for year in years}
+
+
+class DocRegTablesStage(Stage):
+    name = "docRegTables"
+    inputs = ("docRegPages",)
+
+    def getInputHashes(self, inputs):
+        return dict(inputs["docRegPages"])
+
+    def findStored(self, inputHashes):
+        # stored tables, if the year's stored page is the input (they're
+        # stored together)
+        store = getStore()
+        storedYears = set(store.getDocRegTableYears())
+        return {
+            year: getHash(store.getDocRegTable(year))
+            for year, pageHash in inputHashes.items()
+            if year in storedYears and getPageHash(store.getDocRegPage(year)) == pageHash
+            }
+
+    def build(self, inputHashes):
+        # Tables that are already stored are updated row by row (see
+        # applyDocRegTableChanges()).
+        global _utcDocRegTables, _lastDocRegChanges
+        store = getStore()
+        storedYears = store.getDocRegTableYears()
+        tables = dict(_utcDocRegTables if _utcDocRegTables is not None else store.getAllDocRegTables())
+        newTables = {}
+        changes = []
+        for year in inputHashes:
+            logger.info(f"getting doc registry table for {year}")
+            newTable = getDocRegTableFromPage(store.getDocRegPage(year))
+            if year in storedYears:
+                tables[year], yearChanges = applyDocRegTableChanges(year, tables[year], newTable)
+                changes.extend(yearChanges)
+            else:
+                newTables[year] = tables[year] = newTable
+        if len(newTables) > 0:
+            store.putDocRegTables(newTables)
+        _utcDocRegTables = dict(sorted(tables.items()))
+        _lastDocRegChanges = changes
+        # (a table from a snapshot is hashed as the list of its rows)
+        return {year: getHash(list(tables[year])) for year in inputHashes}
+
+
+class MeetingCatalogStage(Stage):
+    name = "meetingCatalog"
+    inputs = ("docRegTables",)
+
+    def getInputHashes(self, inputs):
+        return {"all": getHash(inputs["docRegTables"])}
+
+    def findStored(self, inputHashes):
+        if getStore().getMeetingCatalog() is None:
+            return {}
+        return self.build(inputHashes)
+
+    def build(self, inputHashes):
+        catalog = getMeetingCatalog()
+        return {"all": getHash([catalog.rows, catalog.knownRange])}
+
+
+class MinutesPagesStage(Stage):
+    name = "minutesPages"
+    inputs = ("meetingCatalog",)
+
+    def getInputHashes(self, inputs):
+        return {
+            url: getHash([str(row[0]), url, row[4]])
+            for url, (year, sequenceInYear, row, position) in getCatalogMinutesUrls().items()
+            }
+
+    def findStored(self, inputHashes):
+        # Pages stored for the same registry row (e.g., by
+        # crawlAllMeetingMinutes()). Pages stored without their URL and
+        # date (e.g., migrated ones that weren't matched to a row) are
+        # matched by doc number.
+        store = getStore()
+        minutesUrls = getCatalogMinutesUrls()
+        storedSources = {}
+        unsourced = {}
+        for source in store.getMinutesSources(store.getMinutesMeetings()).values():
+            if source[1] is not None:
+                storedSources[source[1]] = source
+            elif source[2] is None:
+                unsourced[source[0]] = source
+        pageHashes = {}
+        for url in inputHashes:
+            row = minutesUrls[url][2]
+            stored = storedSources.get(url)
+            if stored is not None:
+                matches = stored[:3] == (str(row[0]), url, row[4])
+            else:
+                stored = unsourced.get(str(row[0]))
+                matches = stored is not None
+            if matches and stored[3] is not None:
+                pageHashes[url] = stored[3]
+        return pageHashes
+
+    def build(self, inputHashes):
+        # Pages already stored for the same registry row aren't retrieved
+        # again.
+        store = getStore()
+        minutesUrls = getCatalogMinutesUrls()
+        pageHashes = self.findStored(inputHashes)
+        toFetch = [url for url in inputHashes if url not in pageHashes]
+
+        validators = store.getAllPageValidators()
+        fetcher = getFetcher()
+        def fetch(url):
+            return fetchFullPage(fetcher, validators, url)
+
+        progress = CrawlProgress("UTC meeting minutes pages", len(toFetch))
+        for url, result, error in fetcher.fetchAsCompleted(toFetch, fetch):
+            if error is None:
+                try:
+                    storeMinutesPage(url, *result, minutesUrls, minutesUrls)
+                    pageHashes[url] = getPageHash(result[0])
+                except Exception as e:
+                    error = e
+            if error is not None:
+                logger.warning(f"failed to retrieve {url}: {type(error).__name__}: {error}")
+            progress.update(error is None)
+        progress.finish()
+        if len(toFetch) > 0:
+            compressMinutesIfNoDict()
+        return pageHashes
+
+    def remove(self, urls):
+        # minutes from URLs that are no longer in the catalog
+        store = getStore()
+        urls = set(urls)
+        store.deleteMinutes([
+            mtg for mtg, (docNum, url, date, pageHash) in store.getMinutesSources(store.getMinutesMeetings()).items()
+            if url in urls
+            ])
+
+
+class MinutesDocsStage(Stage):
+    name = "minutesDocs"
+    inputs = ("minutesPages",)
+
+    def getInputHashes(self, inputs):
+        # the minutes stored by minutesPages (and any stored otherwise), by
+        # meeting; the content hash of a minutes doc is its page's hash
+        store = getStore()
+        return {
+            mtg: getHash([minutesDocVersion, pageHash])
+            for mtg, (docNum, url, date, pageHash) in store.getMinutesSources(store.getMinutesMeetings()).items()
+            if pageHash is not None
+            }
+
+    def findStored(self, inputHashes):
+        store = getStore()
+        pageHashes = {
+            mtg: pageHash
+            for mtg, (docNum, url, date, pageHash) in store.getMinutesSources(list(inputHashes)).items()
+            if pageHash is not None
+            }
+        storedKeys = store.getStoredMinutesDocKeys(f"{minutesDocVersion}:{pageHash}" for pageHash in pageHashes.values())
+        return {mtg: pageHash for mtg, pageHash in pageHashes.items() if f"{minutesDocVersion}:{pageHash}" in storedKeys}
+
+    def build(self, inputHashes):
+        store = getStore()
+        minutesData = {mtg: store.getMinutes(mtg) for mtg in inputHashes}
+        # a pool of worker processes only pays off for more than a few pages
+        buildMinutesDocs(minutesData, workers=1 if len(minutesData) < 8 else None)
+        return {mtg: getPageHash(doc[-1]) for mtg, doc in minutesData.items()}
+
+
+class ActionIndexStage(Stage):
+    name = "actionIndex"
+    inputs = ("minutesDocs",)
+
+    def getInputHashes(self, inputs):
+        return dict(inputs["minutesDocs"])
+
+    def getRecorded(self):
+        # the index records the page each meeting was indexed from
+        return {mtg: (pageHash, pageHash) for mtg, pageHash in getStore().getActionIndexMeetings().items()}
+
+    def build(self, inputHashes):
+        return indexMeetingActions(list(inputHashes))
+
+
+class TextIndexStage(Stage):
+    name = "textIndex"
+    inputs = ("minutesDocs",)
+
+    def getInputHashes(self, inputs):
+        return dict(inputs["minutesDocs"])
+
+    def getRecorded(self):
+        return {mtg: (pageHash, pageHash) for mtg, pageHash in getStore().getTextIndexMeetings().items()}
+
+    def build(self, inputHashes):
+        return indexMeetingText(list(inputHashes))
+
+
+def getStageGraph():
+    '''Returns the StageGraph of the derived data in the local cache.'''
+    global _stageGraph
+    if _stageGraph is None:
+        _stageGraph = StageGraph([
+            DocRegPagesStage(),
+            DocRegTablesStage(),
+            MeetingCatalogStage(),
+            MinutesPagesStage(),
+            MinutesDocsStage(),
+            ActionIndexStage(),
+            TextIndexStage()
+            ], getStore())
+    return _stageGraph
+
+
+@updatesStore
+def refreshStages(targets = None):
+    '''Brings the given stages of the derived data (default: all; see
+    getStageGraph()), and the stages they depend on, up to date, retrieving
+    and re-deriving only what's stale. Updates the loaded module data.
+
+    If another process sharing the cache is updating it, this waits for it
+    to finish, and then only does what's still stale.
+
+    Returns {stage name: [keys of the artifacts that were rebuilt]}.
+    '''
+    global _lastDocRegChanges, _utc_minutes
+    _checkStoreDataVersion()
+    _lastDocRegChanges = []
+    rebuilt = getStageGraph().refresh(targets, lock=getStore().updating)
+    # docs of minutes pages that have been replaced or removed
+    getStore().pruneMinutesDocs()
+    if len(rebuilt.get("minutesPages", [])) > 0:
+        _utc_minutes = StoredMinutes(getStore())
+    return rebuilt
+
+
+
+#--------------------------------------------------------
+#  Export to JSONL, CSV or Parquet
+#
+# Actions and search results can be exported as records with a fixed schema
+# (see utc_export.py), for loading into other tools. The records are
+# produced and written a meeting (or registry year) at a time, so the whole
+# result set is never held in memory. The format is given by the filename
+# extension (.jsonl, .csv or .parquet) unless format is specified; Parquet
+# requires pyarrow.
+
+def iterMinutesSearchResults(text, meetingNumber = None, ignoreCase = True):
+    '''Yields (mtg#, [results]) for each meeting with matches for text in
+    its minutes (see searchForTextInMinutes), or just for meetingNumber.
+    '''
+    meetings = None if meetingNumber is None else [meetingNumber]
+    for mtgNum, nodes in findTextInMinutesNodes(text, ignoreCase, meetings).items():
+        yield mtgNum, getMinutesSearchResults(mtgNum, nodes, reportMatch = False)
+
+
+def iterDocRegSearchResults(text, year = None, ignoreCase = True):
+    '''Yields (year, [rows]) for each registry year with matches for text in
+    the subject field (see searchForTextInDocRegTable), or just for year.
+    '''
+    index = getDocRegIndex()
+    rows = index.filterSubject(text, ignoreCase)
+    if year is not None:
+        rows = intersectRows(rows, index.filterYears(year, year))
+    yield from index.iterTableRows(rows)
+
+
+def exportTaggedActions(filename: str, actionType = "all", minutesData = None, format = None):
+    '''Exports the tagged actions from all UTC meetings (see
+    compileTaggedActionsFromAllMinutes), with fields meeting, actionId,
+    actionType (A, C, L, M or N), text, position, sourceStart and sourceEnd
+    (see UtcAction). Returns the number of actions exported.
+    '''
+    if not validateActionType(actionType):
+        return
+    records = (
+        {
+            "meeting": a.meetingNumber, "actionId": a.actionId, "actionType": a.actionType, "text": a.text,
+            "position": a.position, "sourceStart": a.start, "sourceEnd": a.end
+        }
+        for a in iterTaggedActionRecords(actionType, minutesData)
+        )
+    return exportRecords(filename, records, actionFields, format)
+
+
+def exportMinutesSearchResults(filename: str, text: str, meetingNumber = None, ignoreCase = True, format = None):
+    '''Exports the results of searching for text in the minutes of all
+    meetings (or just meetingNumber), with fields meeting, match (1, 2, ...
+    within the meeting) and text. Returns the number of matches exported.
+    '''
+    records = (
+        {"meeting": mtgNum, "match": i + 1, "text": result}
+        for mtgNum, results in iterMinutesSearchResults(text, meetingNumber, ignoreCase)
+        for i, result in enumerate(results)
+        )
+    return exportRecords(filename, records, minutesSearchFields, format)
+
+
+def exportDocRegistrySearchResults(filename: str, text: str, year = None, ignoreCase = True, format = None):
+    '''Exports the results of searching for text in the subject field of
+    the doc registry for all years (or just year), with fields year, match
+    (1, 2, ... within the year), docNum, url, subject (with whitespace
+    normalized), source and date. Returns the number of matches exported.
+    '''
+    records = (
+        {
+            "year": y, "match": i + 1, "docNum": row[0], "url": row[1],
+            "subject": re.sub('\\s+', ' ', row[2]), "source": row[3], "date": row[4]
+        }
+        for y, rows in iterDocRegSearchResults(text, year, ignoreCase)
+        for i, row in enumerate(rows)
+        )
+    return exportRecords(filename, records, docRegSearchFields, format)
+
+
 
 # utcDocRegPages = getAllDocRegistryPages()
 # utcDocRegPages = updateDocRegPagesToLatest()
 
-utcDocRegTables = updateDocRegTablesWithLatest()
-utc_minutes = updateAllMeetingMinutesWithLatest() #{mtg#: [year, qtr, doc #, title, page content]}
+# utcDocRegTables and utc_minutes aren't loaded at import time; they're
+# loaded on first access (see getUtcDocRegTables() and getUtcMinutes()). To
+# retrieve the latest data from the Unicode site, call refreshUtcData():
+# refreshUtcData()
 
 # write out text file with all "tagged" actions from all UTC minutes
 # writeToFileTaggedActionsFromAllMinutes("UTC-actions.txt")
 
 # write out text file with "tagged" decisions (motion, letter ballot, consensus) from all UTC minutes
-# writeToFileTaggedActionsFromAllMinutes("UTC-decisions.txt", "decision")
\ No newline at end of file
+# writeToFileTaggedActionsFromAllMinutes("UTC-decisions.txt", "decision")
+
+# export all "tagged" actions from all UTC minutes as records for analysis (.jsonl, .csv or .parquet)
+# exportTaggedActions("UTC-actions.jsonl")
@@ -0,0 +1,154 @@
+import csv
+import json
+from pathlib import Path
+
+
+#--------------------------------------------------------
+#  Export of records to JSONL, CSV or Parquet files
+#
+# Records are dicts with a fixed set of fields (a schema), written to the
+# file as they're produced, so exporting a large number of records doesn't
+# need them all in memory. The schemas for the exports from utc_actions are
+# defined here; each is a list of (field name, type), type being "int" or
+# "str". Fields are written in schema order, and a missing field is written
+# as null (JSONL, Parquet) or an empty string (CSV).
+#
+# Parquet export requires the pyarrow package, which is optional; it's only
+# imported when a Parquet file is written.
+
+actionFields = [
+    ("meeting", "int"),
+    ("actionId", "str"),
+    ("actionType", "str"),
+    ("text", "str"),
+    ("position", "int"),
+    ("sourceStart", "int"),
+    ("sourceEnd", "int")
+    ]
+
+minutesSearchFields = [
+    ("meeting", "int"),
+    ("match", "int"),
+    ("text", "str")
+    ]
+
+docRegSearchFields = [
+    ("year", "int"),
+    ("match", "int"),
+    ("docNum", "str"),
+    ("url", "str"),
+    ("subject", "str"),
+    ("source", "str"),
+    ("date", "str")
+    ]
+
+exportFormats = ("jsonl", "csv", "parquet")
+
+# Number of records in each Parquet row group; also the number of records
+# held in memory while writing Parquet.
+parquetRowGroupSize = 10000
+
+
+
+class JsonlRecordWriter:
+    '''Writes records as JSON objects, one per line.'''
+
+    def __init__(self, filename, fields):
+        self.fieldNames = [name for name, _ in fields]
+        self.file = open(filename, "w", encoding="utf-8", newline="\n")
+
+    def write(self, record: dict):
+        self.file.write(json.dumps({name: record.get(name) for name in self.fieldNames}, ensure_ascii=False))
+        self.file.write("\n")
+
+    def close(self):
+        self.file.close()
+
+
+
+class CsvRecordWriter:
+    '''Writes records as CSV rows, after a heading row of field names.'''
+
+    def __init__(self, filename, fields):
+        self.fieldNames = [name for name, _ in fields]
+        self.file = open(filename, "w", encoding="utf-8", newline="")
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(self.fieldNames)
+
+    def write(self, record: dict):
+        self.writer.writerow([record.get(name) for name in self.fieldNames])
+
+    def close(self):
+        self.file.close()
+
+
+
+class ParquetRecordWriter:
+    '''Writes records to a Parquet file, a row group at a time. Requires
+    pyarrow.
+    '''
+
+    def __init__(self, filename, fields, rowGroupSize = None):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise ImportError("Parquet export requires the pyarrow package (python -m pip install pyarrow)")
+        self._pa = pyarrow
+        types = {"int": pyarrow.int64(), "str": pyarrow.string()}
+        self.fieldNames = [name for name, _ in fields]
+        self.schema = pyarrow.schema([(name, types[fieldType]) for name, fieldType in fields])
+        self.rowGroupSize = parquetRowGroupSize if rowGroupSize is None else rowGroupSize
+        self.writer = pyarrow.parquet.ParquetWriter(str(filename), self.schema)
+        self.columns = [[] for _ in self.fieldNames]
+
+    def write(self, record: dict):
+        for name, column in zip(self.fieldNames, self.columns):
+            column.append(record.get(name))
+        if len(self.columns[0]) >= self.rowGroupSize:
+            self._flush()
+
+    def _flush(self):
+        if len(self.columns[0]) > 0:
+            self.writer.write_table(self._pa.Table.from_pydict(dict(zip(self.fieldNames, self.columns)), schema=self.schema))
+            self.columns = [[] for _ in self.fieldNames]
+
+    def close(self):
+        self._flush()
+        self.writer.close()
+
+
+
+_recordWriters = {
+    "jsonl": JsonlRecordWriter,
+    "csv": CsvRecordWriter,
+    "parquet": ParquetRecordWriter
+    }
+
+
+def getExportFormat(filename, format = None):
+    '''Returns the export format: format if given, else from the filename
+    extension (.jsonl, .csv or .parquet). Raises ValueError if it's not
+    one of exportFormats.
+    '''
+    if format is None:
+        format = Path(filename).suffix.lstrip(".").lower()
+    if format not in exportFormats:
+        raise ValueError(f"unsupported export format {format!r}; expected one of {', '.join(exportFormats)}")
+    return format
+
+
+def exportRecords(filename, records, fields, format = None):
+    '''Writes records (an iterable of dicts) to a file in the given format
+    (see getExportFormat()), with the given fields. Records are written as
+    they're produced. Returns the number of records written.
+    '''
+    writer = _recordWriters[getExportFormat(filename, format)](filename, fields)
+    count = 0
+    try:
+        for record in records:
+            writer.write(record)
+            count += 1
+    finally:
+        writer.close()
+    return count
@@ -0,0 +1,530 @@
+import requests
+from requests.adapters import BaseAdapter, HTTPAdapter
+from requests.compat import chardet
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+from urllib3.util.retry import Retry
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from http.client import responses as httpReasons
+from pathlib import Path
+from urllib.parse import urlsplit
+import codecs
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import zipfile
+
+from utc_instrument import span, count
+
+
+#--------------------------------------------------------
+#  Fetch layer for pages from the Unicode site
+#
+# All page retrievals go through a Fetcher, which holds a pooled
+# requests.Session (so connections are reused) and fetches batches of URLs
+# on a bounded thread pool. Requests to the same host are limited in number
+# and spaced out so as not to hammer the server; transient failures are
+# retried with backoff.
+#
+# The transport is pluggable: a Fetcher can be given a requests transport
+# adapter to use instead of the network, and can record the responses it
+# gets to a cassette (a local archive of responses) or replay them from one,
+# so that runs can be repeated offline and give the same results.
+#
+# Pages are kept as the raw bytes of the response, with their encoding (see
+# getPageEncoding()), and parsed from the bytes; they're only decoded when
+# text is needed. requests' response.text guesses the encoding of a page
+# without a declared charset by statistical detection over the whole body,
+# which is slow on large pages; here, the encoding is taken from the
+# Content-Type header or the page's <meta> declaration, and is only detected
+# the first time a page without either is retrieved. It's saved with the
+# page's validators, so later retrievals of the page reuse it.
+
+
+class FetchedPage:
+    '''The raw content (bytes) of a retrieved page, and its encoding; call
+    text() to get the decoded content.
+    '''
+    __slots__ = ("content", "encoding")
+
+    def __init__(self, content: bytes, encoding: str):
+        self.content = content
+        self.encoding = encoding
+
+    def text(self):
+        return self.content.decode(self.encoding, "replace")
+
+    def __len__(self):
+        return len(self.content)
+
+    def __repr__(self):
+        return f"<FetchedPage {len(self.content)} bytes, {self.encoding}>"
+
+
+class Fetcher:
+    '''Fetches pages over a shared, pooled HTTP session.
+
+    maxWorkers is the number of pages fetched concurrently by fetchAll().
+    maxPerHost limits the number of requests in flight to any one host, and
+    minHostInterval is the minimum time (in seconds) between starting
+    successive requests to the same host.
+
+    Connection errors and 429/5xx responses are retried up to retries times,
+    with exponential backoff (backoffFactor). timeout applies to each request.
+
+    transport is a requests transport adapter to use for all requests instead
+    of the default (network) adapter. retries and backoffFactor only apply to
+    the default adapter: a given transport is used as is, so it must do its
+    own retries if they're wanted (e.g., an HTTPAdapter with max_retries).
+    Alternatively, with a cassette, the fetcher records the responses from
+    the network into the cassette (cassetteMode "record"), or replays them
+    from it without using the network ("replay"); see Cassette.
+    '''
+
+    def __init__(self, maxWorkers = 8, maxPerHost = 4, minHostInterval = 0.0,
+                 retries = 3, backoffFactor = 0.5, timeout = 60,
+                 transport = None, cassette = None, cassetteMode = "replay"):
+        self.maxWorkers = maxWorkers
+        self.maxPerHost = maxPerHost
+        self.minHostInterval = minHostInterval
+        self.timeout = timeout
+
+        retry = Retry(
+            total=retries,
+            backoff_factor=backoffFactor,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=("GET", "HEAD")
+            )
+        if transport is not None:
+            # used as is; retries aren't added to it
+            adapter = transport
+        else:
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max(maxWorkers, maxPerHost), max_retries=retry)
+        if cassette is not None:
+            if cassetteMode == "record":
+                adapter = RecordingAdapter(cassette, adapter)
+            elif cassetteMode == "replay":
+                adapter = ReplayAdapter(cassette)
+            else:
+                raise ValueError(f"cassetteMode must be 'record' or 'replay', not {cassetteMode!r}")
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self._hostSlots = {}
+        self._hostSlotsLock = threading.Lock()
+
+
+    def _getHostSlot(self, url):
+        host = urlsplit(url).netloc
+        with self._hostSlotsLock:
+            slot = self._hostSlots.get(host)
+            if slot is None:
+                slot = _HostSlot(self.maxPerHost)
+                self._hostSlots[host] = slot
+        return slot
+
+
+    def get(self, url, headers = None):
+        '''Issues a GET request for url, observing the per-host limits, and
+        returns the requests.Response.
+
+        Raises requests.HTTPError if the final response is an error.
+        '''
+        slot = self._getHostSlot(url)
+        with span("fetch", url=url) as fetchSpan:
+            with slot.semaphore:
+                slot.waitTurn(self.minHostInterval)
+                response = self.session.get(url, headers=headers, timeout=self.timeout)
+            fetchSpan.set(status=response.status_code, bytes=len(response.content))
+        response.raise_for_status()
+        return response
+
+
+    def fetchPage(self, url, encoding = None):
+        '''Returns the page at url as a FetchedPage. encoding is the
+        encoding found for the page when it was last retrieved, if known;
+        it's used if the page doesn't declare one (see getPageEncoding()).
+        '''
+        response = self.get(url)
+        return FetchedPage(response.content, getPageEncoding(response, encoding))
+
+
+    def fetchText(self, url):
+        '''Returns the text content of the page at url.'''
+        return self.fetchPage(url).text()
+
+
+    def fetchPageIfChanged(self, url, validators = None):
+        '''Conditionally fetches the page at url.
+
+        validators is a dict as returned by a previous call (or None), with
+        the ETag and Last-Modified values sent by the server, a hash of the
+        page content and the page's encoding; these are used to make a
+        conditional request.
+
+        Returns (page, validators); page is a FetchedPage, or None if the
+        server reports the page is not modified or if the content hash is
+        unchanged.
+        '''
+        headers = {}
+        if validators is not None:
+            if validators.get("etag"):
+                headers["If-None-Match"] = validators["etag"]
+            if validators.get("lastModified"):
+                headers["If-Modified-Since"] = validators["lastModified"]
+        response = self.get(url, headers=headers)
+        if response.status_code == 304:
+            count("fetch.notModified")
+            return (None, validators)
+
+        page = FetchedPage(response.content, getPageEncoding(response, (validators or {}).get("encoding")))
+        newValidators = {
+            "etag": response.headers.get("ETag"),
+            "lastModified": response.headers.get("Last-Modified"),
+            "hash": getContentHash(page.content),
+            "encoding": page.encoding
+            }
+        if validators is not None and validators.get("hash") == newValidators["hash"]:
+            count("fetch.unchanged")
+            return (None, newValidators)
+        return (page, newValidators)
+
+
+    def fetchAll(self, urls, fetch = None):
+        '''Fetches all of the given URLs concurrently.
+
+        Returns a list of results in the same order as urls. By default each
+        result is the page, as a FetchedPage; a different per-URL function
+        (taking the url) can be passed as fetch.
+
+        If a fetch fails, fetches that haven't started are cancelled, and
+        the exception is raised after the in-flight fetches are finished.
+        '''
+        if fetch is None:
+            fetch = self.fetchPage
+        urls = list(urls)
+        if len(urls) <= 1:
+            return [fetch(url) for url in urls]
+        pool = ThreadPoolExecutor(max_workers=min(self.maxWorkers, len(urls)))
+        try:
+            futures = [pool.submit(fetch, url) for url in urls]
+            for future in as_completed(futures):
+                # raises the first failure
+                future.result()
+            return [future.result() for future in futures]
+        finally:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+
+    def fetchAsCompleted(self, urls, fetch = None):
+        '''Fetches the given URLs concurrently, yielding (url, result, error)
+        for each as soon as it completes. result is the FetchedPage (or the
+        result of fetch(url), as for fetchAll()); if the fetch failed, result
+        is None and error is the exception, otherwise error is None.
+
+        If the caller stops iterating, fetches that haven't started are
+        cancelled.
+        '''
+        if fetch is None:
+            fetch = self.fetchPage
+        urls = list(urls)
+        if len(urls) == 0:
+            return
+        pool = ThreadPoolExecutor(max_workers=min(self.maxWorkers, len(urls)))
+        try:
+            futures = {pool.submit(fetch, url): url for url in urls}
+            for future in as_completed(futures):
+                # drop the reference, so results don't accumulate
+                url = futures.pop(future)
+                error = future.exception()
+                yield (url, None if error is not None else future.result(), error)
+        finally:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+
+    def close(self):
+        self.session.close()
+
+
+
+class _HostSlot:
+    # Per-host politeness state: a semaphore bounding requests in flight,
+    # and the start time of the last request.
+
+    def __init__(self, maxPerHost):
+        self.semaphore = threading.BoundedSemaphore(maxPerHost)
+        self.lock = threading.Lock()
+        self.lastStart = 0.0
+
+    def waitTurn(self, minInterval):
+        # The start time is reserved under the lock, and the wait is done
+        # after releasing it, so other threads can reserve the next turns.
+        if minInterval <= 0:
+            return
+        with self.lock:
+            now = time.monotonic()
+            start = max(now, self.lastStart + minInterval)
+            self.lastStart = start
+        if start > now:
+            time.sleep(start - now)
+
+
+
+#--------------------------------------------------------
+#  Recorded responses
+
+class Cassette:
+    '''An archive of HTTP responses, keyed by method and URL, saved as a zip
+    file (an index.json, and the body of each response).
+
+    Only the latest full response for each URL is kept: 304 (not modified)
+    responses aren't recorded. When replaying, a conditional request whose
+    If-None-Match or If-Modified-Since matches the recorded ETag or
+    Last-Modified gets a 304 response, so revalidation works as it does
+    against the server.
+
+    Recorded responses are kept in memory until save() is called. Bodies of
+    responses loaded from the file are read from it as they're needed.
+    '''
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._entries = {}
+        self._lock = threading.Lock()
+        if self.path.is_file():
+            with zipfile.ZipFile(self.path) as archive:
+                for entry in json.loads(archive.read("index.json")):
+                    self._entries[(entry["method"], entry["url"])] = [entry["status"], entry["headers"], entry["body"]]
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, url):
+        return ("GET", url) in self._entries
+
+    def _readBody(self, entry):
+        # Called with _lock held; loads the body of an entry if needed.
+        if isinstance(entry[2], str):
+            with zipfile.ZipFile(self.path) as archive:
+                entry[2] = archive.read(entry[2])
+        return entry[2]
+
+    def get(self, method, url):
+        '''Returns (status, headers, body) for the recorded response, or
+        None. body is bytes.
+        '''
+        with self._lock:
+            entry = self._entries.get((method, url))
+            if entry is None:
+                return None
+            return (entry[0], dict(entry[1]), self._readBody(entry))
+
+    def record(self, method, url, status, headers, body):
+        '''Records a response. headers is a dict; body is bytes (the
+        decoded content, so any Content-Encoding header is dropped).
+        '''
+        if status == 304:
+            return
+        headers = {
+            name: value for name, value in headers.items()
+            if name.lower() not in ("content-encoding", "transfer-encoding", "content-length")
+            }
+        with self._lock:
+            self._entries[(method, url)] = [status, headers, body]
+
+    def save(self):
+        '''Writes the cassette to its file, replacing it.'''
+        with self._lock:
+            index = []
+            # a temporary file per process, so processes saving the same
+            # cassette don't write over each other's
+            tempPath = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+            with zipfile.ZipFile(tempPath, "w", zipfile.ZIP_DEFLATED) as archive:
+                for i, ((method, url), entry) in enumerate(self._entries.items()):
+                    bodyName = f"bodies/{i}"
+                    archive.writestr(bodyName, self._readBody(entry))
+                    index.append({"method": method, "url": url, "status": entry[0], "headers": entry[1], "body": bodyName})
+                archive.writestr("index.json", json.dumps(index, indent=1))
+            os.replace(tempPath, self.path)
+            # bodies are read from the new file from now on
+            for entry, item in zip(self._entries.values(), index):
+                entry[2] = item["body"]
+
+
+
+class RecordingAdapter(BaseAdapter):
+    '''Transport adapter that sends requests through another adapter and
+    records the responses in a Cassette.
+    '''
+
+    def __init__(self, cassette: Cassette, adapter: BaseAdapter = None):
+        super().__init__()
+        self.cassette = cassette
+        self.adapter = HTTPAdapter() if adapter is None else adapter
+
+    def send(self, request, **kwargs):
+        response = self.adapter.send(request, **kwargs)
+        self.cassette.record(request.method, request.url, response.status_code, dict(response.headers), response.content)
+        return response
+
+    def close(self):
+        self.adapter.close()
+
+
+
+class ReplayAdapter(BaseAdapter):
+    '''Transport adapter that answers requests from a Cassette, without
+    using the network. A request for a URL that isn't in the cassette
+    raises requests.ConnectionError.
+    '''
+
+    def __init__(self, cassette: Cassette):
+        super().__init__()
+        self.cassette = cassette
+
+    def send(self, request, **kwargs):
+        recorded = self.cassette.get(request.method, request.url)
+        if recorded is None:
+            raise requests.ConnectionError(f"no recorded response for {request.method} {request.url}", request=request)
+        status, headers, body = recorded
+        if status == 200 and _isNotModified(request.headers, headers):
+            status, body = 304, b""
+        headers["Content-Length"] = str(len(body))
+
+        response = requests.Response()
+        response.status_code = status
+        response.reason = httpReasons.get(status, "")
+        response.headers = CaseInsensitiveDict(headers)
+        response.encoding = get_encoding_from_headers(response.headers)
+        response.url = request.url
+        response.request = request
+        response.connection = self
+        response._content = body
+        return response
+
+    def close(self):
+        pass
+
+
+def _isNotModified(requestHeaders, responseHeaders):
+    # Whether a conditional request's validators match a recorded response.
+    responseHeaders = CaseInsensitiveDict(responseHeaders)
+    etag = requestHeaders.get("If-None-Match")
+    if etag is not None:
+        return etag == responseHeaders.get("ETag")
+    lastModified = requestHeaders.get("If-Modified-Since")
+    return lastModified is not None and lastModified == responseHeaders.get("Last-Modified")
+
+
+
+def getContentHash(content):
+    # content is bytes, or str (hashed as UTF-8)
+    if isinstance(content, str):
+        content = content.encode("utf-8")
+    return hashlib.sha256(content).hexdigest()
+
+
+
+#--------------------------------------------------------
+#  Page encodings
+
+_charsetParamPattern = re.compile(r'charset\s*=\s*["\']?\s*([-\w.:]+)', re.IGNORECASE)
+
+# a <meta charset=...> or <meta http-equiv=... content="...; charset=...">
+# declaration
+_metaCharsetPattern = re.compile(rb'<meta\s[^>]*?charset\s*=\s*["\']?\s*([-\w.:]+)', re.IGNORECASE)
+
+# how far into a page to look for a <meta> declaration, as in the HTML
+# standard's prescan
+_metaCharsetPrescanBytes = 1024
+
+_boms = (
+    (codecs.BOM_UTF8, "utf-8"),
+    (codecs.BOM_UTF16_LE, "utf-16"),
+    (codecs.BOM_UTF16_BE, "utf-16")
+    )
+
+
+def _getCodecName(name):
+    # the canonical Python codec name, or None if it isn't one
+    try:
+        return codecs.lookup(name).name
+    except LookupError:
+        return None
+
+
+def getDeclaredEncoding(headers, content: bytes):
+    '''Returns the encoding declared for a page: a charset in the
+    Content-Type header, a byte order mark, or a <meta> declaration near the
+    start of the page, in that order. Returns None if there's none (or it
+    isn't a known encoding).
+    '''
+    m = _charsetParamPattern.search(headers.get("Content-Type", ""))
+    if m is not None:
+        encoding = _getCodecName(m.group(1))
+        if encoding is not None:
+            return encoding
+    for bom, encoding in _boms:
+        if content.startswith(bom):
+            return encoding
+    m = _metaCharsetPattern.search(content, 0, _metaCharsetPrescanBytes)
+    if m is not None:
+        return _getCodecName(m.group(1).decode("ascii"))
+    return None
+
+
+def detectEncoding(content: bytes):
+    '''Guesses the encoding of a page with no declared encoding. Content
+    that is valid UTF-8 is taken to be UTF-8; otherwise, the encoding is
+    detected statistically, as requests does (which is slow on large pages).
+    '''
+    with span("fetch.detectEncoding", bytes=len(content)):
+        count("fetch.encodingDetected")
+        try:
+            content.decode("utf-8")
+            return "utf-8"
+        except UnicodeDecodeError:
+            pass
+        encoding = chardet.detect(content)["encoding"]
+        return (encoding and _getCodecName(encoding)) or "utf-8"
+
+
+def getPageEncoding(response, knownEncoding = None):
+    '''Returns the encoding of a response's content: the declared encoding
+    (see getDeclaredEncoding()) if any, else knownEncoding (the encoding
+    found when the page was last retrieved), else a detected encoding.
+    '''
+    encoding = getDeclaredEncoding(response.headers, response.content)
+    if encoding is None:
+        encoding = knownEncoding or detectEncoding(response.content)
+    return encoding
+
+
+
+_defaultFetcher = None
+
+
+def getFetcher():
+    '''Returns the Fetcher used by utc_actions, creating one with default
+    settings on first use.
+    '''
+    global _defaultFetcher
+    if _defaultFetcher is None:
+        _defaultFetcher = Fetcher()
+    return _defaultFetcher
+
+
+def setFetcher(fetcher: Fetcher):
+    '''Replaces the Fetcher used by utc_actions; e.g., to change the
+    concurrency limits:
+
+        setFetcher(Fetcher(maxWorkers=4, minHostInterval=0.25))
+    '''
+    global _defaultFetcher
+    if _defaultFetcher is not None and _defaultFetcher is not fetcher:
+        _defaultFetcher.close()
+    _defaultFetcher = fetcher
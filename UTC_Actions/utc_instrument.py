@@ -0,0 +1,299 @@
+import functools
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+
+#--------------------------------------------------------
+#  Instrumentation: timing spans and counters
+#
+# The pipeline stages in utc_actions (fetching, parsing, table and action
+# extraction, searching), the caches and the store's loads and dumps are
+# instrumented with timing spans and counters:
+#
+#     with span("fetch", url=url):
+#         ...
+#     count("cache.minutesDoc.miss")
+#
+# or, for a whole function, the timed("parse.minutes") decorator.
+#
+# Events are passed to sinks: any callable taking an event dict. A span
+# event is {"type": "span", "name", "start", "seconds", "thread",
+# "attributes"} (start is a time.perf_counter() value); a counter event is
+# {"type": "count", "name", "value", "time", "thread", "attributes"}.
+# Sinks are provided to log events (LoggingSink), to write them to a trace
+# file (JsonTraceSink), or to total them (SummarySink); a plain function
+# can be used as a callback sink.
+#
+# When no sink is installed, span() returns a shared do-nothing context
+# manager and count() returns at once, so the instrumentation costs next to
+# nothing. Events are only recorded in the process where the sink was
+# added: pages parsed by a pool of worker processes (see parseMinutesPages())
+# aren't seen.
+
+logger = logging.getLogger("utc_actions.instrument")
+
+_sinks = []
+_sinksLock = threading.Lock()
+
+
+
+class _NullSpan:
+    # Returned by span() when no sink is installed.
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *excInfo):
+        return False
+
+    def set(self, **attributes):
+        pass
+
+_nullSpan = _NullSpan()
+
+
+
+class Span:
+    '''A timing span; see span(). Attributes can be added while the span is
+    open, e.g. span.set(status=304).
+    '''
+
+    __slots__ = ("name", "attributes", "start")
+
+    def __init__(self, name, attributes):
+        self.name = name
+        self.attributes = attributes
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        seconds = time.perf_counter() - self.start
+        if excType is not None:
+            self.attributes["error"] = excType.__name__
+        _emit({
+            "type": "span",
+            "name": self.name,
+            "start": self.start,
+            "seconds": seconds,
+            "thread": threading.get_ident(),
+            "attributes": self.attributes
+            })
+        return False
+
+
+
+def isEnabled():
+    '''Returns True if any sink is installed.'''
+    return len(_sinks) > 0
+
+
+def span(name, **attributes):
+    '''Returns a context manager that times the enclosed block and passes a
+    span event to the installed sinks.
+    '''
+    if not _sinks:
+        return _nullSpan
+    return Span(name, attributes)
+
+
+def timed(name):
+    '''Decorator that times each call of a function as a span.'''
+    def decorate(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not _sinks:
+                return function(*args, **kwargs)
+            with Span(name, {}):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def count(name, value = 1, **attributes):
+    '''Passes a counter event to the installed sinks.'''
+    if not _sinks:
+        return
+    _emit({
+        "type": "count",
+        "name": name,
+        "value": value,
+        "time": time.perf_counter(),
+        "thread": threading.get_ident(),
+        "attributes": attributes
+        })
+
+
+def _emit(event):
+    for sink in _sinks:
+        try:
+            sink(event)
+        except Exception:
+            logger.exception("instrumentation sink failed")
+
+
+def addSink(sink):
+    '''Installs a sink (a callable taking an event dict). Returns sink.'''
+    global _sinks
+    with _sinksLock:
+        # _sinks is replaced rather than changed, so _emit() doesn't need
+        # the lock.
+        _sinks = _sinks + [sink]
+    return sink
+
+
+def removeSink(sink):
+    '''Removes an installed sink, closing it if it has a close() method.'''
+    global _sinks
+    with _sinksLock:
+        _sinks = [s for s in _sinks if s is not sink]
+    if hasattr(sink, "close"):
+        sink.close()
+
+
+
+@contextmanager
+def recording(*sinks):
+    '''Context manager that installs sinks for the duration of a block:
+
+        summary = SummarySink()
+        with recording(summary, JsonTraceSink("refresh.trace.json")):
+            refreshUtcData()
+        print(summary.report())
+    '''
+    for sink in sinks:
+        addSink(sink)
+    try:
+        yield
+    finally:
+        for sink in sinks:
+            removeSink(sink)
+
+
+
+#--------------------------------------------------------
+#  Sinks
+
+def _formatAttributes(attributes):
+    return " ".join(f"{key}={value}" for key, value in attributes.items())
+
+
+class LoggingSink:
+    '''Logs each event to a logger (by default, utc_actions.instrument) at
+    the given level.
+    '''
+
+    def __init__(self, logger = logger, level = logging.DEBUG):
+        self.logger = logger
+        self.level = level
+
+    def __call__(self, event):
+        if not self.logger.isEnabledFor(self.level):
+            return
+        if event["type"] == "span":
+            message = f"{event['name']}: {event['seconds'] * 1000:.3f} ms"
+        else:
+            message = f"{event['name']} += {event['value']}"
+        if event["attributes"]:
+            message += " " + _formatAttributes(event["attributes"])
+        self.logger.log(self.level, message)
+
+
+
+class JsonTraceSink:
+    '''Writes events to a file in the Trace Event Format (a JSON array of
+    events), which can be viewed in chrome://tracing or Perfetto. Spans are
+    written as complete ("X") events and counters as counter ("C") events
+    with the running total. Times are in microseconds from when the sink was
+    created.
+
+    Events are written as they occur; the file is completed by close().
+    '''
+
+    def __init__(self, filename):
+        self.file = open(filename, "w", encoding="utf-8")
+        self.file.write("[\n")
+        self.lock = threading.Lock()
+        self.origin = time.perf_counter()
+        self.pid = os.getpid()
+        self.totals = {}
+        self.first = True
+
+    def _write(self, traceEvent):
+        with self.lock:
+            if self.file is None:
+                return
+            if not self.first:
+                self.file.write(",\n")
+            self.first = False
+            self.file.write(json.dumps(traceEvent, default=str))
+
+    def __call__(self, event):
+        if event["type"] == "span":
+            self._write({
+                "name": event["name"],
+                "cat": event["name"].split(".")[0],
+                "ph": "X",
+                "ts": (event["start"] - self.origin) * 1e6,
+                "dur": event["seconds"] * 1e6,
+                "pid": self.pid,
+                "tid": event["thread"],
+                "args": event["attributes"]
+                })
+        else:
+            with self.lock:
+                total = self.totals.get(event["name"], 0) + event["value"]
+                self.totals[event["name"]] = total
+            self._write({
+                "name": event["name"],
+                "ph": "C",
+                "ts": (event["time"] - self.origin) * 1e6,
+                "pid": self.pid,
+                "args": {"value": total}
+                })
+
+    def close(self):
+        with self.lock:
+            if self.file is not None:
+                self.file.write("\n]\n")
+                self.file.close()
+                self.file = None
+
+
+
+class SummarySink:
+    '''Totals the events: spans has {name: [number of spans, total
+    seconds]}, and counters has {name: total}.
+    '''
+
+    def __init__(self):
+        self.spans = {}
+        self.counters = {}
+        self.lock = threading.Lock()
+
+    def __call__(self, event):
+        name = event["name"]
+        with self.lock:
+            if event["type"] == "span":
+                totals = self.spans.setdefault(name, [0, 0.0])
+                totals[0] += 1
+                totals[1] += event["seconds"]
+            else:
+                self.counters[name] = self.counters.get(name, 0) + event["value"]
+
+    def report(self):
+        '''Returns the totals as text, spans with the most time first.'''
+        lines = []
+        for name, (n, seconds) in sorted(self.spans.items(), key=lambda item: -item[1][1]):
+            lines.append(f"{name:<32} {n:6} x {seconds:9.3f}s")
+        for name, total in sorted(self.counters.items()):
+            lines.append(f"{name:<32} {total:>8}")
+        return "\n".join(lines)
@@ -0,0 +1,272 @@
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from utc_fetch import getContentHash
+from utc_instrument import span, count
+
+
+#--------------------------------------------------------
+#  Dependency-tracked derivation pipeline
+#
+# Derived data is described as a graph of stages (StageGraph). Each stage
+# derives a set of artifacts, keyed within the stage (e.g., a doc registry
+# table per year), from the artifacts of its input stages (e.g., the
+# registry page per year). For every artifact, two hashes are recorded:
+#
+#   - the input hash: of the inputs it was built from (typically, the
+#     content hashes of the input artifacts it depends on)
+#   - the content hash: of the artifact itself
+#
+# A refresh goes through the stages in dependency order. For each stage,
+# the input hash of every artifact it should have is worked out from the
+# (current) content hashes of its input stages, and only artifacts whose
+# input hash differs from the recorded one, or that are new, are rebuilt;
+# artifacts that are no longer wanted are removed. If an artifact is rebuilt
+# with the same content (e.g., a registry page revalidated as unchanged),
+# its content hash is the same, and nothing derived from it is rebuilt.
+# Stages whose inputs are up to date run concurrently, on a pool of threads.
+#
+# Source stages (e.g., pages retrieved from the Unicode site) have no input
+# stages; their input hash is of whatever identifies the source, such as the
+# URL. Keys that are volatile (e.g., the live current-year registry page)
+# are rebuilt on every refresh.
+#
+# The hashes are recorded in the store's artifacts table, unless a stage's
+# own data already records them (see Stage.getRecorded()), which keeps the
+# record right even when the data is changed by other means.
+#
+# Data can also be stored outside the graph, e.g., loaded on first use or
+# by a crawl, with no artifacts recorded for it. Before a refresh, such
+# data is found (see Stage.findStored()) and recorded as the artifacts it
+# is, so that it isn't all rebuilt.
+#
+# Keys are JSON values (str or int), and hashes are str.
+
+logger = logging.getLogger("utc_actions.pipeline")
+
+
+def getHash(value):
+    '''Returns a hash of a JSON-serializable value (str, numbers, lists,
+    tuples and dicts), e.g., for an input hash combining several hashes.
+    '''
+    return getContentHash(json.dumps(value, sort_keys=True, separators=(",", ":")))
+
+
+
+class Stage:
+    '''A stage of a StageGraph, deriving a set of keyed artifacts. name is
+    the stage name, and inputs are the names of its input stages.
+
+    Subclasses implement getInputHashes() and build(), and may override the
+    other methods.
+    '''
+
+    name = None
+    inputs = ()
+
+    def getInputHashes(self, inputs: dict):
+        '''Returns {key: input hash} for the artifacts the stage should
+        have. inputs is {input stage name: {key: content hash}} for the
+        input stages' artifacts, which are up to date.
+        '''
+        raise NotImplementedError
+
+    def build(self, inputHashes: dict):
+        '''(Re)builds the artifacts with the given keys; inputHashes is
+        {key: input hash}. Returns {key: content hash} for the artifacts
+        built. An artifact that can't be built (e.g., a page that can't be
+        retrieved) is left out, and is retried on the next refresh.
+        '''
+        raise NotImplementedError
+
+    def remove(self, keys):
+        '''Removes artifacts that are no longer wanted.'''
+        pass
+
+    def getVolatileKeys(self, keys):
+        '''Returns the keys, of those given, to rebuild on every refresh.'''
+        return []
+
+    def getRecorded(self):
+        '''Returns {key: (input hash, content hash)} for the artifacts the
+        stage has, if its data records them; or None (the default), in
+        which case the graph records them in the store.
+        '''
+        return None
+
+    def findStored(self, inputHashes: dict):
+        '''Returns {key: content hash} for those of the given artifacts
+        (inputHashes is {key: input hash}) that are already stored, built
+        from those inputs, though they weren't recorded. The default finds
+        none.
+        '''
+        return {}
+
+
+
+class StageGraph:
+    '''A graph of Stages, with the artifacts recorded in a UtcStore. Stages
+    must be given after their inputs. maxWorkers is the number of stages
+    that can run at once.
+    '''
+
+    def __init__(self, stages, store, maxWorkers = 4):
+        self.stages = {}
+        for stage in stages:
+            missing = [name for name in stage.inputs if name not in self.stages]
+            if len(missing) > 0:
+                raise ValueError(f"stage {stage.name!r} has inputs {missing} that aren't earlier stages")
+            self.stages[stage.name] = stage
+        self.store = store
+        self.maxWorkers = maxWorkers
+
+    def getRequiredStages(self, targets = None):
+        '''Returns the names of the target stages (default: all) and the
+        stages they depend on, in dependency order.
+        '''
+        if targets is None:
+            return list(self.stages)
+        required = set()
+        pending = list(targets)
+        while pending:
+            name = pending.pop()
+            if name not in self.stages:
+                raise KeyError(f"unknown stage {name!r}")
+            if name not in required:
+                required.add(name)
+                pending.extend(self.stages[name].inputs)
+        return [name for name in self.stages if name in required]
+
+    def getRecorded(self, name):
+        '''Returns {key: (input hash, content hash)} for the artifacts
+        recorded for a stage.
+        '''
+        recorded = self.stages[name].getRecorded()
+        if recorded is None:
+            recorded = self._getStoredArtifacts(name)
+        return recorded
+
+    def _getStoredArtifacts(self, name):
+        return {json.loads(key): hashes for key, hashes in self.store.getArtifacts(name).items()}
+
+    def recordStored(self, targets = None):
+        '''Records the artifacts of the target stages (default: all), and
+        of the stages they depend on, that are stored but weren't recorded
+        (see Stage.findStored()). A stage is only searched if each of its
+        input stages has recorded artifacts.
+
+        Returns {stage name: [keys of the artifacts recorded]}.
+        '''
+        contentHashes = {} # stage name: {key: recorded content hash}
+        found = {}
+        for name in self.getRequiredStages(targets):
+            stage = self.stages[name]
+            recorded = stage.getRecorded()
+            inputs = self._getInputs(name, contentHashes)
+            if recorded is None:
+                recorded = self._getStoredArtifacts(name)
+                if all(len(hashes) > 0 for hashes in inputs.values()):
+                    inputHashes = stage.getInputHashes(inputs)
+                    unrecorded = {key: h for key, h in inputHashes.items() if key not in recorded}
+                    stored = stage.findStored(unrecorded) if len(unrecorded) > 0 else {}
+                    if len(stored) > 0:
+                        logger.info(f"{name}: recording {len(stored)} stored")
+                        artifacts = {key: (unrecorded[key], h) for key, h in stored.items()}
+                        self.store.putArtifacts(name, {json.dumps(key): hashes for key, hashes in artifacts.items()})
+                        recorded.update(artifacts)
+                        found[name] = list(stored)
+            contentHashes[name] = {key: h for key, (_, h) in recorded.items()}
+        return found
+
+    def refresh(self, targets = None, lock = None):
+        '''Brings the artifacts of the target stages (default: all), and of
+        the stages they depend on, up to date. Artifacts that are stored but
+        weren't recorded are recorded first (see recordStored()).
+
+        lock is a lock held by the calling thread for the update, such as
+        UtcStore.updating; stages run on worker threads are given it (see
+        FileLock.sharing()), so that they can acquire it too.
+
+        Returns {stage name: [keys of the artifacts that were rebuilt]}.
+        '''
+        if lock is not None and not lock.isHeld():
+            raise RuntimeError("refresh() must be called holding the lock it's given")
+        self.recordStored(targets)
+        pending = self.getRequiredStages(targets)
+        contentHashes = {} # stage name: {key: content hash}
+        rebuilt = {}
+        pool = None
+        running = {} # future: stage name
+        with span("pipeline.refresh", stages=len(pending)):
+            try:
+                while pending or running:
+                    ready = [n for n in pending if all(i in contentHashes for i in self.stages[n].inputs)]
+                    for name in ready:
+                        pending.remove(name)
+                    if len(ready) == 1 and not running:
+                        # nothing to run alongside it, so it's run on this
+                        # thread (which also lets a stage use a process pool)
+                        name = ready[0]
+                        contentHashes[name], rebuilt[name] = self._refreshStage(name, self._getInputs(name, contentHashes))
+                        continue
+                    if pool is None:
+                        pool = ThreadPoolExecutor(max_workers=self.maxWorkers)
+                    for name in ready:
+                        running[pool.submit(self._refreshStageOnWorker, lock, name, self._getInputs(name, contentHashes))] = name
+                    done, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        name = running.pop(future)
+                        contentHashes[name], rebuilt[name] = future.result()
+            finally:
+                if pool is not None:
+                    pool.shutdown()
+        return rebuilt
+
+    def _getInputs(self, name, contentHashes):
+        return {i: contentHashes[i] for i in self.stages[name].inputs}
+
+    def _refreshStageOnWorker(self, lock, name, inputs):
+        # the calling thread waits, holding the lock, while this runs
+        if lock is None:
+            return self._refreshStage(name, inputs)
+        with lock.sharing():
+            return self._refreshStage(name, inputs)
+
+    def _refreshStage(self, name, inputs):
+        # Rebuilds the stale artifacts of a stage. Returns ({key: content
+        # hash}, [rebuilt keys]).
+        stage = self.stages[name]
+        with span("pipeline.stage", stage=name) as stageSpan:
+            recorded = stage.getRecorded()
+            recordedInStore = recorded is None
+            if recordedInStore:
+                recorded = self._getStoredArtifacts(name)
+            inputHashes = stage.getInputHashes(inputs)
+            volatile = set(stage.getVolatileKeys(list(inputHashes)))
+            stale = {
+                key: inputHash for key, inputHash in inputHashes.items()
+                if key in volatile or key not in recorded or recorded[key][0] != inputHash
+                }
+            removed = [key for key in recorded if key not in inputHashes]
+            stageSpan.set(artifacts=len(inputHashes), stale=len(stale), removed=len(removed))
+
+            built = {}
+            if len(stale) > 0:
+                logger.info(f"{name}: rebuilding {len(stale)} of {len(inputHashes)}")
+                built = stage.build(stale)
+                count("pipeline.built", len(built), stage=name)
+            if len(removed) > 0:
+                logger.info(f"{name}: removing {len(removed)}")
+                stage.remove(removed)
+            if recordedInStore:
+                self.store.putArtifacts(name, {json.dumps(key): (stale[key], h) for key, h in built.items()})
+                self.store.deleteArtifacts(name, [json.dumps(key) for key in removed])
+
+            contentHashes = {}
+            for key in inputHashes:
+                if key in built:
+                    contentHashes[key] = built[key]
+                elif key in recorded:
+                    contentHashes[key] = recorded[key][1]
+            return contentHashes, list(built)
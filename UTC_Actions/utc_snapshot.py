@@ -0,0 +1,193 @@
+from array import array
+from collections.abc import Sequence
+from pathlib import Path
+import json
+import mmap
+import os
+import struct
+import sys
+
+from utc_instrument import timed
+
+
+#--------------------------------------------------------
+#  Memory-mapped snapshot of the doc registry tables
+#
+# Loading the registry tables for all years from the store builds a Python
+# list for every row and a str for every cell up front. A snapshot holds the
+# same tables in a columnar file that's loaded by memory-mapping it, so
+# loading is near-instant whatever the number of rows, and processes that
+# load the same snapshot share its pages through the OS page cache.
+#
+# Each of the five columns (doc number, URL, subject, source, date) is held
+# as the UTF-8 text of all its cells, concatenated in year and table order,
+# with an array of offsets: the text of row i runs from offsets[i] to
+# offsets[i + 1]. The offsets are used in place, as arrays over the mapped
+# file (not copied), and a cell is only decoded to a str when it's read.
+#
+# The file starts with a fixed-size prefix (magic, and the position and
+# length of the header), then the columns, each 8-byte aligned, then a JSON
+# header with the years, the row range for each year, the positions of the
+# columns, and a version token for the tables the snapshot was taken of
+# (see UtcStore.getDocRegTablesVersion()), so a stale snapshot can be
+# recognized.
+#
+# A snapshot is written to a temporary file that then replaces the previous
+# one, so a process that has the previous one mapped keeps reading it
+# unchanged.
+#
+# The tables of a snapshot are DocRegSnapshotTable, a read-only sequence of
+# rows, each row being read as a new list of five str; so code written for
+# tables as lists of lists can use them as-is.
+
+snapshotMagic = b"UTCDRSN1"
+
+# magic, header position, header length
+_prefixFormat = "<8sQQ"
+_prefixSize = struct.calcsize(_prefixFormat)
+
+columnCount = 5
+
+# The offsets are arrays of unsigned int (4 bytes on the platforms Python
+# supports).
+_offsetType = "I"
+
+
+
+class DocRegSnapshotTable(Sequence):
+    '''A read-only view of a doc registry table in a DocRegSnapshot: a
+    sequence of rows, each read as a list of five str.
+    '''
+
+    def __init__(self, snapshot, start, stop):
+        self.snapshot = snapshot
+        self.start = start
+        self.stop = stop
+
+    def __len__(self):
+        return self.stop - self.start
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self.snapshot.getRow(self.start + j) for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("table index out of range")
+        return self.snapshot.getRow(self.start + i)
+
+    def __iter__(self):
+        getRow = self.snapshot.getRow
+        for i in range(self.start, self.stop):
+            yield getRow(i)
+
+    def __eq__(self, other):
+        if not isinstance(other, (list, DocRegSnapshotTable)):
+            return NotImplemented
+        return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+
+    __hash__ = None
+
+    def __reduce__(self):
+        # pickled (and copied) as a list
+        return (list, (list(self),))
+
+    def __repr__(self):
+        return f"DocRegSnapshotTable({len(self)} rows)"
+
+
+
+class DocRegSnapshot:
+    '''A doc registry snapshot file, memory-mapped for reading.
+
+    tables is {year: DocRegSnapshotTable}, and version is the version token
+    given when the snapshot was written. Raises ValueError if the file isn't
+    a complete snapshot written on a platform with the same byte order.
+    '''
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            if os.fstat(f.fileno()).st_size < _prefixSize:
+                raise ValueError(f"{path} is not a doc registry snapshot")
+            # the mapping stays valid after the file is closed
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(self._mmap)
+
+        def getSection(start, length):
+            if start + length > len(view):
+                raise ValueError(f"{path} is truncated")
+            return view[start:start + length]
+
+        magic, headerStart, headerLength = struct.unpack_from(_prefixFormat, self._mmap)
+        if magic != snapshotMagic:
+            raise ValueError(f"{path} is not a doc registry snapshot")
+        header = json.loads(getSection(headerStart, headerLength).tobytes())
+        if header["byteOrder"] != sys.byteorder:
+            raise ValueError(f"{path} was written on a platform with another byte order")
+
+        self.version = header["version"]
+        yearStarts = header["yearStarts"]
+        itemSize = array(_offsetType).itemsize
+        self._columns = [
+            (getSection(offsetsStart, itemSize * (yearStarts[-1] + 1)).cast(_offsetType), getSection(dataStart, dataLength))
+            for (offsetsStart, dataStart, dataLength) in header["columns"]
+            ]
+        self.tables = {
+            year: DocRegSnapshotTable(self, start, stop)
+            for year, start, stop in zip(header["years"], yearStarts, yearStarts[1:])
+            }
+
+    def getRow(self, i):
+        '''Returns row i (counting over all years) as a list of str.'''
+        return [str(data[offsets[i]:offsets[i + 1]], "utf-8") for (offsets, data) in self._columns]
+
+
+@timed("snapshot.write.docRegTables")
+def writeDocRegSnapshot(path, tables: dict, version = None):
+    '''Writes a snapshot of doc registry tables ({year: list of rows, each
+    a list of five str}) to path, replacing any previous snapshot. version
+    is a str identifying the tables, returned as DocRegSnapshot.version.
+    '''
+    path = Path(path)
+    years = list(tables)
+    yearStarts = [0]
+    columns = [(array(_offsetType, [0]), bytearray()) for _ in range(columnCount)]
+    for year in years:
+        for row in tables[year]:
+            if len(row) != columnCount:
+                raise ValueError(f"row of {len(row)} cells in doc registry table for {year}")
+            for (offsets, data), cell in zip(columns, row):
+                data += cell.encode("utf-8")
+                offsets.append(len(data))
+        yearStarts.append(yearStarts[-1] + len(tables[year]))
+
+    tempPath = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    try:
+        with open(tempPath, "wb") as f:
+            def writeSection(content):
+                f.write(bytes(-f.tell() % 8))
+                start = f.tell()
+                f.write(content)
+                return start
+
+            f.write(bytes(_prefixSize))
+            sections = []
+            for (offsets, data) in columns:
+                offsetsStart = writeSection(offsets)
+                sections.append((offsetsStart, writeSection(data), len(data)))
+            header = json.dumps({
+                "version": version,
+                "byteOrder": sys.byteorder,
+                "years": years,
+                "yearStarts": yearStarts,
+                "columns": sections
+                }).encode("utf-8")
+            headerStart = writeSection(header)
+            f.seek(0)
+            f.write(struct.pack(_prefixFormat, snapshotMagic, headerStart, len(header)))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tempPath, path)
+    finally:
+        if tempPath.exists():
+            tempPath.unlink()
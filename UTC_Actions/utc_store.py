@@ -0,0 +1,1088 @@
+from collections import Counter
+from collections.abc import Mapping
+from contextlib import contextmanager
+from pathlib import Path
+import logging
+import os
+import pickle
+import sqlite3
+import struct
+import sys
+import threading
+import time
+import zlib
+
+try:
+    import fcntl
+except ImportError:
+    # Windows
+    fcntl = None
+    import msvcrt
+
+from utc_fetch import FetchedPage, getContentHash
+from utc_instrument import span, timed
+
+
+#--------------------------------------------------------
+#  On-disk store for cached pages, tables and minutes
+#
+# Cached data is kept in an SQLite database with one record per registry
+# year or per meeting, so that a single year or meeting can be read or
+# replaced without loading or rewriting everything else. Each write is a
+# single transaction, so an interrupted update leaves the previous data
+# intact.
+#
+# Doc registry tables are stored one record per row, keyed by doc number, so
+# that changes to the live current-year registry can be applied row by row.
+# The changes are also logged (docreg_changes), for callers that need to know
+# what's new since they last looked. The catalog of meeting minutes rows
+# derived from the tables (meeting_catalog) is cleared whenever a table
+# changes, and the tables get a new version token, for copies of the tables
+# kept elsewhere (see utc_snapshot.py) to be checked against.
+#
+# Pages are stored as retrieved (raw bytes), with their encoding. Minutes
+# pages make up most of the data, so they're stored compressed (zlib, using a
+# preset dictionary trained on minutes HTML and kept in the store), and only
+# decompressed when a page's content is needed.
+#
+# Structures derived from parsing a minutes page are also stored, keyed by
+# the hash of the page content, so each page version only has to be parsed
+# once. The tagged actions from all meetings are indexed by action ID, and
+# the text of all minutes has a token-level inverted index.
+#
+# Long crawls (such as retrieving all minutes) record the outcome for each
+# item as it's done (crawl_items), so an interrupted crawl can be resumed.
+#
+# For the stages of the derivation pipeline (see utc_pipeline.py), the
+# hashes of the inputs each derived artifact was built from, and of its
+# content, are recorded (artifacts), so a refresh only rebuilds what's
+# stale.
+#
+# Several processes can share a store. SQLite's write-ahead log lets
+# readers go on while another process writes, and each write is atomic.
+# Processes that update the store (refreshes, crawls) also take an
+# inter-process lock on a file next to the database (UtcStore.updating), so
+# that one process's update isn't interleaved with another's, and works from
+# the data the other left rather than repeating its work. The lock is held
+# by a thread, so threads of one process updating the store take turns as
+# well; a worker thread doing part of its holder's update is given the
+# lock explicitly (see FileLock.sharing()).
+
+logger = logging.getLogger("utc_actions.store")
+
+# Seconds a write waits for another process's write transaction to finish
+# before failing with "database is locked".
+busyTimeout = 60.0
+
+_schema = '''
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+    );
+CREATE TABLE IF NOT EXISTS docreg_pages (
+    year INTEGER PRIMARY KEY,
+    page NOT NULL,
+    encoding TEXT
+    );
+CREATE TABLE IF NOT EXISTS page_validators (
+    url TEXT PRIMARY KEY,
+    etag TEXT,
+    last_modified TEXT,
+    hash TEXT,
+    encoding TEXT
+    );
+CREATE TABLE IF NOT EXISTS docreg_tables (
+    year INTEGER PRIMARY KEY
+    );
+CREATE TABLE IF NOT EXISTS docreg_rows (
+    year INTEGER NOT NULL,
+    doc_key TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    doc_num TEXT NOT NULL,
+    url TEXT,
+    subject TEXT NOT NULL,
+    source TEXT NOT NULL,
+    date TEXT NOT NULL,
+    PRIMARY KEY (year, doc_key)
+    ) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS docreg_changes (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    year INTEGER NOT NULL,
+    doc_key TEXT NOT NULL,
+    change TEXT NOT NULL,
+    old_row BLOB,
+    new_row BLOB
+    );
+CREATE TABLE IF NOT EXISTS meeting_catalog (
+    year INTEGER NOT NULL,
+    seq INTEGER NOT NULL,
+    mtg INTEGER,
+    doc_num TEXT NOT NULL,
+    url TEXT,
+    subject TEXT NOT NULL,
+    source TEXT NOT NULL,
+    date TEXT NOT NULL,
+    PRIMARY KEY (year, seq)
+    );
+CREATE TABLE IF NOT EXISTS minutes (
+    mtg INTEGER PRIMARY KEY,
+    year INTEGER NOT NULL,
+    seq INTEGER NOT NULL,
+    doc_num TEXT NOT NULL,
+    title TEXT NOT NULL,
+    page NOT NULL,
+    page_hash TEXT,
+    url TEXT,
+    doc_date TEXT,
+    encoding TEXT
+    );
+CREATE TABLE IF NOT EXISTS minutes_docs (
+    key TEXT PRIMARY KEY,
+    page_hash TEXT NOT NULL,
+    doc BLOB NOT NULL
+    );
+CREATE TABLE IF NOT EXISTS actions (
+    action_id TEXT NOT NULL,
+    mtg INTEGER NOT NULL,
+    type TEXT NOT NULL,
+    text TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    source_start INTEGER NOT NULL,
+    source_end INTEGER NOT NULL,
+    PRIMARY KEY (mtg, position)
+    );
+CREATE INDEX IF NOT EXISTS actions_id ON actions (action_id);
+CREATE TABLE IF NOT EXISTS action_index_meetings (
+    mtg INTEGER PRIMARY KEY,
+    page_hash TEXT
+    );
+CREATE TABLE IF NOT EXISTS text_index (
+    token TEXT NOT NULL,
+    mtg INTEGER NOT NULL,
+    postings BLOB NOT NULL,
+    PRIMARY KEY (token, mtg)
+    ) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS text_index_meetings (
+    mtg INTEGER PRIMARY KEY,
+    page_hash TEXT
+    );
+CREATE TABLE IF NOT EXISTS crawl_items (
+    crawl TEXT NOT NULL,
+    item TEXT NOT NULL,
+    state TEXT NOT NULL,
+    attempts INTEGER NOT NULL,
+    error TEXT,
+    PRIMARY KEY (crawl, item)
+    ) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS artifacts (
+    stage TEXT NOT NULL,
+    key TEXT NOT NULL,
+    input_hash TEXT NOT NULL,
+    content_hash TEXT,
+    PRIMARY KEY (stage, key)
+    ) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS compression_dicts (
+    id INTEGER PRIMARY KEY,
+    zdict BLOB NOT NULL
+    );
+'''
+
+# Set (as user_version) once _schema has been created in a store.
+schemaVersion = 1
+
+# zlib allows a preset dictionary of up to 32K
+compressionDictSize = 32 * 1024
+compressionLevel = 9
+
+# Fewest pages to train the first compression dictionary on. Until there is
+# a dictionary, pages stored fewer at a time (e.g., one at a time by a
+# crawl) are kept uncompressed, until compressStoredMinutes() is called.
+compressionDictMinSamples = 8
+
+# Header for stored minutes pages: a format byte, then the compression_dicts
+# id (0 if uncompressed).
+_compressedPageHeader = struct.Struct(">BH")
+_uncompressedPageFormat = 0
+_compressedPageFormat = 1
+
+
+
+def trainCompressionDict(samples, size = compressionDictSize):
+    '''Builds a zlib preset dictionary from sample pages (bytes).
+
+    The dictionary is made from lines that recur across the samples (markup
+    and boilerplate), most frequent last, since zlib finds matches nearer
+    the end of the dictionary more cheaply.
+    '''
+    counts = Counter()
+    for sample in samples:
+        counts.update(set(line.strip() for line in sample.splitlines()))
+    common = [
+        line for line, count in counts.most_common()
+        if count > 1 and len(line) > 3
+        ]
+    zdict = bytearray()
+    for line in common:
+        line += b"\n"
+        if len(zdict) + len(line) > size:
+            break
+        zdict[:0] = line
+    return bytes(zdict)
+
+
+
+class CompressedPage:
+    '''A page stored compressed; call content() to get the decompressed
+    bytes, or text() to get them decoded. Used as the page content in
+    minutes entries read from a UtcStore.
+    '''
+    __slots__ = ("data", "zdict", "hash", "encoding")
+
+    def __init__(self, data: bytes, zdict: bytes, hash: str = None, encoding: str = "utf-8"):
+        self.data = data
+        self.zdict = zdict
+        self.hash = hash
+        self.encoding = encoding
+
+    def content(self):
+        d = zlib.decompressobj(zdict=self.zdict)
+        body = self.data[_compressedPageHeader.size:]
+        return d.decompress(body) + d.flush()
+
+    def text(self):
+        return self.content().decode(self.encoding, "replace")
+
+    def __len__(self):
+        return len(self.data)
+
+    def __repr__(self):
+        return f"<CompressedPage {len(self.data)} bytes>"
+
+
+
+def getPageText(page):
+    '''Returns the text of a page that may be a str, a FetchedPage or a
+    CompressedPage.
+    '''
+    if isinstance(page, str):
+        return page
+    return page.text()
+
+
+def getPageContent(page):
+    '''Returns (content, encoding) for a page that may be a str, a
+    FetchedPage or a CompressedPage; content is bytes. A str page is given
+    as UTF-8.
+    '''
+    if isinstance(page, FetchedPage):
+        return (page.content, page.encoding)
+    if isinstance(page, CompressedPage):
+        return (page.content(), page.encoding)
+    return (page.encode("utf-8"), "utf-8")
+
+
+def getPageHash(page):
+    '''Returns the content hash of a page that may be a str, a
+    FetchedPage or a CompressedPage.
+    '''
+    if isinstance(page, CompressedPage) and page.hash is not None:
+        return page.hash
+    return getContentHash(getPageContent(page)[0])
+
+
+def getDocRegRowKeys(table):
+    '''Returns the keys for the rows of a doc registry table: the doc
+    number, with "#2", "#3", etc. appended for repeats of a doc number.
+    '''
+    keys = []
+    seen = Counter()
+    for row in table:
+        seen[row[0]] += 1
+        keys.append(row[0] if seen[row[0]] == 1 else f"{row[0]}#{seen[row[0]]}")
+    return keys
+
+
+def _pickleRow(row):
+    return None if row is None else pickle.dumps(row, protocol=pickle.HIGHEST_PROTOCOL)
+
+def _unpickleRow(data):
+    return None if data is None else pickle.loads(data)
+
+
+class FileLock:
+    '''An exclusive lock between processes, held on a lock file (which is
+    created if necessary), and between the threads of a process. Use as a
+    context manager.
+
+    The lock is held by a thread: acquiring it again in the holding thread
+    (e.g., from a nested call) doesn't block, and it's released when the
+    outermost acquisition is released. Other threads wait for it, unless
+    the holder has given them the lock with sharing().
+    '''
+
+    # Seconds between attempts on Windows, where there's no blocking lock
+    pollInterval = 0.1
+
+    def __init__(self, path):
+        self.path = Path(path)
+        # held alongside the lock file, by the thread that holds the lock
+        self._threadLock = threading.RLock()
+        self._owner = None
+        self._depth = 0
+        self._file = None
+        self._local = threading.local()
+
+    def acquire(self):
+        if self._isShared():
+            return
+        self._threadLock.acquire()
+        try:
+            if self._depth == 0:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                file = open(self.path, "a+b")
+                try:
+                    if not self._tryLock(file):
+                        logger.info(f"waiting for another process to release {self.path}")
+                        self._waitForLock(file)
+                except BaseException:
+                    file.close()
+                    raise
+                self._file = file
+                self._owner = threading.get_ident()
+        except BaseException:
+            self._threadLock.release()
+            raise
+        self._depth += 1
+
+    def release(self):
+        if self._isShared():
+            return
+        self._depth -= 1
+        if self._depth == 0:
+            if fcntl is not None:
+                fcntl.flock(self._file, fcntl.LOCK_UN)
+            else:
+                self._file.seek(0)
+                msvcrt.locking(self._file.fileno(), msvcrt.LK_UNLCK, 1)
+            self._file.close()
+            self._file = None
+            self._owner = None
+        self._threadLock.release()
+
+    def isHeld(self):
+        '''Whether the current thread holds the lock, or has been given it
+        with sharing().
+        '''
+        return self._isShared() or self._owner == threading.get_ident()
+
+    @contextmanager
+    def sharing(self):
+        '''Context manager for a worker thread doing part of the update of
+        the thread that holds the lock, which waits for the worker to
+        finish: in it, the worker acquires the lock without waiting, as the
+        holder's. Raises RuntimeError if the lock isn't held.
+        '''
+        if self._depth == 0:
+            raise RuntimeError(f"{self.path} isn't held, so it can't be shared")
+        self._local.shared = self._getSharedDepth() + 1
+        try:
+            yield self
+        finally:
+            self._local.shared -= 1
+
+    def _getSharedDepth(self):
+        return getattr(self._local, "shared", 0)
+
+    def _isShared(self):
+        return self._getSharedDepth() > 0
+
+    def _tryLock(self, file):
+        try:
+            if fcntl is not None:
+                fcntl.flock(file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                file.seek(0)
+                msvcrt.locking(file.fileno(), msvcrt.LK_NBLCK, 1)
+            return True
+        except OSError:
+            return False
+
+    def _waitForLock(self, file):
+        if fcntl is not None:
+            fcntl.flock(file, fcntl.LOCK_EX)
+            return
+        while not self._tryLock(file):
+            time.sleep(self.pollInterval)
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *excInfo):
+        self.release()
+        return False
+
+
+
+class UtcStore:
+    '''Cache of doc registry pages and tables, and meeting minutes, in an
+    SQLite database file.
+
+    Doc registry pages and tables are stored per year; minutes are stored per
+    meeting, as [year, qtr, doc #, title, page content] entries.
+
+    updating is the FileLock that processes updating the store hold, e.g.:
+
+        with store.updating:
+            ...
+    '''
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.RLock()
+        self.updating = FileLock(self.path.with_name(self.path.name + ".lock"))
+        self._conn = sqlite3.connect(str(self.path), timeout=busyTimeout, check_same_thread=False)
+        self._zdicts = {}
+        if self._query("PRAGMA user_version")[0][0] != schemaVersion:
+            # under the update lock, so that two processes don't both
+            # create the schema; once created, opening the store doesn't
+            # wait for it
+            with self.updating:
+                if self._query("PRAGMA user_version")[0][0] != schemaVersion:
+                    self._conn.execute("PRAGMA journal_mode=WAL")
+                    self._conn.executescript(_schema)
+                    self._write(f"PRAGMA user_version = {schemaVersion}")
+
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+    def getDataVersion(self):
+        '''Returns a value that changes when another connection (e.g., in
+        another process) commits a change to the store, so that data loaded
+        from it can be checked for staleness.
+        '''
+        return self._query("PRAGMA data_version")[0][0]
+
+
+    def _query(self, sql, params = ()):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+
+    def _write(self, sql, rows = ((),)):
+        # writes all rows in one transaction
+        with self._lock, self._conn:
+            self._conn.executemany(sql, rows)
+
+
+    # meta
+
+    def getMeta(self, key):
+        rows = self._query("SELECT value FROM meta WHERE key = ?", (key,))
+        return rows[0][0] if rows else None
+
+    def setMeta(self, key, value):
+        self._write("INSERT OR REPLACE INTO meta VALUES (?, ?)", [(key, value)])
+
+
+    # doc registry pages
+
+    def getDocRegPageYears(self):
+        return [r[0] for r in self._query("SELECT year FROM docreg_pages ORDER BY year")]
+
+    # Pages are returned as FetchedPage.
+
+    def getDocRegPage(self, year):
+        rows = self._query("SELECT page, encoding FROM docreg_pages WHERE year = ?", (year,))
+        return FetchedPage(*rows[0]) if rows else None
+
+    def getAllDocRegPages(self):
+        return {
+            year: FetchedPage(page, encoding)
+            for (year, page, encoding) in self._query("SELECT year, page, encoding FROM docreg_pages ORDER BY year")
+            }
+
+    def putDocRegPages(self, pages: dict):
+        self._write(
+            "INSERT OR REPLACE INTO docreg_pages VALUES (?, ?, ?)",
+            [(year, *getPageContent(page)) for year, page in pages.items()]
+            )
+
+
+    # validators for cached pages
+
+    def getAllPageValidators(self):
+        return {
+            url: {"etag": etag, "lastModified": lastModified, "hash": hash, "encoding": encoding}
+            for (url, etag, lastModified, hash, encoding) in self._query(
+                "SELECT url, etag, last_modified, hash, encoding FROM page_validators"
+                )
+            }
+
+    def putPageValidators(self, validators: dict):
+        self._write(
+            "INSERT OR REPLACE INTO page_validators VALUES (?, ?, ?, ?, ?)",
+            [(url, v.get("etag"), v.get("lastModified"), v.get("hash"), v.get("encoding")) for url, v in validators.items()]
+            )
+
+
+    # doc registry tables
+
+    def getDocRegTableYears(self):
+        return [r[0] for r in self._query("SELECT year FROM docreg_tables ORDER BY year")]
+
+    def _getDocRegRows(self, where = "", params = ()):
+        # {year: [rows]}, rows in table order
+        tables = {year: [] for year in self.getDocRegTableYears()}
+        for (year, *row) in self._query(
+                "SELECT year, doc_num, url, subject, source, date FROM docreg_rows "
+                f"{where} ORDER BY year, position", params):
+            tables[year].append(row)
+        return tables
+
+    def getDocRegTable(self, year):
+        if year not in self.getDocRegTableYears():
+            return None
+        return self._getDocRegRows("WHERE year = ?", (year,))[year]
+
+    @timed("store.load.docRegTables")
+    def getAllDocRegTables(self):
+        return self._getDocRegRows()
+
+    @timed("store.dump.docRegTables")
+    def putDocRegTables(self, tables: dict):
+        '''Stores doc registry tables, replacing the tables for the given
+        years.
+        '''
+        with self._lock, self._conn:
+            self._clearMeetingCatalog()
+            self._setDocRegTablesVersion()
+            for year, table in tables.items():
+                self._conn.execute("INSERT OR REPLACE INTO docreg_tables VALUES (?)", (year,))
+                self._conn.execute("DELETE FROM docreg_rows WHERE year = ?", (year,))
+                self._conn.executemany(
+                    "INSERT INTO docreg_rows VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    [(year, key, position, *row) for position, (key, row) in enumerate(zip(getDocRegRowKeys(table), table))]
+                    )
+
+    def updateDocRegTableRows(self, year, rows, deletedKeys, changes):
+        '''Applies changes to a stored doc registry table, and logs them.
+
+        rows is a list of (doc key, position, row) for rows that are new or
+        changed (in content or position); deletedKeys is a list of keys of
+        rows that are removed. changes is a list of (doc key, change, old row,
+        new row) for the change log; rows may be None.
+        '''
+        with self._lock, self._conn:
+            self._clearMeetingCatalog()
+            self._setDocRegTablesVersion()
+            self._conn.execute("INSERT OR REPLACE INTO docreg_tables VALUES (?)", (year,))
+            self._conn.executemany(
+                "DELETE FROM docreg_rows WHERE year = ? AND doc_key = ?",
+                [(year, key) for key in deletedKeys]
+                )
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO docreg_rows VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [(year, key, position, *row) for (key, position, row) in rows]
+                )
+            self._conn.executemany(
+                "INSERT INTO docreg_changes (year, doc_key, change, old_row, new_row) VALUES (?, ?, ?, ?, ?)",
+                [
+                    (year, key, change, _pickleRow(oldRow), _pickleRow(newRow))
+                    for (key, change, oldRow, newRow) in changes
+                    ]
+                )
+
+    def getDocRegTablesVersion(self):
+        '''Returns a token (str) that changes whenever a doc registry table
+        changes, or None if there are no tables.
+        '''
+        return self.getMeta("docRegTablesVersion")
+
+    def _setDocRegTablesVersion(self):
+        # within a write transaction
+        self._conn.execute("INSERT OR REPLACE INTO meta VALUES ('docRegTablesVersion', ?)", (os.urandom(8).hex(),))
+
+    def getDocRegChanges(self, sinceId = 0):
+        '''Returns the logged doc registry changes after sinceId, as a list
+        of (id, year, doc key, change, old row, new row), oldest first.
+        '''
+        return [
+            (changeId, year, key, change, _unpickleRow(oldRow), _unpickleRow(newRow))
+            for (changeId, year, key, change, oldRow, newRow) in self._query(
+                "SELECT * FROM docreg_changes WHERE id > ? ORDER BY id", (sinceId,)
+                )
+            ]
+
+
+    # catalog of meeting minutes rows in the doc registry tables
+
+    def getMeetingCatalog(self):
+        '''Returns (rows, (first, last)) for the stored meeting catalog, or
+        None if there isn't one: rows is a list of (year, seq, mtg#, minutes
+        row), and first and last are the first and last known meeting
+        numbers.
+        '''
+        knownRange = self.getMeta("knownMeetingRange")
+        if knownRange is None:
+            return None
+        rows = [
+            (year, seq, mtg, row)
+            for (year, seq, mtg, *row) in self._query(
+                "SELECT year, seq, mtg, doc_num, url, subject, source, date "
+                "FROM meeting_catalog ORDER BY year, seq"
+                )
+            ]
+        first, last = knownRange.split(",")
+        return rows, (int(first), int(last))
+
+    def putMeetingCatalog(self, rows, knownRange):
+        # rows and knownRange as returned by getMeetingCatalog()
+        with self._lock, self._conn:
+            self._clearMeetingCatalog()
+            self._conn.executemany(
+                "INSERT INTO meeting_catalog VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [(year, seq, mtg, *row) for (year, seq, mtg, row) in rows]
+                )
+            self._conn.execute(
+                "INSERT OR REPLACE INTO meta VALUES (?, ?)",
+                ("knownMeetingRange", f"{knownRange[0]},{knownRange[1]}")
+                )
+
+    def _clearMeetingCatalog(self):
+        # within a write transaction
+        self._conn.execute("DELETE FROM meeting_catalog")
+        self._conn.execute("DELETE FROM meta WHERE key = 'knownMeetingRange'")
+
+
+    # compression of stored pages
+
+    def _getZdict(self, dictId):
+        zdict = self._zdicts.get(dictId)
+        if zdict is None:
+            zdict = self._query("SELECT zdict FROM compression_dicts WHERE id = ?", (dictId,))[0][0]
+            self._zdicts[dictId] = zdict
+        return zdict
+
+    def hasCompressionDict(self):
+        return self._query("SELECT MAX(id) FROM compression_dicts")[0][0] is not None
+
+    def _getCurrentZdict(self, samples):
+        # Returns (id, zdict) for the latest dictionary; if there is none yet,
+        # one is trained from samples.
+        rows = self._query("SELECT MAX(id) FROM compression_dicts")
+        if rows[0][0] is not None:
+            return (rows[0][0], self._getZdict(rows[0][0]))
+        return self.addCompressionDict(samples)
+
+    def addCompressionDict(self, samples):
+        '''Trains a new compression dictionary from sample pages; it will be
+        used for pages stored after this. Returns (id, zdict).
+        '''
+        zdict = trainCompressionDict(samples)
+        with self._lock, self._conn:
+            dictId = self._conn.execute("INSERT INTO compression_dicts (zdict) VALUES (?)", (zdict,)).lastrowid
+        self._zdicts[dictId] = zdict
+        return (dictId, zdict)
+
+    def _compressPage(self, content, dictId, zdict):
+        c = zlib.compressobj(level=compressionLevel, zdict=zdict)
+        return _compressedPageHeader.pack(_compressedPageFormat, dictId) + c.compress(content) + c.flush()
+
+    def _loadPage(self, value, hash, encoding):
+        (format, dictId) = _compressedPageHeader.unpack_from(value)
+        if format == _uncompressedPageFormat:
+            return FetchedPage(value[_compressedPageHeader.size:], encoding)
+        return CompressedPage(value, self._getZdict(dictId), hash, encoding)
+
+
+    # meeting minutes
+
+    def getMinutesMeetings(self):
+        return [r[0] for r in self._query("SELECT mtg FROM minutes ORDER BY mtg")]
+
+    @timed("store.load.minutes")
+    def getMinutes(self, meetingNumber):
+        '''Returns the [year, qtr, doc #, title, page content] entry for a
+        meeting, or None. The page content is a CompressedPage (or, if it
+        isn't compressed yet, a FetchedPage).
+        '''
+        rows = self._query(
+            "SELECT year, seq, doc_num, title, page, page_hash, encoding FROM minutes WHERE mtg = ?", (meetingNumber,)
+            )
+        if not rows:
+            return None
+        entry = list(rows[0][:-2])
+        entry[-1] = self._loadPage(entry[-1], *rows[0][-2:])
+        return entry
+
+    @timed("store.dump.minutes")
+    def putMinutes(self, minutes: dict, sources: dict = None):
+        '''Stores minutes, given as {mtg#: [year, qtr, doc #, title, page
+        content]}; None entries are skipped.
+
+        sources optionally gives {mtg#: (url, date)}: the URL the minutes were
+        retrieved from and the date in their doc registry row.
+        '''
+        minutes = {mtg: entry for mtg, entry in minutes.items() if entry is not None}
+        if len(minutes) == 0:
+            return
+        if sources is None:
+            sources = {}
+        pages = [getPageContent(entry[-1]) for entry in minutes.values()]
+        if len(pages) < compressionDictMinSamples and not self.hasCompressionDict():
+            header = _compressedPageHeader.pack(_uncompressedPageFormat, 0)
+            storedPages = [header + content for (content, encoding) in pages]
+        else:
+            (dictId, zdict) = self._getCurrentZdict([content for (content, encoding) in pages])
+            storedPages = [self._compressPage(content, dictId, zdict) for (content, encoding) in pages]
+        self._write(
+            "INSERT OR REPLACE INTO minutes (mtg, year, seq, doc_num, title, page, page_hash, url, doc_date, encoding) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            [
+                (mtg, *entry[:-1], storedPage, getContentHash(content), *sources.get(mtg, (None, None)), encoding)
+                for (mtg, entry), (content, encoding), storedPage in zip(minutes.items(), pages, storedPages)
+            ]
+            )
+
+    def getMinutesSources(self, meetingNumbers):
+        '''Returns {mtg#: (doc #, url, date, page hash)} for the stored
+        minutes of the given meetings; url and date are None for minutes
+        stored without them.
+        '''
+        meetingNumbers = list(meetingNumbers)
+        sources = {}
+        for i in range(0, len(meetingNumbers), 500):
+            chunk = meetingNumbers[i:i + 500]
+            for (mtg, *source) in self._query(
+                    "SELECT mtg, doc_num, url, doc_date, page_hash FROM minutes "
+                    f"WHERE mtg IN ({', '.join('?' * len(chunk))})", chunk):
+                sources[mtg] = tuple(source)
+        return sources
+
+    def compressStoredMinutes(self):
+        '''Compresses any minutes pages stored uncompressed (before there
+        was a compression dictionary), then compacts the database file.
+        '''
+        rows = [
+            (mtg, *getPageContent(self._loadPage(page, None, encoding)))
+            for (mtg, page, encoding) in self._query(
+                "SELECT mtg, page, encoding FROM minutes "
+                f"WHERE substr(page, 1, 1) = x'{_uncompressedPageFormat:02x}'"
+                )
+            ]
+        if len(rows) > 0:
+            (dictId, zdict) = self._getCurrentZdict([content for (mtg, content, encoding) in rows])
+            self._write(
+                "UPDATE minutes SET page = ?, page_hash = ?, encoding = ? WHERE mtg = ?",
+                [
+                    (self._compressPage(content, dictId, zdict), getContentHash(content), encoding, mtg)
+                    for (mtg, content, encoding) in rows
+                ]
+                )
+        with self._lock:
+            self._conn.execute("VACUUM")
+
+    # structures derived from minutes pages
+
+    @timed("store.load.minutesDoc")
+    def getMinutesDoc(self, key):
+        rows = self._query("SELECT doc FROM minutes_docs WHERE key = ?", (key,))
+        return pickle.loads(zlib.decompress(rows[0][0])) if rows else None
+
+    def getStoredMinutesDocKeys(self, keys):
+        '''Returns the set of the given minutes doc keys that are stored.'''
+        keys = list(keys)
+        stored = set()
+        for i in range(0, len(keys), 500):
+            chunk = keys[i:i + 500]
+            stored.update(r[0] for r in self._query(
+                f"SELECT key FROM minutes_docs WHERE key IN ({', '.join('?' * len(chunk))})", chunk
+                ))
+        return stored
+
+    @timed("store.dump.minutesDoc")
+    def putMinutesDoc(self, key, pageHash, doc):
+        blob = zlib.compress(pickle.dumps(doc, protocol=pickle.HIGHEST_PROTOCOL))
+        self._write("INSERT OR REPLACE INTO minutes_docs VALUES (?, ?, ?)", [(key, pageHash, blob)])
+
+    def pruneMinutesDocs(self):
+        # removes derived structures for pages that are no longer stored;
+        # called once at the end of an update, not on every write
+        self._write(
+            "DELETE FROM minutes_docs WHERE page_hash NOT IN "
+            "(SELECT page_hash FROM minutes WHERE page_hash IS NOT NULL)"
+            )
+
+
+    # index of tagged actions by action ID
+
+    def _getStaleMeetings(self, indexMeetingsTable):
+        # meetings whose stored minutes have changed (or are new) since they
+        # were indexed, per the given table of indexed meetings
+        return [r[0] for r in self._query(
+            f"SELECT m.mtg FROM minutes m LEFT JOIN {indexMeetingsTable} a ON m.mtg = a.mtg "
+            "WHERE a.mtg IS NULL OR a.page_hash IS NOT m.page_hash ORDER BY m.mtg"
+            )]
+
+    def _getIndexedMeetings(self, indexMeetingsTable):
+        return dict(self._query(f"SELECT mtg, page_hash FROM {indexMeetingsTable}"))
+
+    def getActionIndexStaleMeetings(self):
+        '''Returns the meetings whose stored minutes have changed (or are new)
+        since their actions were indexed.
+        '''
+        return self._getStaleMeetings("action_index_meetings")
+
+    def getActionIndexMeetings(self):
+        '''Returns {mtg#: page hash} for the meetings in the action index,
+        with the hash of the minutes page they were indexed from.
+        '''
+        return self._getIndexedMeetings("action_index_meetings")
+
+    def putMeetingActions(self, meetingNumber, pageHash, actions):
+        '''Replaces the indexed actions for a meeting. actions is a list of
+        records with actionId, actionType, text, position, start and end
+        attributes (e.g., utc_actions.UtcAction).
+        '''
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM actions WHERE mtg = ?", (meetingNumber,))
+            # an action ID may be repeated, in the same or another meeting;
+            # every occurrence is kept
+            self._conn.executemany(
+                "INSERT INTO actions VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(a.actionId, meetingNumber, a.actionType, a.text, a.position, a.start, a.end) for a in actions]
+                )
+            self._conn.execute("INSERT OR REPLACE INTO action_index_meetings VALUES (?, ?)", (meetingNumber, pageHash))
+
+    def getActions(self, actionIds):
+        '''Returns a dict {action ID: [(mtg#, type, text, position, start,
+        end)]} for the given action IDs that are in the index, with every
+        occurrence of each ID, in meeting and position order.
+        '''
+        actionIds = list(actionIds)
+        found = {}
+        # SQLite limits the number of parameters in a statement
+        for i in range(0, len(actionIds), 500):
+            chunk = actionIds[i:i + 500]
+            rows = self._query(
+                f"SELECT action_id, mtg, type, text, position, source_start, source_end FROM actions WHERE action_id IN ({','.join('?' * len(chunk))}) "
+                "ORDER BY mtg, position",
+                chunk
+                )
+            for (actionId, *details) in rows:
+                found.setdefault(actionId, []).append(tuple(details))
+        return found
+
+    def getAllActions(self):
+        '''Returns all indexed actions, ordered by meeting and position, as
+        (action ID, mtg#, type, text, position, start, end) tuples.
+        '''
+        return self._query(
+            "SELECT action_id, mtg, type, text, position, source_start, source_end FROM actions ORDER BY mtg, position"
+            )
+
+
+    # inverted index of minutes text
+
+    def getTextIndexStaleMeetings(self):
+        '''Returns the meetings whose stored minutes have changed (or are new)
+        since their text was indexed.
+        '''
+        return self._getStaleMeetings("text_index_meetings")
+
+    def getTextIndexMeetings(self):
+        '''Returns {mtg#: page hash} for the meetings in the text index,
+        with the hash of the minutes page they were indexed from.
+        '''
+        return self._getIndexedMeetings("text_index_meetings")
+
+    def putMeetingTextPostings(self, meetingNumber, pageHash, postings: dict):
+        '''Replaces the text index entries for a meeting. postings is a dict
+        {token: bytes}, with the postings for the token in the meeting.
+        '''
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM text_index WHERE mtg = ?", (meetingNumber,))
+            self._conn.executemany(
+                "INSERT INTO text_index VALUES (?, ?, ?)",
+                [(token, meetingNumber, blob) for token, blob in postings.items()]
+                )
+            self._conn.execute("INSERT OR REPLACE INTO text_index_meetings VALUES (?, ?)", (meetingNumber, pageHash))
+
+    def getTextIndexTokens(self):
+        return [r[0] for r in self._query("SELECT DISTINCT token FROM text_index")]
+
+    def getTextPostings(self, tokens):
+        '''Returns a list of (token, mtg#, postings) for the given tokens.'''
+        tokens = list(tokens)
+        rows = []
+        for i in range(0, len(tokens), 500):
+            chunk = tokens[i:i + 500]
+            rows.extend(self._query(
+                f"SELECT token, mtg, postings FROM text_index WHERE token IN ({','.join('?' * len(chunk))})",
+                chunk
+                ))
+        return rows
+
+
+    def getMinutesStorageStats(self):
+        '''Returns a dict with the number of stored minutes pages, their total
+        stored (compressed) size and decompressed size in bytes, the memory
+        used by the pages held as str, and the size of the database file.
+        '''
+        stats = {"pages": 0, "storedBytes": 0, "pageBytes": 0, "strMemoryBytes": 0}
+        for mtg in self.getMinutesMeetings():
+            page = self.getMinutes(mtg)[-1]
+            (content, encoding) = getPageContent(page)
+            stats["pages"] += 1
+            stats["storedBytes"] += len(page.data) if isinstance(page, CompressedPage) else len(content)
+            stats["pageBytes"] += len(content)
+            stats["strMemoryBytes"] += sys.getsizeof(getPageText(page))
+        stats["fileBytes"] = self.path.stat().st_size
+        return stats
+
+    def hasMinutes(self, meetingNumber):
+        return len(self._query("SELECT 1 FROM minutes WHERE mtg = ?", (meetingNumber,))) > 0
+
+    def getMinutesCount(self):
+        return self._query("SELECT COUNT(*) FROM minutes")[0][0]
+
+    def deleteMinutes(self, meetingNumbers):
+        '''Deletes the stored minutes of the given meetings, and their
+        entries in the action and text indexes.
+        '''
+        rows = [(mtg,) for mtg in meetingNumbers]
+        with self._lock, self._conn:
+            for table in ("minutes", "actions", "action_index_meetings", "text_index", "text_index_meetings"):
+                self._conn.executemany(f"DELETE FROM {table} WHERE mtg = ?", rows)
+
+    def deleteAllMinutes(self):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM minutes")
+            self._conn.execute("DELETE FROM actions")
+            self._conn.execute("DELETE FROM action_index_meetings")
+            self._conn.execute("DELETE FROM text_index")
+            self._conn.execute("DELETE FROM text_index_meetings")
+
+
+    # progress of resumable crawls
+
+    def getCrawlItems(self, crawl):
+        '''Returns {item: (state, attempts, error)} for the items recorded
+        for a crawl; state is "done" or "failed".
+        '''
+        return {
+            item: (state, attempts, error)
+            for (item, state, attempts, error) in self._query(
+                "SELECT item, state, attempts, error FROM crawl_items WHERE crawl = ?", (crawl,)
+                )
+            }
+
+    def putCrawlItem(self, crawl, item, state, error = None):
+        '''Records the outcome of an attempt at a crawl item.'''
+        self._write(
+            "INSERT INTO crawl_items (crawl, item, state, attempts, error) VALUES (?, ?, ?, 1, ?) "
+            "ON CONFLICT (crawl, item) DO UPDATE SET state = excluded.state, "
+            "attempts = attempts + 1, error = excluded.error",
+            [(crawl, item, state, error)]
+            )
+
+    def clearCrawl(self, crawl):
+        self._write("DELETE FROM crawl_items WHERE crawl = ?", [(crawl,)])
+
+
+    # artifacts of derivation pipeline stages
+
+    def getArtifacts(self, stage):
+        '''Returns {key: (input hash, content hash)} for the artifacts
+        recorded for a pipeline stage.
+        '''
+        return {
+            key: (inputHash, contentHash)
+            for (key, inputHash, contentHash) in self._query(
+                "SELECT key, input_hash, content_hash FROM artifacts WHERE stage = ?", (stage,)
+                )
+            }
+
+    def putArtifacts(self, stage, artifacts: dict):
+        '''Records artifacts for a pipeline stage: artifacts is {key: (input
+        hash, content hash)}.
+        '''
+        self._write(
+            "INSERT OR REPLACE INTO artifacts VALUES (?, ?, ?, ?)",
+            [(stage, key, inputHash, contentHash) for key, (inputHash, contentHash) in artifacts.items()]
+            )
+
+    def deleteArtifacts(self, stage, keys):
+        self._write("DELETE FROM artifacts WHERE stage = ? AND key = ?", [(stage, key) for key in keys])
+
+
+    # migration from the earlier pickle files
+
+    def isMigratedFromPickleFiles(self):
+        return self.getMeta("migratedFromPickleFiles") is not None
+
+    def migrateFromPickleFiles(self, docRegPagesFile, docRegTablesFile, minutesPagesFile, getSources = None):
+        '''Imports data from the monolithic .pickle files used by earlier
+        versions of utc_actions. Files that don't exist are skipped.
+
+        The .pickle files don't record where the pages were retrieved from.
+        getSources, if given, is called with the loaded doc registry pages,
+        tables and minutes, and returns (validators, minutes sources) to
+        store with them (see putPageValidators() and putMinutes()).
+
+        Migration is done once; returns False if it was already done.
+        '''
+        if self.isMigratedFromPickleFiles():
+            return False
+
+        def load(fileName):
+            if not Path(fileName).is_file():
+                return {}
+            with span("store.load.pickleFile", file=str(fileName)), open(fileName, 'rb') as file:
+                return pickle.load(file)
+
+        pages = load(docRegPagesFile)
+        tables = load(docRegTablesFile)
+        minutes = load(minutesPagesFile)
+        validators, sources = ({}, {}) if getSources is None else getSources(pages, tables, minutes)
+        self.putDocRegPages(pages)
+        self.putPageValidators(validators)
+        if len(tables) > 0:
+            self.putDocRegTables(tables)
+        self.putMinutes(minutes, sources)
+        self.setMeta("migratedFromPickleFiles", "1")
+        return True
+
+
+
+class StoredMinutes(Mapping):
+    '''Read-only dict-like view of the minutes in a UtcStore:
+    {mtg#: [year, qtr, doc #, title, page content]}.
+
+    Entries are read from the store when accessed, so looking up one meeting
+    doesn't load the minutes for all meetings.
+    '''
+
+    def __init__(self, store: UtcStore):
+        self.store = store
+
+    def __getitem__(self, meetingNumber):
+        # the page content of the entry is a CompressedPage
+        entry = self.store.getMinutes(meetingNumber)
+        if entry is None:
+            raise KeyError(meetingNumber)
+        return entry
+
+    def __contains__(self, meetingNumber):
+        return self.store.hasMinutes(meetingNumber)
+
+    def __iter__(self):
+        return iter(self.store.getMinutesMeetings())
+
+    def __len__(self):
+        return self.store.getMinutesCount()